@@ -3,6 +3,9 @@ AI相关API路由
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator
+import json
 from models.schemas import (
     HintRequest, HintResponse,
     FeedbackRequest, FeedbackResponse,
@@ -10,10 +13,33 @@ from models.schemas import (
     QuizRequest, QuizResponse
 )
 from services.ai_service import ai_service
+from services.quiz_bank import quiz_bank
+from services.hint_rules import hint_rules
+from utils.zhipu_ai import zhipu_ai_service
+from utils.concurrency import run_db
 
 router = APIRouter()
 
 
+def _sse_response(deltas: AsyncIterator[str]) -> StreamingResponse:
+    """将文本片段转换为SSE事件流：逐段发送delta，结束时发送完整文本"""
+    async def events():
+        parts = []
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+            yield f"event: done\ndata: {json.dumps({'text': ''.join(parts)}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/hint", response_model=HintResponse)
 async def get_hint(request: HintRequest):
     """获取AI智能提示"""
@@ -28,6 +54,16 @@ async def get_hint(request: HintRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/hint/stream")
+async def stream_hint(request: HintRequest):
+    """流式获取AI智能提示（SSE）"""
+    return _sse_response(ai_service.stream_hint(
+        session_id=request.session_id,
+        game_state=request.game_state,
+        error_history=request.error_history
+    ))
+
+
 @router.post("/feedback", response_model=FeedbackResponse)
 async def get_feedback(request: FeedbackRequest):
     """获取AI个性化反馈"""
@@ -51,14 +87,51 @@ async def ask_question(request: QuestionRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/question/stream")
+async def stream_question(request: QuestionRequest):
+    """流式向字节叔提问（SSE）"""
+    return _sse_response(ai_service.stream_answer(
+        question=request.question,
+        context=request.context,
+        session_id=request.session_id
+    ))
+
+
 @router.post("/generate-quiz", response_model=QuizResponse)
 async def generate_quiz(request: QuizRequest):
     """AI生成练习题"""
     try:
         quiz = await ai_service.generate_quiz(
             player_level=request.player_level,
-            topic=request.topic
+            topic=request.topic,
+            player_id=request.player_id
         )
         return QuizResponse(**quiz)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """AI响应缓存统计"""
+    if not zhipu_ai_service.cache:
+        return {"enabled": False}
+    return {"enabled": True, **zhipu_ai_service.cache.stats()}
+
+
+@router.get("/upstream/stats")
+async def get_upstream_stats():
+    """AI上游调用保护状态：并发、熔断器与重试预算"""
+    return zhipu_ai_service.guard.stats()
+
+
+@router.get("/quiz-bank/stats")
+async def get_quiz_bank_stats():
+    """练习题库库存统计"""
+    return await run_db(quiz_bank.stats)
+
+
+@router.get("/hint/stats")
+async def get_hint_stats():
+    """规则提示命中统计：规则命中与交给大模型的比例"""
+    return hint_rules.stats()
@@ -2,14 +2,19 @@
 游戏相关API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, WebSocket
 from models.schemas import (
     GameStartRequest, GameStartResponse,
     ActionRequest, ActionResponse,
+    ActionBatchRequest, ActionBatchResponse,
     GameEndRequest, GameEndResponse,
     ProgressResponse
 )
 from services.game_service import game_service
+from services.action_queue import action_queue, ActionQueueFull
+from services.game_channel import game_channels
+from services.session_registry import session_registry, InactiveSession
+from simulation import SubmissionError
 
 router = APIRouter()
 
@@ -18,14 +23,15 @@ router = APIRouter()
 async def start_game(request: GameStartRequest):
     """开始新游戏"""
     try:
-        session_id = await game_service.start_game(
+        started = await game_service.start_game(
             player_id=request.player_id,
             game_type=request.game_type,
             level=request.level
         )
         return GameStartResponse(
-            session_id=session_id,
-            message=f"游戏已开始，会话ID: {session_id}"
+            session_id=started["session_id"],
+            message=f"游戏已开始，会话ID: {started['session_id']}",
+            problem=started["problem"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -38,35 +44,88 @@ async def record_action(request: ActionRequest):
         success = await game_service.record_action(
             session_id=request.session_id,
             action_type=request.action_type,
-            action_data=request.action_data
+            action_data=request.action_data,
+            timestamp=request.timestamp
         )
         return ActionResponse(
             success=success,
             message="操作已记录" if success else "操作记录失败"
         )
+    except InactiveSession as e:
+        raise HTTPException(status_code=409 if e.ended else 404, detail=str(e))
+    except ActionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/actions/batch", response_model=ActionBatchResponse)
+async def record_actions(request: ActionBatchRequest):
+    """批量记录游戏操作"""
+    try:
+        rejected = await game_service.record_actions(
+            [action.model_dump() for action in request.actions]
+        )
+        accepted = len(request.actions) - len(rejected)
+        return ActionBatchResponse(
+            success=True,
+            accepted=accepted,
+            rejected=rejected,
+            message=f"已记录{accepted}条操作" + (f"，忽略{len(rejected)}条（会话不存在或已结束）" if rejected else "")
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/action-queue/stats")
+async def get_action_queue_stats():
+    """操作写缓冲队列统计"""
+    return action_queue.stats()
+
+
 @router.post("/end", response_model=GameEndResponse)
 async def end_game(request: GameEndRequest):
-    """结束游戏"""
+    """结束游戏；支持服务端校验的游戏缺少答案时返回400，已结束后再次结束返回409"""
     try:
         result = await game_service.end_game(
             session_id=request.session_id,
             score=request.score,
             stars=request.stars,
-            completed=request.completed
+            completed=request.completed,
+            submission=request.submission
         )
         return GameEndResponse(
             message="游戏已结束",
             final_score=result["score"],
-            stars=result["stars"]
+            stars=result["stars"],
+            validated=result["validated"]
         )
+    except InactiveSession as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except SubmissionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.websocket("/ws/{session_id}")
+async def game_channel(websocket: WebSocket, session_id: str):
+    """游戏会话的WebSocket通道：在一个连接中记录操作、请求提示和结束游戏"""
+    await game_channels.serve(websocket, session_id)
+
+
+@router.get("/sessions/stats")
+async def get_session_stats():
+    """活跃会话登记表统计"""
+    return session_registry.stats()
+
+
+@router.get("/channel/stats")
+async def get_channel_stats():
+    """WebSocket通道统计"""
+    return game_channels.stats()
+
+
 @router.get("/progress/{player_id}", response_model=ProgressResponse)
 async def get_progress(player_id: str):
     """获取玩家进度"""
@@ -80,29 +139,8 @@ async def get_progress(player_id: str):
 @router.get("/history/{player_id}")
 async def get_history(player_id: str, limit: int = 10):
     """获取玩家历史记录"""
-    from models.database import SessionLocal, GameSession
-    from datetime import datetime
-
-    db = SessionLocal()
     try:
-        sessions = db.query(GameSession).filter(
-            GameSession.player_id == player_id
-        ).order_by(GameSession.start_time.desc()).limit(limit).all()
-
-        history = []
-        for session in sessions:
-            history.append({
-                "session_id": session.session_id,
-                "game_type": session.game_type,
-                "level": session.level,
-                "score": session.score,
-                "stars": session.stars,
-                "completed": session.completed,
-                "start_time": session.start_time.isoformat(),
-                "end_time": session.end_time.isoformat() if session.end_time else None
-            })
-
+        history = await game_service.get_history(player_id, limit)
         return {"player_id": player_id, "history": history}
-
-    finally:
-        db.close()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,38 @@
+"""
+排行榜API路由
+"""
+
+from fastapi import APIRouter, HTTPException, Query
+from models.schemas import LeaderboardResponse, PlayerRankResponse
+from services.leaderboard import leaderboard
+from utils.concurrency import run_db
+
+router = APIRouter()
+
+
+@router.get("/{game_type}/{level}/top", response_model=LeaderboardResponse)
+async def get_top(game_type: str, level: str,
+                  limit: int = Query(10, ge=1, le=100),
+                  offset: int = Query(0, ge=0)):
+    """排行榜前N名（offset用于翻页）"""
+    # 排行榜第一次访问时需要从数据库加载
+    return await run_db(leaderboard.top, game_type, level, limit, offset)
+
+
+@router.get("/{game_type}/{level}/rank/{player_id}", response_model=PlayerRankResponse)
+async def get_rank(game_type: str, level: str, player_id: str):
+    """玩家自己的名次"""
+    result = await run_db(leaderboard.rank, game_type, level, player_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="玩家尚未上榜")
+    return result
+
+
+@router.get("/{game_type}/{level}/around/{player_id}", response_model=LeaderboardResponse)
+async def get_around(game_type: str, level: str, player_id: str,
+                     radius: int = Query(5, ge=1, le=50)):
+    """玩家名次前后的玩家"""
+    result = await run_db(leaderboard.around, game_type, level, player_id, radius)
+    if result is None:
+        raise HTTPException(status_code=404, detail="玩家尚未上榜")
+    return result
@@ -0,0 +1,117 @@
+"""
+算法模拟API路由
+计算量与输入规模成正比且不访问数据库，使用同步路由由框架的线程池执行，不阻塞事件循环；
+答案校验可能需要读取会话的题目，使用异步路由。
+这些接口可以求解任意题目，包括开始游戏时服务端生成的题目；服务端计分只保证分数按服务端题目
+计算且每局只计一次，不能防止玩家借助这些接口作答
+"""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from models.schemas import (
+    SchedulingRequest, PagingRequest, BankersRequest, DeadlockDetectRequest,
+    DiskRequest, ValidateRequest, ValidationResponse
+)
+from simulation import (
+    schedule, compare_schedules, simulate_paging, fault_curve,
+    check_safety, request_resources, detect_deadlock, schedule_disk,
+    validate_submission, SubmissionError
+)
+from services.game_service import game_service
+
+router = APIRouter()
+
+
+def _scheduling_args(request: SchedulingRequest):
+    processes = request.processes
+    return {
+        "arrival": [p.arrival for p in processes],
+        "burst": [p.burst for p in processes],
+        "priority": [p.priority for p in processes],
+        "quantum": request.quantum,
+        "ids": [p.id or f"P{i + 1}" for i, p in enumerate(processes)],
+    }
+
+
+@router.post("/scheduling")
+def simulate_scheduling(request: SchedulingRequest):
+    """进程调度：执行片段、完成顺序和等待/周转/响应时间"""
+    try:
+        return schedule(algorithm=request.algorithm, **_scheduling_args(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/scheduling/compare")
+def compare_scheduling(request: SchedulingRequest):
+    """同一组进程在各调度算法下的平均指标"""
+    try:
+        return compare_schedules(**_scheduling_args(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/paging")
+def simulate_page_replacement(request: PagingRequest, curve: bool = False):
+    """页面置换：缺页次数与位置；curve=true 时附带页框数 1..frames 的缺页曲线"""
+    try:
+        result = simulate_paging(request.reference, request.frames, request.algorithm)
+        if curve:
+            result["fault_curve"] = fault_curve(request.reference, request.frames, request.algorithm)
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/bankers")
+def bankers(request: BankersRequest):
+    """银行家算法：安全性检查，带 request 时同时判断该申请能否分配"""
+    try:
+        result = check_safety(request.available, request.allocation, request.maximum)
+        if request.request is not None:
+            result["request"] = request_resources(
+                request.available, request.allocation, request.maximum,
+                request.request.process, request.request.resources
+            )
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/deadlock/detect")
+def deadlock_detect(request: DeadlockDetectRequest):
+    """死锁检测：找出处于死锁的进程"""
+    try:
+        return detect_deadlock(request.available, request.allocation, request.request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/disk")
+def disk_scheduling(request: DiskRequest):
+    """磁盘调度：服务顺序与寻道距离"""
+    try:
+        return schedule_disk(request.requests, request.head, request.algorithm,
+                             request.cylinders, request.direction)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/validate", response_model=ValidationResponse)
+async def validate(request: ValidateRequest):
+    """校验玩家的答案（不记录成绩，结束游戏时提交 submission 才计入）
+
+    带 session_id 时按该会话开始时服务端生成的题目校验，会话结束后才能使用（否则400）；
+    不带时按 submission 中的题目参数校验，用于练习
+    """
+    try:
+        if request.session_id:
+            return await game_service.check_answer(request.session_id, request.submission)
+        if not request.game_type:
+            raise SubmissionError("缺少 game_type")
+        # 与同步路由一样在框架的线程池中计算
+        return await run_in_threadpool(validate_submission, request.game_type, request.submission)
+    except SubmissionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -3,18 +3,30 @@ OS Smart Village - FastAPI Application
 智慧乡村后端主应用
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-import uvicorn
+from fastapi.responses import PlainTextResponse
 import os
+import time
 from dotenv import load_dotenv
 
-from api import game_routes, ai_routes, report_routes
-
-# 加载环境变量
+# 加载环境变量（必须在导入读取配置的模块之前）
 load_dotenv()
 
+from api import game_routes, ai_routes, report_routes, leaderboard_routes, simulation_routes
+from services.action_queue import action_queue
+from services.quiz_bank import quiz_bank
+from services.report_service import report_builder
+from services.action_compaction import action_compactor
+from services.ai_service import hint_flight, question_flight
+from services.hint_rules import hint_rules
+from services.game_channel import game_channels
+from services.session_registry import session_registry
+from models.database import engine
+from utils import metrics
+from utils.shared_state import worker_count
+from utils.zhipu_ai import zhipu_ai_service
+
 # 创建FastAPI应用
 app = FastAPI(
     title="OS Smart Village API",
@@ -34,10 +46,144 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 请求耗时与数据库查询统计
+metrics.instrument_engine(engine)
+
+
+def _route_template(request: Request) -> str:
+    """请求对应的路由模板，如 /api/game/progress/{player_id}，避免指标标签过多"""
+    if request.scope.get("route") is None:
+        return "unmatched"
+    params = {str(value): name for name, value in request.path_params.items()}
+    return "/".join(
+        f"{{{params[segment]}}}" if segment in params else segment
+        for segment in request.url.path.split("/")
+    )
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """按路由统计请求耗时和请求内的SQL条数"""
+    stats = metrics.RequestStats()
+    token = metrics.current_request_stats.set(stats)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = (
+            f"app;dur={(time.perf_counter() - started) * 1000:.1f}, "
+            f"db;dur={stats.query_time * 1000:.1f};desc=\"{stats.queries} queries\""
+        )
+        return response
+    finally:
+        path = _route_template(request)
+        elapsed = time.perf_counter() - started
+        metrics.http_requests_total.inc(method=request.method, route=path, status=status)
+        metrics.http_request_duration.observe(elapsed, method=request.method, route=path)
+        metrics.db_queries_per_request.observe(stats.queries, route=path)
+        metrics.current_request_stats.reset(token)
+
+
+def _collect_service_metrics():
+    """队列深度、缓存命中等在输出时读取的指标"""
+    queue_stats = action_queue.stats()
+    families = [
+        ("action_queue_depth", "gauge", "操作日志写缓冲队列深度",
+         [({}, queue_stats["depth"])]),
+        ("action_queue_rows_total", "counter", "写缓冲队列处理的操作数",
+         [({"result": result}, queue_stats[result])
+          for result in ("enqueued", "written", "rejected", "failed", "dropped_ended")]),
+        ("action_queue_last_flush_ms", "gauge", "最近一次批量写入耗时（毫秒）",
+         [({}, queue_stats["last_flush_ms"])]),
+    ]
+    compaction_stats = action_compactor.stats()
+    families.append(("action_log_compacted_rows_total", "counter", "压缩任务从在线表移出的操作数",
+                     [({"result": "archived"}, compaction_stats["rows_archived"]),
+                      ({"result": "dropped"}, compaction_stats["rows_dropped"])]))
+    families.append(("action_log_compacted_sessions_total", "counter", "压缩为汇总的会话数",
+                     [({}, compaction_stats["sessions_compacted"])]))
+    if zhipu_ai_service.cache:
+        cache_stats = zhipu_ai_service.cache.stats()
+        families.append(("ai_cache_requests_total", "counter", "AI响应缓存查询次数",
+                         [({"result": "hit"}, cache_stats["hits"]),
+                          ({"result": "miss"}, cache_stats["misses"])]))
+        families.append(("ai_cache_entries", "gauge", "AI响应缓存条目数",
+                         [({}, cache_stats["entries"])]))
+    guard_stats = zhipu_ai_service.guard.stats()
+    breaker_state = {"closed": 0, "half_open": 1, "open": 2}[guard_stats["breaker"]["state"]]
+    families.extend([
+        ("ai_upstream_active", "gauge", "正在进行的AI上游调用数",
+         [({}, guard_stats["active"])]),
+        ("ai_breaker_state", "gauge", "AI熔断器状态（0关闭 1半开 2打开）",
+         [({}, breaker_state)]),
+        ("ai_breaker_rejected_total", "counter", "熔断打开期间被直接降级的请求数",
+         [({}, guard_stats["breaker"]["rejected"])]),
+        ("ai_retry_budget_tokens", "gauge", "剩余的全局重试预算",
+         [({}, guard_stats["retry_budget"]["tokens"])]),
+    ])
+    flights = [hint_flight.stats(), question_flight.stats()]
+    families.append(("ai_singleflight_requests_total", "counter",
+                     "AI请求合并情况（leader实际调用模型，coalesced/window共享结果，unshared收到降级结果后自行调用）",
+                     [({"kind": f["name"], "result": result}, f[key])
+                      for f in flights
+                      for result, key in (("leader", "leaders"), ("coalesced", "coalesced"),
+                                          ("window", "window_hits"), ("unshared", "unshared"))]))
+    session_stats = session_registry.stats()
+    families.extend([
+        ("game_sessions_live", "gauge", "本进程登记的未结束会话数",
+         [({"game_type": game_type}, count) for game_type, count in session_stats["live_by_game"].items()]),
+        ("game_session_lookups_total", "counter", "会话登记表查询情况（hit命中，load查询数据库）",
+         [({"result": "hit"}, session_stats["hits"]), ({"result": "load"}, session_stats["loads"])]),
+        ("game_session_rejected_actions_total", "counter", "写入不存在或已结束会话而被拒绝的操作数",
+         [({}, session_stats["rejected"])]),
+    ])
+    channel_stats = game_channels.stats()
+    families.extend([
+        ("ws_connections", "gauge", "当前打开的游戏WebSocket连接数",
+         [({}, channel_stats["active"])]),
+        ("ws_messages_total", "counter", "游戏WebSocket收到的消息数",
+         [({"type": kind}, count) for kind, count in channel_stats["messages"].items()]),
+        ("ws_action_batches_total", "counter", "WebSocket操作攒批后入队的次数",
+         [({}, channel_stats["batches"])]),
+        ("ws_duplicate_actions_total", "counter", "重连后重发、已入队而被跳过的操作数",
+         [({}, channel_stats["duplicate_actions"])]),
+    ])
+    rule_stats = hint_rules.stats()
+    families.append(("ai_hint_requests_total", "counter", "提示请求由本地规则或大模型给出的次数",
+                     [({"path": "rule"}, rule_stats["rule_hits"]),
+                      ({"path": "llm"}, rule_stats["fallthrough"])]))
+    families.append(("ai_hint_fast_path_ratio", "gauge", "由本地规则给出的提示占比",
+                     [({}, rule_stats["fast_path_ratio"])]))
+    return families
+
+
+metrics.registry.register_collector(_collect_service_metrics)
+
 # 注册路由
 app.include_router(game_routes.router, prefix="/api/game", tags=["Game"])
 app.include_router(ai_routes.router, prefix="/api/ai", tags=["AI"])
 app.include_router(report_routes.router, prefix="/api/report", tags=["Report"])
+app.include_router(leaderboard_routes.router, prefix="/api/leaderboard", tags=["Leaderboard"])
+app.include_router(simulation_routes.router, prefix="/api/simulation", tags=["Simulation"])
+
+
+@app.on_event("startup")
+async def startup():
+    """启动后台任务"""
+    action_queue.start()
+    quiz_bank.start()
+    report_builder.start()
+    action_compactor.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """关闭前写入缓冲中的数据"""
+    action_compactor.stop()
+    report_builder.stop()
+    quiz_bank.stop()
+    action_queue.stop()
 
 
 @app.get("/")
@@ -50,6 +196,15 @@ async def root():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus指标"""
+    return PlainTextResponse(
+        metrics.registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.get("/health")
 async def health_check():
     """健康检查"""
@@ -57,6 +212,14 @@ async def health_check():
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("app:app", host=host, port=port, reload=True)
+    workers = worker_count()
+    if workers > 1:
+        # 多进程模式不支持自动重载；生产环境推荐 gunicorn -c gunicorn.conf.py app:app
+        uvicorn.run("app:app", host=host, port=port, workers=workers)
+    else:
+        uvicorn.run("app:app", host=host, port=port,
+                    reload=os.getenv("DEBUG", "True").lower() in ("1", "true", "yes"))
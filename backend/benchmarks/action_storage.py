@@ -0,0 +1,190 @@
+"""
+操作日志存储基准
+用同一组随机生成的操作（各游戏的点击、拖动、答题操作和错误，约一成带有结构之外的字段）
+分别写入两个临时SQLite数据库：一个按原来的方式保存JSON文本，一个使用 utils/action_codec.py 的紧凑编码。
+输出每条操作的平均字节数（数据列与VACUUM后的文件）、写入吞吐和读取解码吞吐。
+
+用法：
+    python benchmarks/action_storage.py --rows 200000 --batch-size 500 --output storage.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Base, ActionLog
+from utils.action_codec import ActionCodec, msgpack, zstandard
+
+PROCESSES = ["P1", "P2", "P3", "P4", "P5"]
+FILES = ["/home/user/notes.txt", "/home/user/docs", "/tmp/a.log", "/etc/hosts"]
+
+
+def _game_action(rnd: random.Random, game_type: str) -> Tuple[str, Dict[str, Any]]:
+    """各游戏的答题操作：(action_type, action_data)"""
+    pointer = {"x": rnd.randint(0, 800), "y": rnd.randint(0, 600)}
+    if game_type == "process-scheduling":
+        return rnd.choice(["select", "schedule"]), {
+            **pointer, "process": rnd.choice(PROCESSES), "algorithm": rnd.choice(["fcfs", "sjf", "rr"]),
+            "time": rnd.randint(0, 60), "burst": rnd.randint(1, 20),
+        }
+    if game_type == "memory-management":
+        return "access", {**pointer, "page": rnd.randint(0, 15), "frame": rnd.randint(0, 3),
+                          "hit": rnd.random() < 0.6, "algorithm": rnd.choice(["fifo", "lru"])}
+    if game_type == "deadlock":
+        return rnd.choice(["request", "release"]), {
+            **pointer, "process": rnd.randint(0, 4), "resource": rnd.randint(0, 2),
+            "amount": rnd.randint(1, 5), "granted": rnd.random() < 0.7,
+        }
+    if game_type == "io-management":
+        return "seek", {**pointer, "cylinder": rnd.randint(0, 199), "head": rnd.randint(0, 199),
+                        "distance": rnd.randint(0, 199), "algorithm": rnd.choice(["sstf", "scan"])}
+    if game_type == "file-system":
+        return rnd.choice(["create", "open", "delete"]), {
+            **pointer, "path": rnd.choice(FILES), "is_dir": rnd.random() < 0.3, "size": rnd.randint(0, 65536),
+        }
+    return rnd.choice(["acquire", "release", "wait", "signal"]), {
+        **pointer, "process": rnd.choice(PROCESSES), "semaphore": rnd.choice(["mutex", "empty", "full"]),
+        "value": rnd.randint(-2, 5),
+    }
+
+
+def generate(rows: int, seed: int) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    game_types = ["process-scheduling", "memory-management", "deadlock",
+                  "io-management", "file-system", "process-sync"]
+    sessions = [(f"session-{i:05d}", rnd.choice(game_types)) for i in range(max(rows // 50, 1))]
+    now = datetime.utcnow()
+    actions = []
+    for _ in range(rows):
+        session_id, game_type = rnd.choice(sessions)
+        roll = rnd.random()
+        if roll < 0.45:
+            action_type, data = rnd.choice(["click", "move", "drag"]), {
+                "x": rnd.randint(0, 800), "y": rnd.randint(0, 600), "target": rnd.choice(PROCESSES + ["queue", "cpu"])}
+        elif roll < 0.9:
+            action_type, data = _game_action(rnd, game_type)
+        elif roll < 0.97:
+            action_type, data = "error", {"error_type": rnd.choice(["wrong_order", "unsafe_state", "page_fault"]),
+                                          "expected": ",".join(rnd.sample(PROCESSES, 3)),
+                                          "actual": ",".join(rnd.sample(PROCESSES, 3))}
+        else:
+            action_type, data = "hint", {"stage": f"level-{rnd.randint(1, 5)}"}
+        if rnd.random() < 0.1:
+            # 结构之外的字段：放入其余字段
+            data["state"] = {"queue": rnd.sample(PROCESSES, 3), "clock": rnd.random() * 100}
+        actions.append({"session_id": session_id, "game_type": game_type, "action_type": action_type,
+                        "action_data": data, "timestamp": now})
+    return actions
+
+
+def measure(actions: List[Dict[str, Any]], codec: ActionCodec, batch_size: int, tmpdir: str) -> Dict[str, Any]:
+    path = os.path.join(tmpdir, f"{'encoded' if codec.enabled else 'json'}.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine, tables=[ActionLog.__table__])
+
+    Session = sessionmaker(bind=engine)
+    # 与写缓冲队列相同：每批一个事务
+    db = Session()
+    started = time.perf_counter()
+    for start in range(0, len(actions), batch_size):
+        db.execute(insert(ActionLog), codec.encode_rows(actions[start:start + batch_size]))
+        db.commit()
+    insert_seconds = time.perf_counter() - started
+    db.close()
+
+    with engine.begin() as conn:
+        column_bytes = conn.execute(text(
+            "SELECT COALESCE(SUM(LENGTH(CAST(action_data AS BLOB))), 0) + COALESCE(SUM(LENGTH(payload)), 0) "
+            "FROM action_logs"
+        )).scalar()
+        conn.execute(text("VACUUM"))
+    file_bytes = os.path.getsize(path)
+
+    db = Session()
+    started = time.perf_counter()
+    decoded = [row.action_data for row in db.query(ActionLog).order_by(ActionLog.id)]
+    read_seconds = time.perf_counter() - started
+    db.close()
+    engine.dispose()
+
+    if decoded != [action["action_data"] for action in actions]:
+        raise RuntimeError("解码结果与原数据不一致")
+    rows = len(actions)
+    return {
+        "column_bytes_per_action": round(column_bytes / rows, 1),
+        "file_bytes_per_action": round(file_bytes / rows, 1),
+        "file_mb": round(file_bytes / 1024 / 1024, 2),
+        "insert_per_sec": round(rows / insert_seconds),
+        "read_per_sec": round(rows / read_seconds),
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    actions = generate(args.rows, args.seed)
+    raw_json_bytes = sum(len(json.dumps(a["action_data"], ensure_ascii=False).encode("utf-8")) for a in actions)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = {
+            "json": measure(actions, ActionCodec(enabled=False), args.batch_size, tmpdir),
+            "encoded": measure(actions, ActionCodec(compress_min=args.compress_min), args.batch_size, tmpdir),
+        }
+    return {
+        "meta": {
+            "rows": args.rows,
+            "batch_size": args.batch_size,
+            "seed": args.seed,
+            "msgpack": msgpack is not None,
+            "zstandard": zstandard is not None,
+            "json_bytes_per_action": round(raw_json_bytes / args.rows, 1),
+            "time": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def print_summary(result: Dict[str, Any]):
+    meta = result["meta"]
+    print(f"{meta['rows']} actions, batch {meta['batch_size']}, "
+          f"msgpack={meta['msgpack']} zstandard={meta['zstandard']}")
+    before, after = result["results"]["json"], result["results"]["encoded"]
+    header = f"{'metric':<28}{'json':>12}{'encoded':>12}{'change':>10}"
+    print(header)
+    print("-" * len(header))
+    for name in before:
+        old, new = before[name], after[name]
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"{name:<28}{old:>12}{new:>12}{change:>9.1f}%")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="操作日志存储基准")
+    parser.add_argument("--rows", type=int, default=200000, help="操作条数")
+    parser.add_argument("--batch-size", type=int, default=500, help="每次写入的条数（与写缓冲队列一致）")
+    parser.add_argument("--compress-min", type=int, default=256, help="超过该字节数时用zstd压缩")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果JSON文件")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    result = run(args)
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
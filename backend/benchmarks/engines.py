@@ -0,0 +1,128 @@
+"""
+算法模拟引擎基准
+对每个引擎分别运行游戏规模（几个到几十个元素）和大规模随机生成的输入，
+输出每次调用的中位耗时与每秒处理的元素数（调度只计算汇总指标，与答案校验相同）。
+
+用法：
+    python benchmarks/engines.py --scale 100000 --runs 5 --output simulation.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulation import (
+    schedule, simulate_paging, check_safety, is_safe_sequence, schedule_disk,
+    SCHEDULING_ALGORITHMS, PAGING_ALGORITHMS, DISK_ALGORITHMS
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="算法模拟引擎基准")
+    parser.add_argument("--scale", type=int, default=100000, help="大规模输入的元素数")
+    parser.add_argument("--runs", type=int, default=5, help="每项的重复次数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果JSON文件")
+    return parser.parse_args()
+
+
+def _bankers_state(rng: np.random.Generator, processes: int, resources: int):
+    """生成一定安全的状态：可用资源足够满足至少一个进程，且按需求从小到大依次可完成"""
+    maximum = rng.integers(1, 10, size=(processes, resources))
+    allocation = rng.integers(0, maximum + 1)
+    need = maximum - allocation
+    available = need.max(axis=0)
+    return available.tolist(), allocation.tolist(), maximum.tolist()
+
+
+def workloads(scale: int, seed: int) -> List[Tuple[str, int, Callable[[], Any]]]:
+    """(名称, 元素数, 调用) 列表"""
+    rng = np.random.default_rng(seed)
+    cases = []
+
+    for label, n in (("game", 8), ("large", scale)):
+        arrival = np.sort(rng.integers(0, n * 2, size=n)).tolist()
+        burst = rng.integers(1, 20, size=n).tolist()
+        priority = rng.integers(0, 5, size=n).tolist()
+        for algorithm in SCHEDULING_ALGORITHMS:
+            cases.append((f"scheduling.{algorithm}.{label}", n,
+                          lambda a=arrival, b=burst, p=priority, alg=algorithm:
+                          schedule(a, b, alg, p, quantum=4, detail=False)))
+
+    for label, n in (("game", 20), ("large", scale * 10)):
+        # 带局部性的访问序列：大部分访问落在当前工作集内
+        base = rng.integers(0, 64, size=n)
+        reference = (base + (np.arange(n) // 1000) * 8).tolist()
+        for algorithm in PAGING_ALGORITHMS:
+            cases.append((f"paging.{algorithm}.{label}", n,
+                          lambda r=reference, alg=algorithm: simulate_paging(r, 16, alg)))
+
+    for label, processes, resources in (("game", 5, 3), ("large", max(scale // 50, 10), 10)):
+        available, allocation, maximum = _bankers_state(rng, processes, resources)
+        sequence = check_safety(available, allocation, maximum)["sequence"] or list(range(processes))
+        cases.append((f"bankers.safety.{label}", processes,
+                      lambda av=available, al=allocation, mx=maximum: check_safety(av, al, mx)))
+        cases.append((f"bankers.verify_sequence.{label}", processes,
+                      lambda av=available, al=allocation, mx=maximum, seq=sequence:
+                      is_safe_sequence(av, al, mx, seq)))
+
+    for label, n in (("game", 8), ("large", scale)):
+        requests = rng.integers(0, 10000, size=n).tolist()
+        for algorithm in DISK_ALGORITHMS:
+            cases.append((f"disk.{algorithm}.{label}", n,
+                          lambda r=requests, alg=algorithm: schedule_disk(r, 5000, alg, cylinders=10000)))
+    return cases
+
+
+def run(args) -> Dict[str, Any]:
+    results = {}
+    for name, size, call in workloads(args.scale, args.seed):
+        call()  # 预热
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - started)
+        median = statistics.median(timings)
+        results[name] = {
+            "size": size,
+            "median_us": round(median * 1e6, 1),
+            "elements_per_second": round(size / median) if median else None,
+        }
+    return {
+        "meta": {"scale": args.scale, "runs": args.runs, "seed": args.seed,
+                 "numpy": np.__version__, "python": sys.version.split()[0]},
+        "results": results,
+    }
+
+
+def print_summary(result: Dict[str, Any]):
+    header = f"{'case':<34}{'size':>10}{'median':>14}{'elements/s':>16}"
+    print(header)
+    print("-" * len(header))
+    for name, item in result["results"].items():
+        median = item["median_us"]
+        shown = f"{median:.1f} us" if median < 1000 else f"{median / 1000:.2f} ms"
+        print(f"{name:<34}{item['size']:>10}{shown:>14}{item['elements_per_second'] or 0:>16,}")
+
+
+def main():
+    args = parse_args()
+    result = run(args)
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
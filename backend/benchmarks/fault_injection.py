@@ -0,0 +1,97 @@
+"""
+AI上游故障注入
+用AI桩客户端依次模拟正常、变慢、整体故障和恢复四个阶段，
+观察并发上限、截止时间、重试预算和熔断器的表现：
+每个阶段输出请求数、降级数、实际上游调用数、重试数、延迟和熔断状态。
+
+用法：
+    python benchmarks/fault_injection.py --concurrency 32 --requests 200
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FALLBACK = "AI暂时无法响应，请稍后再试"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI上游故障注入")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=200, help="每个阶段的请求数")
+    parser.add_argument("--latency", type=float, default=0.05, help="正常阶段的上游延迟（秒）")
+    parser.add_argument("--slow-latency", type=float, default=3.0, help="变慢阶段的上游延迟（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def configure_env():
+    """压测用的较小阈值，已设置的环境变量优先"""
+    defaults = {
+        "AI_CACHE_BACKEND": "none",
+        "AI_MAX_CONCURRENCY": "8",
+        "AI_CALL_DEADLINE": "2",
+        "AI_ATTEMPT_TIMEOUT": "1",
+        "AI_BREAKER_FAILURES": "5",
+        "AI_BREAKER_RECOVERY": "2",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def run_phase(name, service, stub, args, latency, error_rate):
+    stub.latency = latency
+    stub.error_rate = error_rate
+    calls_before = stub.calls
+    retries_before = service.guard.budget.retries
+
+    def one(i):
+        started = time.perf_counter()
+        # 每个请求的问题不同，避免被缓存或合并
+        answer = service.answer_question(f"{name}问题{i}")
+        return time.perf_counter() - started, answer == FALLBACK
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(duration for duration, _ in results)
+    fallbacks = sum(1 for _, fallback in results if fallback)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{name:<10}{len(results):>8}{fallbacks:>10}{stub.calls - calls_before:>10}"
+          f"{service.guard.budget.retries - retries_before:>9}{p95 * 1000:>10.0f}"
+          f"{latencies[-1] * 1000:>10.0f}{elapsed:>9.2f}  {service.guard.breaker.state}")
+
+
+def main():
+    args = parse_args()
+    configure_env()
+
+    from utils.zhipu_ai import ZhipuAIService
+    from benchmarks.stub_ai import StubZhipuAI
+
+    service = ZhipuAIService()
+    service.client = StubZhipuAI(latency=args.latency, seed=args.seed)
+    stub = service.client.completions
+
+    print(f"{'phase':<10}{'requests':>8}{'fallback':>10}{'upstream':>10}{'retries':>9}"
+          f"{'p95_ms':>10}{'max_ms':>10}{'wall_s':>9}  breaker")
+    run_phase("healthy", service, stub, args, args.latency, 0.0)
+    run_phase("slow", service, stub, args, args.slow_latency, 0.0)
+    # 每个故障阶段前等待熔断冷却，从半开状态开始
+    time.sleep(service.guard.breaker.recovery_timeout)
+    run_phase("outage", service, stub, args, args.latency, 1.0)
+    time.sleep(service.guard.breaker.recovery_timeout)
+    # 半开状态只放行一个探测请求，探测成功前到达的请求仍然快速降级
+    run_phase("recovery", service, stub, args, args.latency, 0.0)
+    run_phase("steady", service, stub, args, args.latency, 0.0)
+    print(service.guard.stats())
+
+
+if __name__ == "__main__":
+    main()
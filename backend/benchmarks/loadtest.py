@@ -0,0 +1,307 @@
+"""
+全流程压测
+每个虚拟玩家循环执行：开始游戏 → 多轮（批量操作 + 偶尔请求提示 + 查询进度）→ 结束游戏。
+默认在进程内直接驱动 app.py 中的 FastAPI 应用，使用临时SQLite数据库和本地AI桩客户端；
+也可以通过 --base-url 压测已经启动的服务。
+
+用法：
+    python benchmarks/loadtest.py --players 50 --rounds 3 --ai-latency 0.5 --output results.json
+    python benchmarks/loadtest.py --base-url http://localhost:8000 --players 20
+    python benchmarks/loadtest.py --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GAME_TYPES = [
+    "process-scheduling", "memory-management", "file-system",
+    "process-sync", "deadlock", "io-management",
+]
+GAME_STATES = {
+    "process-scheduling": {"algorithm": ["fcfs", "sjf", "priority", "rr"]},
+    "memory-management": {"mode": ["fifo", "lru", "opt"]},
+    "file-system": {"mode": ["create", "delete", "search"]},
+    "process-sync": {"mode": ["mutex", "semaphore", "monitor"]},
+    "deadlock": {"strategy": ["prevention", "avoidance", "detection"]},
+    "io-management": {"algorithm": ["fcfs", "sstf", "scan", "cscan"]},
+}
+ACTION_TYPES = ["click", "move", "select", "drag", "error"]
+# 服务端校验的游戏结束时按开始时返回的题目随机作答
+ANSWERS = {
+    "process-scheduling": lambda problem, rnd: {"order": [p["id"] for p in problem["processes"]]},
+    "memory-management": lambda problem, rnd: {"faults": rnd.randint(0, len(problem["reference"]))},
+    "deadlock": lambda problem, rnd: {"safe": rnd.random() < 0.5},
+    "io-management": lambda problem, rnd: {"total_seek": rnd.randint(0, 400)},
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="OS Smart Village 全流程压测")
+    parser.add_argument("--base-url", help="压测已启动的服务；不指定时在进程内运行应用")
+    parser.add_argument("--players", type=int, default=20, help="并发玩家数")
+    parser.add_argument("--rounds", type=int, default=2, help="每个玩家玩的局数")
+    parser.add_argument("--bursts", type=int, default=5, help="每局的操作轮数")
+    parser.add_argument("--burst-size", type=int, default=10, help="每轮并发发送的操作数")
+    parser.add_argument("--hint-ratio", type=float, default=0.3, help="每轮请求提示的概率")
+    parser.add_argument("--think-time", type=float, default=0.0, help="每轮之间的等待（秒）")
+    parser.add_argument("--ai-latency", type=float, default=0.2, help="AI桩客户端延迟（秒）")
+    parser.add_argument("--ai-jitter", type=float, default=0.0, help="AI桩客户端延迟抖动（秒）")
+    parser.add_argument("--ai-error-rate", type=float, default=0.0, help="AI桩客户端失败率")
+    parser.add_argument("--no-ai-cache", action="store_true", help="关闭AI响应缓存")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果JSON文件")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="对比两次压测结果")
+    return parser.parse_args()
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩百分位"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """按接口记录延迟和错误"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        self.samples[name].append((time.perf_counter() - started) * 1000)
+        if not ok:
+            self.errors[name] += 1
+        return response if ok else None
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        all_samples = []
+        for name, values in sorted(self.samples.items()):
+            values = sorted(values)
+            all_samples.extend(values)
+            endpoints[name] = self._stats(values, self.errors[name], elapsed)
+        total = self._stats(sorted(all_samples), sum(self.errors.values()), elapsed)
+        return {"elapsed_s": round(elapsed, 3), "total": total, "endpoints": endpoints}
+
+    @staticmethod
+    def _stats(values: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+        return {
+            "requests": len(values),
+            "errors": errors,
+            "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3) if values else 0.0,
+        }
+
+
+async def player_flow(client, recorder: Recorder, args, rnd: random.Random, index: int):
+    """单个虚拟玩家的完整流程"""
+    player_id = f"bench_player_{index}"
+    for _ in range(args.rounds):
+        game_type = rnd.choice(GAME_TYPES)
+        level = rnd.choice(["beginner", "intermediate", "advanced"])
+        response = await recorder.call(client, "start", "POST", "/api/game/start", json={
+            "player_id": player_id, "game_type": game_type, "level": level,
+        })
+        if response is None:
+            continue
+        session_id, problem = response.json()["session_id"], response.json().get("problem")
+
+        for _ in range(args.bursts):
+            await asyncio.gather(*[
+                recorder.call(client, "action", "POST", "/api/game/action", json={
+                    "session_id": session_id,
+                    "action_type": rnd.choice(ACTION_TYPES),
+                    "action_data": {"x": rnd.randint(0, 800), "y": rnd.randint(0, 600)},
+                })
+                for _ in range(args.burst_size)
+            ])
+            if rnd.random() < args.hint_ratio:
+                field, choices = next(iter(GAME_STATES[game_type].items()))
+                await recorder.call(client, "hint", "POST", "/api/ai/hint", json={
+                    "session_id": session_id,
+                    "game_state": {"game": game_type, field: rnd.choice(choices), "stage": "learning"},
+                })
+            await recorder.call(client, "progress", "GET", f"/api/game/progress/{player_id}")
+            if args.think_time:
+                await asyncio.sleep(args.think_time)
+
+        await recorder.call(client, "end", "POST", "/api/game/end", json={
+            "session_id": session_id,
+            "score": rnd.randint(0, 100),
+            "stars": rnd.randint(0, 3),
+            "completed": rnd.random() < 0.6,
+            "submission": {"answer": ANSWERS[game_type](problem, rnd)} if problem else None,
+        })
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    """手动驱动ASGI lifespan，执行应用的启动和关闭钩子"""
+    queue: asyncio.Queue = asyncio.Queue()
+    await queue.put({"type": "lifespan.startup"})
+    started = asyncio.Event()
+    stopped = asyncio.Event()
+
+    async def receive():
+        return await queue.get()
+
+    async def send(message):
+        if message["type"].startswith("lifespan.startup"):
+            started.set()
+        elif message["type"].startswith("lifespan.shutdown"):
+            stopped.set()
+
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+    await started.wait()
+    try:
+        yield
+    finally:
+        await queue.put({"type": "lifespan.shutdown"})
+        await stopped.wait()
+        await task
+
+
+def _setup_in_process(args):
+    """使用临时数据库和AI桩客户端加载应用"""
+    workdir = tempfile.mkdtemp(prefix="os_village_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if args.no_ai_cache:
+        os.environ["AI_CACHE_BACKEND"] = "none"
+
+    from models.database import init_db
+    from utils.zhipu_ai import zhipu_ai_service
+    from benchmarks.stub_ai import StubZhipuAI
+
+    init_db()
+    zhipu_ai_service.client = StubZhipuAI(
+        latency=args.ai_latency, jitter=args.ai_jitter,
+        error_rate=args.ai_error_rate, seed=args.seed
+    )
+
+    from app import app
+    return app
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> Dict[str, Any]:
+    import httpx
+
+    recorder = Recorder()
+    rnd = random.Random(args.seed)
+    seeds = [rnd.randint(0, 1 << 30) for _ in range(args.players)]
+
+    async def drive(client):
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            player_flow(client, recorder, args, random.Random(seeds[i]), i)
+            for i in range(args.players)
+        ])
+        return time.perf_counter() - started
+
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=120) as client:
+            elapsed = await drive(client)
+    else:
+        app = _setup_in_process(args)
+        transport = httpx.ASGITransport(app=app)
+        async with _lifespan(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                elapsed = await drive(client)
+
+    result = recorder.summary(elapsed)
+    result["meta"] = {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "target": args.base_url or "in-process",
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "compare", "base_url")
+        },
+    }
+    return result
+
+
+def print_summary(result: Dict[str, Any]):
+    print(f"\n提交 {result['meta']['commit']}，耗时 {result['elapsed_s']}s")
+    header = f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, stats in rows:
+        print(f"{name:<10}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput_rps']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print("(延迟单位：毫秒)")
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    header = f"{'endpoint':<10}{'metric':>16}{'before':>12}{'after':>12}{'change':>10}"
+    print(header)
+    print("-" * len(header))
+    names = sorted(set(before["endpoints"]) | set(after["endpoints"]))
+    for name in names + ["TOTAL"]:
+        old = before["total"] if name == "TOTAL" else before["endpoints"].get(name)
+        new = after["total"] if name == "TOTAL" else after["endpoints"].get(name)
+        if not old or not new:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            print(f"{name:<10}{metric:>16}{old[metric]:>12}{new[metric]:>12}{change:>9.1f}%")
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = asyncio.run(run(args))
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+冷启动耗时
+两项测量，每项重复多次取中位数：
+- 导入耗时：在子进程中用 python -X importtime 导入 app，按顶层包汇总各模块自身的导入时间
+- 就绪耗时：启动 uvicorn 子进程，轮询 /health 直到返回200
+
+子进程使用临时目录中的数据库、AI缓存和共享状态文件，不影响本地数据。
+
+用法：
+    python benchmarks/startup.py --runs 5 --top 15 --output startup.json
+    python benchmarks/startup.py --compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="OS Smart Village 冷启动耗时")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的重复次数")
+    parser.add_argument("--top", type=int, default=15, help="输出导入最慢的顶层包数量")
+    parser.add_argument("--module", default="app", help="测量导入耗时的模块")
+    parser.add_argument("--no-ready", action="store_true", help="只测量导入耗时")
+    parser.add_argument("--ready-timeout", type=float, default=30.0, help="等待服务就绪的超时（秒）")
+    parser.add_argument("--output", help="结果JSON文件")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="对比两次结果文件")
+    return parser.parse_args()
+
+
+def _child_env(tmpdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmpdir, 'startup.db')}",
+        "AI_CACHE_PATH": os.path.join(tmpdir, "ai_cache.db"),
+        "SHARED_STATE_PATH": os.path.join(tmpdir, "shared_state.db"),
+        "ACTION_LOG_ARCHIVE_DIR": os.path.join(tmpdir, "archive"),
+    })
+    return env
+
+
+def measure_imports(module: str, env: Dict[str, str]) -> Tuple[float, Dict[str, float]]:
+    """返回 (导入总耗时毫秒, 顶层包 -> 自身导入耗时毫秒)"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+
+    total = 0.0
+    by_package: Dict[str, float] = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        by_package[name.split(".")[0]] += int(self_us) / 1000
+        if name == module and len(indent) <= 1:
+            total = int(cumulative_us) / 1000
+    return total, dict(by_package)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_ready(env: Dict[str, str], timeout: float) -> float:
+    """从启动进程到 /health 返回200的耗时（毫秒）"""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"服务启动失败:\n{proc.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"{timeout} 秒内服务未就绪")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> Dict[str, Any]:
+    import_totals: List[float] = []
+    packages: Dict[str, List[float]] = defaultdict(list)
+    ready: List[float] = []
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = _child_env(tmpdir)
+        for _ in range(args.runs):
+            total, by_package = measure_imports(args.module, env)
+            import_totals.append(total)
+            for name, value in by_package.items():
+                packages[name].append(value)
+        if not args.no_ready:
+            for _ in range(args.runs):
+                ready.append(measure_ready(env, args.ready_timeout))
+
+    slowest = sorted(
+        ((name, statistics.median(values)) for name, values in packages.items()),
+        key=lambda item: item[1], reverse=True
+    )[:args.top]
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "module": args.module,
+            "time": datetime.now().isoformat(timespec="seconds"),
+        },
+        "import_ms": round(statistics.median(import_totals), 1),
+        "ready_ms": round(statistics.median(ready), 1) if ready else None,
+        "packages": {name: round(value, 1) for name, value in slowest},
+    }
+
+
+def print_summary(result: Dict[str, Any]):
+    print(f"import {result['meta']['module']}: {result['import_ms']} ms (median)")
+    if result["ready_ms"] is not None:
+        print(f"time to ready: {result['ready_ms']} ms (median)")
+    print(f"\n{'package':<24}{'self ms':>10}")
+    print("-" * 34)
+    for name, value in result["packages"].items():
+        print(f"{name:<24}{value:>10}")
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    header = f"{'metric':<24}{'before':>12}{'after':>12}{'change':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = [("import_ms", before["import_ms"], after["import_ms"]),
+            ("ready_ms", before["ready_ms"], after["ready_ms"])]
+    for name in sorted(set(before["packages"]) | set(after["packages"])):
+        rows.append((name, before["packages"].get(name, 0.0), after["packages"].get(name, 0.0)))
+    for name, old, new in rows:
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"{name:<24}{old:>12}{new:>12}{change:>9.1f}%")
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    result = run(args)
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
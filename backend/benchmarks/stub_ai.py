@@ -0,0 +1,99 @@
+"""
+本地AI桩客户端
+接口与 zhipuai.ZhipuAI 的 chat.completions.create 一致，可设置延迟和失败率，
+用于压测和故障注入，不访问真实模型
+"""
+
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+
+class StubAPIError(RuntimeError):
+    """模拟上游返回的HTTP错误"""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StubCompletions:
+    """模拟 chat.completions"""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def create(self, model: str = None, messages=None, temperature: float = 0.7,
+               stream: bool = False, timeout: float = None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.failures += 1
+
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("stub upstream timeout")
+        time.sleep(delay)
+        if fail:
+            raise StubAPIError("stub upstream error")
+
+        prompt = messages[-1]["content"] if messages else ""
+        content = self._content_for(prompt)
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // 2,
+            completion_tokens=len(content) // 2,
+            total_tokens=(len(prompt) + len(content)) // 2,
+        )
+        if stream:
+            return self._stream(content, usage)
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    @staticmethod
+    def _stream(content: str, usage):
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        for index, piece in enumerate(pieces):
+            last = index == len(pieces) - 1
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=delta)],
+                usage=usage if last else None
+            )
+
+    @staticmethod
+    def _content_for(prompt: str) -> str:
+        if "练习题" in prompt:
+            return json.dumps({
+                "question": f"桩题目{random.randint(0, 1 << 30)}：村口排队买种子属于哪种调度？",
+                "options": ["先来先服务", "短作业优先", "时间片轮转", "优先级调度"],
+                "correct_answer": "A",
+                "explanation": "先到先得，就是先来先服务。",
+            }, ensure_ascii=False)
+        if "JSON格式返回" in prompt:
+            return json.dumps({
+                "evaluation": "干得不错！",
+                "suggestions": ["多观察", "多思考", "多练习"],
+                "review_topics": ["进程调度"],
+                "next_steps": ["挑战下一关"],
+            }, ensure_ascii=False)
+        return "就像村口排队打水，先来的先打，后来的耐心等一等。"
+
+
+class StubZhipuAI:
+    """模拟 zhipuai.ZhipuAI 客户端"""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: int = None):
+        self.completions = StubCompletions(latency, jitter, error_rate, seed)
+        self.chat = SimpleNamespace(completions=self.completions)
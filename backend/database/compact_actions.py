@@ -0,0 +1,32 @@
+"""
+操作日志压缩脚本
+将已结束会话的原始操作汇总到 action_summaries，原始行归档到按月分区的文件，并清理过期归档
+用法：
+    python database/compact_actions.py            # 执行一次压缩
+    python database/compact_actions.py --stats    # 查看归档情况
+"""
+
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from models.database import init_db
+from services.action_compaction import action_compactor
+
+
+if __name__ == "__main__":
+    init_db()
+    if "--stats" in sys.argv:
+        print(action_compactor.stats())
+        sys.exit(0)
+
+    print("压缩操作日志...")
+    result = action_compactor.run_once()
+    print(f"压缩完成：{result['sessions']} 个会话，{result['rows']} 条操作，"
+          f"删除过期归档 {result['expired_archives']} 个。")
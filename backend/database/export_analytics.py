@@ -0,0 +1,56 @@
+"""
+分析数据导出脚本
+将会话、操作日志、错误记录和AI交互导出为按日期和游戏类型分区的Parquet/Arrow文件，
+供教师做班级分析，不需要直接查询在线数据库
+用法：
+    python database/export_analytics.py --output exports              # 增量导出（Parquet）
+    python database/export_analytics.py --output exports --format arrow
+    python database/export_analytics.py --output exports --full       # 忽略水位线全部重新导出
+    python database/export_analytics.py --output exports --tables game_sessions errors
+"""
+
+import argparse
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.analytics_export import AnalyticsExporter, FORMATS, TABLES
+from services.action_compaction import action_compactor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="导出分析数据")
+    parser.add_argument("--output", required=True, help="输出目录")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--tables", nargs="+", choices=TABLES, default=list(TABLES))
+    parser.add_argument("--full", action="store_true", help="忽略水位线，全部重新导出")
+    parser.add_argument("--page-size", type=int, default=5000, help="每次查询的行数")
+    parser.add_argument("--rows-per-file", type=int, default=100000, help="单个文件的最大行数")
+    parser.add_argument("--no-archives", action="store_true", help="不导出已归档的操作日志")
+    parser.add_argument("--settle-minutes", type=float, default=action_compactor.settle_minutes,
+                        help="会话结束多少分钟后才导出会话和错误记录")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        exporter = AnalyticsExporter(
+            args.output, fmt=args.format, page_size=args.page_size,
+            rows_per_file=args.rows_per_file,
+            archive_dir=None if args.no_archives else action_compactor.archive_dir,
+            settle_minutes=args.settle_minutes
+        )
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+    results = exporter.export(tuple(args.tables), incremental=not args.full)
+    for table, result in results.items():
+        print(f"{table}: {result['rows']} 行，{result['files']} 个文件，水位线 {result['watermark']}")
@@ -0,0 +1,40 @@
+"""
+数据库迁移脚本
+用法：
+    python database/migrate.py                # 执行未执行的迁移
+    python database/migrate.py --check-plans  # 检查高频查询是否使用索引
+    python database/migrate.py --encode-actions  # 编码关闭编码期间写入的操作数据
+"""
+
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from models.database import engine, init_db
+from models.migrations import applied_versions, check_query_plans, encode_action_payloads
+
+
+if __name__ == "__main__":
+    print("执行数据库迁移...")
+    init_db()
+    print(f"当前已执行的迁移版本: {applied_versions(engine)}")
+
+    if "--encode-actions" in sys.argv:
+        with engine.begin() as conn:
+            count = encode_action_payloads(conn)
+        print(f"已编码 {count} 条操作数据；SQLite需要执行 VACUUM 才会缩小数据库文件。")
+
+    if "--check-plans" in sys.argv:
+        problems = check_query_plans(engine)
+        if problems:
+            print("以下查询未使用索引：")
+            for problem in problems:
+                print(f"  - {problem}")
+            sys.exit(1)
+        print("所有高频查询均使用索引。")
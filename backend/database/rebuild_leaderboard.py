@@ -0,0 +1,24 @@
+"""
+排行榜重建脚本
+根据已结束的游戏会话回填 leaderboard_entries 表
+"""
+
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from models.database import init_db
+from services.leaderboard import leaderboard
+
+
+if __name__ == "__main__":
+    print("重建排行榜...")
+    init_db()
+    count = leaderboard.rebuild()
+    print(f"排行榜重建完成，共 {count} 条记录！")
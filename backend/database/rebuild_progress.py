@@ -0,0 +1,24 @@
+"""
+进度汇总重建脚本
+根据已有的游戏会话回填 player_progress 表
+"""
+
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from models.database import init_db
+from services.game_service import GameService
+
+
+if __name__ == "__main__":
+    print("重建玩家进度汇总...")
+    init_db()
+    count = GameService.rebuild_progress()
+    print(f"进度汇总重建完成，共 {count} 条记录！")
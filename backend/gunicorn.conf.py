@@ -0,0 +1,31 @@
+"""
+Gunicorn配置
+用法: gunicorn -c gunicorn.conf.py app:app
+工作进程数由 WORKERS 指定，默认等于CPU核数；数据库初始化与迁移只在主进程启动时执行一次
+"""
+
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 未显式配置时按CPU核数启动，并让共享状态等模块按多进程模式初始化
+workers = int(os.getenv("WORKERS") or 0) or multiprocessing.cpu_count()
+os.environ["WORKERS"] = str(workers)
+
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 8000)}"
+# AI调用有独立的截止时间，这里只兜底卡死的进程
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    """在fork工作进程之前建表并执行迁移，避免多个进程同时迁移"""
+    from models.database import init_db, engine
+    init_db()
+    # 主进程的连接不能被fork出的工作进程共用
+    engine.dispose()
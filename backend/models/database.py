@@ -3,18 +3,63 @@
 使用SQLAlchemy ORM
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Float, JSON
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, DateTime, Float, JSON, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import os
 
+from utils.action_codec import action_codec
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database/os_village.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# SQLite连接参数，每个新连接建立时执行
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),  # 毫秒
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -20000)),  # 负数表示KB
+}
+
+
+def _engine_options(url: str) -> dict:
+    """根据数据库类型生成连接池配置"""
+    options = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+    if url.startswith("sqlite"):
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+        }
+        # 内存数据库使用SQLAlchemy默认的单连接池
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            return options
+
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    )
+    return options
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+
+@event.listens_for(engine, "connect")
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """为SQLite连接开启WAL等参数，减少 database is locked"""
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -44,22 +89,97 @@ class GameSession(Base):
     stars = Column(Integer, nullable=True)
     completed = Column(Boolean, default=False)
     level = Column(String(20), default="beginner")  # beginner, intermediate, advanced
+    # 服务端生成的题目参数（支持服务端校验的游戏），结束时按此校验答案
+    problem = Column(JSON, nullable=True)
+
+
+# 按玩家查询进度、历史记录时使用的复合索引（已有数据库通过 database/migrate.py 添加）
+Index("ix_game_sessions_player_game", GameSession.player_id, GameSession.game_type)
+Index("ix_game_sessions_player_start", GameSession.player_id, GameSession.start_time.desc())
+
+
+class PlayerProgress(Base):
+    """玩家进度汇总表（按玩家和游戏类型增量维护）"""
+    __tablename__ = "player_progress"
+    __table_args__ = (
+        UniqueConstraint("player_id", "game_type", name="uq_player_progress_player_game"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    player_id = Column(String(50), nullable=False)
+    game_type = Column(String(50), nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    completed_count = Column(Integer, default=0, nullable=False)  # 已完成的会话数
+    best_score = Column(Integer, default=0, nullable=False)
+    best_stars = Column(Integer, default=0, nullable=False)
+    completed = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class LeaderboardEntry(Base):
+    """排行榜（每个玩家在每个游戏类型和难度下的最好成绩）"""
+    __tablename__ = "leaderboard_entries"
+    __table_args__ = (
+        UniqueConstraint("game_type", "level", "player_id", name="uq_leaderboard_board_player"),
+        Index("ix_leaderboard_updated_at", "updated_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    game_type = Column(String(50), nullable=False)
+    level = Column(String(20), nullable=False)
+    player_id = Column(String(50), nullable=False)
+    best_score = Column(Integer, default=0, nullable=False)
+    best_stars = Column(Integer, default=0, nullable=False)
+    achieved_at = Column(DateTime, nullable=False)  # 同分时先达到的排前面
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 
 class ActionLog(Base):
-    """操作日志表"""
+    """操作日志表（只保留进行中的会话，已结束的会话由压缩任务归档）"""
     __tablename__ = "action_logs"
+    # 压缩会删除旧行，SQLite需要AUTOINCREMENT才能保证ID不被复用（已有数据库由迁移4重建）
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(50), nullable=False, index=True)
     action_type = Column(String(50), nullable=False)  # start, move, click, error, hint, etc.
-    action_data = Column(JSON, nullable=True)
+    # 未编码的操作数据（旧数据或关闭编码时写入）；新数据写入 payload，读取统一用 action_data
+    raw_data = Column("action_data", JSON(none_as_null=True), nullable=True)
+    payload = Column(LargeBinary, nullable=True)  # 紧凑编码，见 utils/action_codec.py
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    @property
+    def action_data(self):
+        if self.payload is not None:
+            return action_codec.decode(self.payload)
+        return self.raw_data
+
+    @action_data.setter
+    def action_data(self, value):
+        self.raw_data = value
+        self.payload = None
+
+
+class ActionSummary(Base):
+    """操作日志压缩后的会话汇总（原始操作归档到按月分区的文件）"""
+    __tablename__ = "action_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(50), unique=True, nullable=False)
+    action_count = Column(Integer, default=0, nullable=False)
+    action_counts = Column(JSON, nullable=False)  # {action_type: 次数}
+    first_action_at = Column(DateTime)
+    last_action_at = Column(DateTime)
+    duration = Column(Float, default=0.0, nullable=False)  # 第一次到最后一次操作的秒数
+    compacted_at = Column(DateTime, default=datetime.utcnow)
+
 
 class ErrorRecord(Base):
-    """错误记录表"""
+    """错误记录表（每个会话的每种错误一行，count 累加）"""
     __tablename__ = "errors"
+    __table_args__ = (
+        Index("uq_errors_session_type", "session_id", "error_type", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(50), nullable=False, index=True)
@@ -74,7 +194,7 @@ class AIInteraction(Base):
     __tablename__ = "ai_interactions"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(50), nullable=False)
+    session_id = Column(String(50), nullable=False, index=True)
     interaction_type = Column(String(50), nullable=False)  # hint, feedback, question, quiz
     prompt = Column(String(1000))
     response = Column(String(2000))
@@ -82,6 +202,57 @@ class AIInteraction(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
 
+class QuizBankItem(Base):
+    """预生成练习题库"""
+    __tablename__ = "quiz_bank"
+    __table_args__ = (
+        Index("ix_quiz_bank_topic_level", "topic", "player_level"),
+        # 同一道题可以出现在不同的 (topic, player_level) 分组中
+        UniqueConstraint("topic", "player_level", "fingerprint", name="uq_quiz_bank_bucket_fingerprint"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String(100), nullable=False)
+    player_level = Column(String(20), nullable=False)
+    question = Column(String(1000), nullable=False)
+    options = Column(JSON, nullable=False)
+    correct_answer = Column(String(50), nullable=False)
+    explanation = Column(String(2000))
+    fingerprint = Column(String(40), nullable=False)  # 题目去重
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class QuizServed(Base):
+    """玩家已做过的题目"""
+    __tablename__ = "quiz_served"
+    __table_args__ = (
+        UniqueConstraint("player_id", "quiz_id", name="uq_quiz_served_player_quiz"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    player_id = Column(String(50), nullable=False)
+    quiz_id = Column(Integer, nullable=False)
+    served_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Report(Base):
+    """学习报告（每个玩家一份，会话结束后由后台任务重新计算）"""
+    __tablename__ = "reports"
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(String(50), unique=True, nullable=False)
+    player_id = Column(String(50), unique=True, nullable=False)
+    total_time = Column(Float, default=0.0, nullable=False)  # 已结束会话的游戏时长（秒）
+    total_games = Column(Integer, default=0, nullable=False)
+    overall_score = Column(Float, default=0.0, nullable=False)
+    game_breakdown = Column(JSON, nullable=False)
+    error_stats = Column(JSON, nullable=False)  # {game_type: {error_type: 次数}}
+    ai_suggestions = Column(JSON, nullable=False)
+    stale = Column(Boolean, default=False, nullable=False)  # 有新会话后置为True，等待重新计算
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
 def init_db():
     """初始化数据库"""
     import os
@@ -89,6 +260,10 @@ def init_db():
     os.makedirs(db_path, exist_ok=True)
 
     Base.metadata.create_all(bind=engine)
+
+    # 为已有数据库补齐索引等结构变更
+    from models.migrations import run_migrations
+    run_migrations(engine)
     print("Database initialized successfully!")
 
 
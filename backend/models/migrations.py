@@ -0,0 +1,273 @@
+"""
+数据库迁移
+Base.metadata.create_all 只会创建缺失的表，已有表上的索引和字段变更在这里按版本号执行。
+每个迁移只执行一次，已执行的版本记录在 schema_migrations 表中。
+"""
+
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple, Union
+
+from sqlalchemy import JSON, LargeBinary, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from models.database import ActionLog, GameSession, PlayerProgress, AIInteraction, QuizBankItem, Report, ErrorRecord, LeaderboardEntry
+from utils.action_codec import action_codec
+
+# 迁移步骤可以是SQL语句，也可以是接收数据库连接的函数
+MigrationStep = Union[str, Callable[[Connection], None]]
+
+
+def encode_action_payloads(conn: Connection, batch_size: int = 1000) -> int:
+    """把 action_logs 中未编码的 action_data 编码到 payload 列，返回处理的行数"""
+    if not action_codec.enabled:
+        return 0
+    total, last_id = 0, 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT a.id, a.action_type, a.action_data, s.game_type FROM action_logs a "
+            "LEFT JOIN game_sessions s ON s.session_id = a.session_id "
+            "WHERE a.id > :last_id AND a.payload IS NULL AND a.action_data IS NOT NULL "
+            "ORDER BY a.id LIMIT :limit"
+        ), {"last_id": last_id, "limit": batch_size}).fetchall()
+        if not rows:
+            return total
+        values = []
+        for row_id, action_type, data, game_type in rows:
+            if isinstance(data, (str, bytes)):
+                data = json.loads(data)
+            values.append({"id": row_id, "payload": action_codec.encode(game_type, action_type, data)})
+        conn.execute(text("UPDATE action_logs SET payload = :payload, action_data = NULL WHERE id = :id"), values)
+        total += len(rows)
+        last_id = rows[-1][0]
+
+
+def _add_action_payload(conn: Connection):
+    columns = {column["name"] for column in inspect(conn).get_columns("action_logs")}
+    if "payload" not in columns:
+        blob = LargeBinary().compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE action_logs ADD COLUMN payload {blob}"))
+    encode_action_payloads(conn)
+
+
+def _add_session_problem(conn: Connection):
+    columns = {column["name"] for column in inspect(conn).get_columns("game_sessions")}
+    if "problem" not in columns:
+        json_type = JSON().compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE game_sessions ADD COLUMN problem {json_type}"))
+
+
+def _archived_max_id(archive_dir: str) -> int:
+    """归档文件中最大的在线表ID"""
+    from services.action_compaction import archive_path, list_archives
+    max_id = 0
+    for month in list_archives(archive_dir):
+        conn = sqlite3.connect(archive_path(archive_dir, month))
+        try:
+            max_id = max(max_id, conn.execute("SELECT MAX(id) FROM action_logs").fetchone()[0] or 0)
+        except sqlite3.OperationalError:  # 空文件，还没有建表
+            pass
+        finally:
+            conn.close()
+    return max_id
+
+
+def rebuild_action_logs(conn: Connection, archive_dir: Optional[str] = None):
+    """按 AUTOINCREMENT 重建 action_logs（仅SQLite）
+
+    sqlite_autoincrement 只在建表时生效。旧表没有它时，压缩删除最大ID的行后SQLite会复用这些ID，
+    导出水位线和归档去重都依赖ID单调递增。重建后把序列推进到在线表和归档文件中的最大ID之后。
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'action_logs'"
+    )).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return
+
+    conn.execute(text("ALTER TABLE action_logs RENAME TO action_logs_old"))
+    # 索引随表改名但保留原名，先删除，建新表时重新创建
+    indexes = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'action_logs_old' "
+        "AND sql IS NOT NULL"
+    )).scalars().all()
+    for name in indexes:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    ActionLog.__table__.create(conn)
+    conn.execute(text(
+        "INSERT INTO action_logs (id, session_id, action_type, action_data, payload, timestamp) "
+        "SELECT id, session_id, action_type, action_data, payload, timestamp FROM action_logs_old"
+    ))
+    conn.execute(text("DROP TABLE action_logs_old"))
+
+    if archive_dir is None:
+        archive_dir = os.getenv("ACTION_LOG_ARCHIVE_DIR", "database/archive")
+    max_id = max(conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM action_logs")).scalar(),
+                 _archived_max_id(archive_dir))
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'action_logs'"))
+    if max_id:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('action_logs', :seq)"),
+                     {"seq": max_id})
+
+
+def _quiz_fingerprint_per_bucket(conn: Connection):
+    """题目指纹从全表唯一改为按 (topic, player_level) 分组唯一"""
+    global_unique = [
+        constraint for constraint in inspect(conn).get_unique_constraints("quiz_bank")
+        if constraint["column_names"] == ["fingerprint"]
+    ]
+    if not global_unique:
+        return
+    if conn.dialect.name != "sqlite":
+        for constraint in global_unique:
+            conn.execute(text(f'ALTER TABLE quiz_bank DROP CONSTRAINT "{constraint["name"]}"'))
+        conn.execute(text(
+            "ALTER TABLE quiz_bank ADD CONSTRAINT uq_quiz_bank_bucket_fingerprint "
+            "UNIQUE (topic, player_level, fingerprint)"
+        ))
+        return
+
+    # SQLite不能删除表约束，重建表；保留ID，quiz_served 按ID记录已出的题
+    conn.execute(text("ALTER TABLE quiz_bank RENAME TO quiz_bank_old"))
+    indexes = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'quiz_bank_old' "
+        "AND sql IS NOT NULL"
+    )).scalars().all()
+    for name in indexes:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    QuizBankItem.__table__.create(conn)
+    conn.execute(text(
+        "INSERT INTO quiz_bank (id, topic, player_level, question, options, correct_answer, "
+        "explanation, fingerprint, created_at) "
+        "SELECT id, topic, player_level, question, options, correct_answer, "
+        "explanation, fingerprint, created_at FROM quiz_bank_old"
+    ))
+    conn.execute(text("DROP TABLE quiz_bank_old"))
+
+
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (1, "按玩家查询会话与按会话查询AI交互的索引", [
+        "CREATE INDEX IF NOT EXISTS ix_game_sessions_player_game "
+        "ON game_sessions (player_id, game_type)",
+        "CREATE INDEX IF NOT EXISTS ix_game_sessions_player_start "
+        "ON game_sessions (player_id, start_time DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_ai_interactions_session_id "
+        "ON ai_interactions (session_id)",
+    ]),
+    (2, "错误记录按 (session_id, error_type) 去重，支持累加写入", [
+        # 先把重复的行合并到ID最小的一行，再建唯一索引
+        "UPDATE errors SET count = 1 WHERE count IS NULL",
+        "UPDATE errors SET count = ("
+        "SELECT SUM(e.count) FROM errors e "
+        "WHERE e.session_id = errors.session_id AND e.error_type = errors.error_type"
+        ") WHERE id IN ("
+        "SELECT MIN(id) FROM errors GROUP BY session_id, error_type HAVING COUNT(*) > 1)",
+        "DELETE FROM errors WHERE id NOT IN ("
+        "SELECT MIN(id) FROM errors GROUP BY session_id, error_type)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_errors_session_type "
+        "ON errors (session_id, error_type)",
+    ]),
+    (3, "操作数据按游戏类型紧凑编码到 action_logs.payload", [
+        _add_action_payload,
+    ]),
+    (4, "action_logs 使用 AUTOINCREMENT，压缩删除后ID不再复用", [
+        rebuild_action_logs,
+    ]),
+    (5, "游戏会话保存服务端生成的题目", [
+        _add_session_problem,
+    ]),
+    (6, "题库按 (topic, player_level) 分组去重", [
+        _quiz_fingerprint_per_bucket,
+    ]),
+]
+
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at TIMESTAMP)"
+    ))
+
+
+def applied_versions(engine: Engine) -> List[int]:
+    """已执行的迁移版本"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        rows = conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))
+        return [row[0] for row in rows]
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """执行所有未执行的迁移，返回本次执行的版本号"""
+    done = set(applied_versions(engine))
+    executed = []
+    for version, description, steps in MIGRATIONS:
+        if version in done:
+            continue
+        # 每个迁移在单独的事务中执行
+        with engine.begin() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) "
+                     "VALUES (:version, :description, :applied_at)"),
+                {"version": version, "description": description, "applied_at": datetime.utcnow()}
+            )
+        print(f"已执行迁移 {version}: {description}")
+        executed.append(version)
+    return executed
+
+
+# ============ 查询计划检查 ============
+
+# 高频查询：(名称, 查询语句, 必须使用索引的表)
+HOT_QUERIES = [
+    ("history", select(GameSession).where(GameSession.player_id == "p")
+        .order_by(GameSession.start_time.desc()).limit(10), "game_sessions"),
+    ("player_game_sessions", select(GameSession).where(
+        GameSession.player_id == "p", GameSession.game_type == "g"), "game_sessions"),
+    ("session_lookup", select(GameSession).where(GameSession.session_id == "s"), "game_sessions"),
+    ("progress", select(PlayerProgress).where(PlayerProgress.player_id == "p"), "player_progress"),
+    ("ai_interactions_by_session", select(AIInteraction).where(
+        AIInteraction.session_id == "s"), "ai_interactions"),
+    ("quiz_bucket", select(QuizBankItem).where(
+        QuizBankItem.topic == "t", QuizBankItem.player_level == "l"), "quiz_bank"),
+    ("errors_by_session", select(ErrorRecord).where(ErrorRecord.session_id == "s"), "errors"),
+    ("leaderboard_board", select(LeaderboardEntry).where(
+        LeaderboardEntry.game_type == "g", LeaderboardEntry.level == "l"), "leaderboard_entries"),
+    ("report_lookup", select(Report).where(Report.report_id == "r"), "reports"),
+    ("report_by_player", select(Report).where(Report.player_id == "p"), "reports"),
+]
+
+
+def plan_problems(name: str, table: str, plan: List[str]) -> List[str]:
+    """查询计划中对 table 的全表扫描和临时排序"""
+    # 新版SQLite输出 "SCAN t"，3.36之前为 "SCAN TABLE t"
+    scan = re.compile(rf"^SCAN (TABLE )?{re.escape(table)}\b")
+    return [f"{name}: {detail}" for detail in plan
+            if scan.match(detail) or "USE TEMP B-TREE" in detail]
+
+
+def query_plan(conn: Connection, query) -> List[str]:
+    """EXPLAIN QUERY PLAN 的每一步（仅SQLite）"""
+    sql = str(query.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def check_query_plans(engine: Engine) -> List[str]:
+    """用 EXPLAIN QUERY PLAN 检查高频查询，返回发生全表扫描或临时排序的查询（仅SQLite）"""
+    if engine.dialect.name != "sqlite":
+        return []
+
+    problems = []
+    with engine.connect() as conn:
+        for name, query, table in HOT_QUERIES:
+            problems.extend(plan_problems(name, table, query_plan(conn, query)))
+    return problems
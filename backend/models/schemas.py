@@ -34,12 +34,18 @@ class GameStartRequest(BaseModel):
 class GameStartResponse(BaseModel):
     session_id: str
     message: str
+    problem: Optional[Dict[str, Any]] = Field(
+        default=None, description="服务端生成的题目参数；支持服务端校验的游戏结束时按此题目校验 answer"
+    )
 
 
 class ActionRequest(BaseModel):
     session_id: str
     action_type: str
     action_data: Optional[Dict[str, Any]] = None
+    timestamp: Optional[datetime] = Field(
+        default=None, description="客户端记录操作的时间，超出会话开始时间到服务器当前时间的范围时截断"
+    )
 
 
 class ActionResponse(BaseModel):
@@ -47,17 +53,33 @@ class ActionResponse(BaseModel):
     message: str
 
 
+class ActionBatchRequest(BaseModel):
+    actions: List[ActionRequest] = Field(..., min_length=1, max_length=1000, description="操作列表，可跨会话")
+
+
+class ActionBatchResponse(BaseModel):
+    success: bool
+    accepted: int
+    message: str
+    rejected: List[int] = Field(default_factory=list, description="没有记录的操作（会话不存在或已结束）在请求中的下标")
+
+
 class GameEndRequest(BaseModel):
     session_id: str
     score: int
     stars: int
     completed: bool
+    submission: Optional[Dict[str, Any]] = Field(
+        default=None, description="答案（answer）；支持服务端校验的游戏必须提交，按开始时的题目校验，"
+                                  "以校验结果作为分数和星级"
+    )
 
 
 class GameEndResponse(BaseModel):
     message: str
     final_score: int
     stars: int
+    validated: bool = False
 
 
 class ProgressResponse(BaseModel):
@@ -94,6 +116,7 @@ class FeedbackResponse(BaseModel):
 class QuestionRequest(BaseModel):
     question: str
     context: Optional[str] = None
+    session_id: Optional[str] = Field(default=None, description="流式问答时用于记录AI交互")
 
 
 class QuestionResponse(BaseModel):
@@ -104,6 +127,7 @@ class QuestionResponse(BaseModel):
 class QuizRequest(BaseModel):
     player_level: str
     topic: str
+    player_id: Optional[str] = Field(default=None, description="提供时不会重复出玩家做过的题")
 
 
 class QuizResponse(BaseModel):
@@ -127,6 +151,92 @@ class ReportResponse(BaseModel):
     game_breakdown: Dict[str, Dict[str, Any]]
     ai_suggestions: List[str]
     created_at: datetime
+    error_stats: Dict[str, Dict[str, int]] = {}
+    updated_at: Optional[datetime] = None
+    stale: bool = False
+
+
+# ============ 排行榜 ============
+class LeaderboardEntryResponse(BaseModel):
+    rank: int
+    player_id: str
+    score: int
+    stars: int
+    achieved_at: datetime
+
+
+class LeaderboardResponse(BaseModel):
+    game_type: str
+    level: str
+    total: int
+    entries: List[LeaderboardEntryResponse]
+
+
+class PlayerRankResponse(LeaderboardEntryResponse):
+    game_type: str
+    level: str
+    total: int
+    percentile: float
+
+
+# ============ 算法模拟 ============
+class ProcessSpec(BaseModel):
+    id: Optional[str] = None
+    arrival: int = Field(default=0, ge=0)
+    burst: int = Field(..., gt=0)
+    priority: int = 0
+
+
+class SchedulingRequest(BaseModel):
+    algorithm: str = Field(default="fcfs", description="fcfs, sjf, priority, rr")
+    processes: List[ProcessSpec] = Field(..., min_length=1, max_length=10000)
+    quantum: int = Field(default=2, gt=0)
+
+
+class PagingRequest(BaseModel):
+    algorithm: str = Field(default="lru", description="fifo, lru, opt")
+    reference: List[int] = Field(..., min_length=1, max_length=100000)
+    frames: int = Field(default=3, gt=0, le=1024)
+
+
+class ResourceRequest(BaseModel):
+    process: int = Field(..., ge=0)
+    resources: List[int]
+
+
+class BankersRequest(BaseModel):
+    available: List[int] = Field(..., min_length=1, max_length=100)
+    allocation: List[List[int]] = Field(..., min_length=1, max_length=10000)
+    maximum: List[List[int]] = Field(..., min_length=1, max_length=10000)
+    request: Optional[ResourceRequest] = None
+
+
+class DeadlockDetectRequest(BaseModel):
+    available: List[int] = Field(..., min_length=1, max_length=100)
+    allocation: List[List[int]] = Field(..., min_length=1, max_length=10000)
+    request: List[List[int]] = Field(..., min_length=1, max_length=10000)
+
+
+class DiskRequest(BaseModel):
+    algorithm: str = Field(default="fcfs", description="fcfs, sstf, scan, cscan, look, clook")
+    requests: List[int] = Field(..., max_length=100000)
+    head: int = Field(..., ge=0)
+    cylinders: int = Field(default=200, gt=0)
+    direction: str = Field(default="up", description="磁头初始方向: up, down")
+
+
+class ValidateRequest(BaseModel):
+    game_type: Optional[str] = Field(default=None, description="练习时必填；带 session_id 时取会话的游戏类型")
+    session_id: Optional[str] = Field(default=None, description="按该会话的服务端题目校验（会话结束后）")
+    submission: Dict[str, Any] = Field(..., description="answer；练习时同时包含题目参数")
+
+
+class ValidationResponse(BaseModel):
+    game_type: str
+    checks: Dict[str, bool]
+    expected: Dict[str, Any]
+    score: int
+    stars: int
 
 
 # ============ 通用响应 ============
@@ -0,0 +1,291 @@
+"""
+操作日志压缩与归档
+已结束（或长时间无人继续）的会话，其原始操作汇总为 action_summaries 中的一行，
+原始行按操作时间写入按月分区的归档文件（database/archive/action_logs_YYYYMM.db）后从在线表删除。
+在线 action_logs 表只保留进行中的会话，写入性能不随运行时间下降；
+超过保留期的归档文件整月删除。
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from models.database import SessionLocal, ActionLog, ActionSummary, GameSession
+from utils.shared_state import shared_state
+
+ARCHIVE_PATTERN = re.compile(r"^action_logs_(\d{6})\.db$")
+COMPACTOR_LEASE = "action-compactor"
+
+
+def archive_path(archive_dir: str, month: str) -> str:
+    """某个月（YYYYMM）的归档文件路径"""
+    return os.path.join(archive_dir, f"action_logs_{month}.db")
+
+
+def list_archives(archive_dir: str) -> List[str]:
+    """已有的归档月份，按时间升序"""
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted(
+        match.group(1) for match in map(ARCHIVE_PATTERN.match, os.listdir(archive_dir)) if match
+    )
+
+
+def _open_archive(path: str) -> sqlite3.Connection:
+    # 在线表的ID在SQLite清空后可能被复用，归档用 (session_id, id) 去重
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS action_logs ("
+        "archive_id INTEGER PRIMARY KEY, id INTEGER NOT NULL, session_id TEXT NOT NULL, "
+        "action_type TEXT NOT NULL, action_data TEXT, timestamp TEXT, "
+        "UNIQUE (session_id, id))"
+    )
+    return conn
+
+
+def iter_archive(path: str, batch_size: int = 1000, min_id: int = 0) -> Iterator[Dict[str, Any]]:
+    """按写入顺序逐行读取归档文件，min_id 只返回在线表ID大于该值的行"""
+    conn = sqlite3.connect(path)
+    try:
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT archive_id, id, session_id, action_type, action_data, timestamp "
+                "FROM action_logs WHERE archive_id > ? AND id > ? ORDER BY archive_id LIMIT ?",
+                (last_id, min_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for _, row_id, session_id, action_type, action_data, timestamp in rows:
+                yield {
+                    "id": row_id,
+                    "session_id": session_id,
+                    "action_type": action_type,
+                    "action_data": json.loads(action_data) if action_data else None,
+                    "timestamp": datetime.fromisoformat(timestamp) if timestamp else None,
+                }
+            last_id = rows[-1][0]
+    finally:
+        conn.close()
+
+
+class ActionLogCompactor:
+    """定期压缩在线操作日志"""
+
+    def __init__(self, archive_dir: str = "database/archive", archive: bool = True,
+                 retention_months: int = 12, settle_minutes: float = 10,
+                 abandon_hours: float = 24, batch_sessions: int = 200,
+                 interval: float = 3600):
+        self.archive_dir = archive_dir
+        self.archive = archive
+        self.retention_months = retention_months
+        self.settle_minutes = settle_minutes
+        self.abandon_hours = abandon_hours
+        self.batch_sessions = batch_sessions
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+
+        # 统计计数
+        self.runs = 0
+        self.sessions_compacted = 0
+        self.rows_archived = 0
+        self.rows_dropped = 0
+        self.archives_expired = 0
+        self.last_run_ms = 0.0
+
+    def start(self):
+        """启动定期压缩线程，interval<=0 时只能手动执行"""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="action-log-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止定期压缩线程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        shared_state.release_lease(COMPACTOR_LEASE)
+
+    def run_once(self, now: Optional[datetime] = None,
+                 stop: Optional[threading.Event] = None) -> Dict[str, int]:
+        """压缩所有符合条件的会话并清理过期归档，返回本次处理的数量；stop被设置时提前结束"""
+        now = now or datetime.utcnow()
+        result = {"sessions": 0, "rows": 0, "expired_archives": 0}
+        with self._run_lock:
+            started = time.perf_counter()
+            while not (stop and stop.is_set()):
+                sessions, rows = self._compact_batch(now)
+                result["sessions"] += sessions
+                result["rows"] += rows
+                if sessions < self.batch_sessions:
+                    break
+            result["expired_archives"] = self.expire_archives(now)
+            self.runs += 1
+            self.last_run_ms = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def expire_archives(self, now: Optional[datetime] = None) -> int:
+        """删除超过保留期的归档文件，retention_months<=0 时永久保留"""
+        if self.retention_months <= 0:
+            return 0
+        now = now or datetime.utcnow()
+        month_index = now.year * 12 + now.month - 1 - self.retention_months
+        cutoff = f"{month_index // 12:04d}{month_index % 12 + 1:02d}"
+        expired = 0
+        for month in list_archives(self.archive_dir):
+            if month < cutoff:
+                os.remove(archive_path(self.archive_dir, month))
+                expired += 1
+        self.archives_expired += expired
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "sessions_compacted": self.sessions_compacted,
+            "rows_archived": self.rows_archived,
+            "rows_dropped": self.rows_dropped,
+            "archives_expired": self.archives_expired,
+            "last_run_ms": self.last_run_ms,
+            "archives": list_archives(self.archive_dir),
+        }
+
+    # ============ 压缩 ============
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            # 多worker时只由持有租约的一个进程执行；租约长于间隔，持有者每个周期续期
+            if not shared_state.acquire_lease(COMPACTOR_LEASE, ttl=self.interval * 2):
+                continue
+            try:
+                result = self.run_once(stop=self._stop)
+                if result["sessions"]:
+                    print(f"操作日志压缩: {result['sessions']} 个会话，{result['rows']} 条操作")
+            except Exception as e:
+                print(f"操作日志压缩失败: {e}")
+
+    def _compact_batch(self, now: datetime) -> Tuple[int, int]:
+        """压缩一批会话，返回 (会话数, 操作行数)"""
+        settled = now - timedelta(minutes=self.settle_minutes)
+        abandoned = now - timedelta(hours=self.abandon_hours)
+
+        db = SessionLocal()
+        try:
+            # 已结束且写缓冲已落库的会话、长时间未结束的会话，以及找不到会话的孤立操作
+            session_ids = [row[0] for row in db.query(ActionLog.session_id).outerjoin(
+                GameSession, GameSession.session_id == ActionLog.session_id
+            ).filter(or_(
+                GameSession.end_time < settled,
+                and_(GameSession.end_time.is_(None), GameSession.start_time < abandoned),
+                and_(GameSession.id.is_(None), ActionLog.timestamp < abandoned),
+            )).distinct().limit(self.batch_sessions).all()]
+            if not session_ids:
+                return 0, 0
+
+            rows = db.query(ActionLog).filter(
+                ActionLog.session_id.in_(session_ids)
+            ).order_by(ActionLog.id).all()
+
+            # 先写归档再删除在线数据；归档按 (session_id, id) 去重，中断后重跑不会重复
+            if self.archive:
+                self._write_archive(rows)
+
+            self._merge_summaries(db, session_ids, rows, now)
+            db.query(ActionLog).filter(
+                ActionLog.id.in_([row.id for row in rows])
+            ).delete(synchronize_session=False)
+            db.commit()
+
+            self.sessions_compacted += len(session_ids)
+            if self.archive:
+                self.rows_archived += len(rows)
+            else:
+                self.rows_dropped += len(rows)
+            return len(session_ids), len(rows)
+
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _merge_summaries(db, session_ids: List[str], rows: List[ActionLog], now: datetime):
+        """汇总各会话的操作；会话压缩后又有迟到的操作时与已有汇总合并"""
+        grouped: Dict[str, List[ActionLog]] = {}
+        for row in rows:
+            grouped.setdefault(row.session_id, []).append(row)
+
+        existing = {
+            summary.session_id: summary
+            for summary in db.query(ActionSummary).filter(ActionSummary.session_id.in_(session_ids))
+        }
+        for session_id, actions in grouped.items():
+            counts = Counter(action.action_type for action in actions)
+            times = [action.timestamp for action in actions if action.timestamp]
+            summary = existing.get(session_id)
+            if summary is None:
+                summary = ActionSummary(session_id=session_id, action_count=0, action_counts={})
+                db.add(summary)
+            else:
+                counts.update(summary.action_counts or {})
+                times += [t for t in (summary.first_action_at, summary.last_action_at) if t]
+
+            summary.action_counts = dict(counts)
+            summary.action_count = sum(counts.values())
+            summary.first_action_at = min(times) if times else None
+            summary.last_action_at = max(times) if times else None
+            summary.duration = (
+                (summary.last_action_at - summary.first_action_at).total_seconds() if times else 0.0
+            )
+            summary.compacted_at = now
+
+    def _write_archive(self, rows: List[ActionLog]):
+        """按操作时间所在月份写入归档文件"""
+        by_month: Dict[str, List[tuple]] = {}
+        for row in rows:
+            month = (row.timestamp or datetime.utcnow()).strftime("%Y%m")
+            by_month.setdefault(month, []).append((
+                row.id, row.session_id, row.action_type,
+                json.dumps(row.action_data) if row.action_data is not None else None,
+                row.timestamp.isoformat() if row.timestamp else None,
+            ))
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        for month, values in by_month.items():
+            conn = _open_archive(archive_path(self.archive_dir, month))
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO action_logs "
+                        "(id, session_id, action_type, action_data, timestamp) VALUES (?, ?, ?, ?, ?)",
+                        values
+                    )
+            finally:
+                conn.close()
+
+
+# 全局实例
+action_compactor = ActionLogCompactor(
+    archive_dir=os.getenv("ACTION_LOG_ARCHIVE_DIR", "database/archive"),
+    archive=os.getenv("ACTION_LOG_ARCHIVE", "true").lower() in ("1", "true", "yes"),
+    retention_months=int(os.getenv("ACTION_LOG_RETENTION_MONTHS", 12)),
+    settle_minutes=float(os.getenv("ACTION_LOG_SETTLE_MINUTES", 10)),
+    abandon_hours=float(os.getenv("ACTION_LOG_ABANDON_HOURS", 24)),
+    batch_sessions=int(os.getenv("ACTION_LOG_COMPACT_BATCH", 200)),
+    interval=float(os.getenv("ACTION_LOG_COMPACT_INTERVAL", 3600)),
+)
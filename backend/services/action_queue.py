@@ -0,0 +1,283 @@
+"""
+操作日志写缓冲队列
+请求只负责入队，后台线程按数量或时间阈值批量写入ActionLog。
+多worker部署时会话登记表每个进程一份，其他进程结束的会话在本进程可能仍被当作进行中；
+写入前按 game_sessions.end_time 再检查一次，丢弃时间晚于会话结束时间的操作。
+"""
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import insert
+
+from models.database import SessionLocal, ActionLog, ErrorRecord, GameSession
+from utils.action_codec import action_codec
+from utils.shared_state import worker_count
+
+# 该类型的操作同时累加到错误记录表
+ERROR_ACTION_TYPE = "error"
+
+
+def ended_after(db, rows: List[Dict[str, Any]]) -> List[int]:
+    """时间晚于所属会话结束时间的操作在 rows 中的下标"""
+    ended = dict(db.query(GameSession.session_id, GameSession.end_time).filter(
+        GameSession.session_id.in_({row["session_id"] for row in rows}),
+        GameSession.end_time.isnot(None)
+    ).all())
+    if not ended:
+        return []
+    return [index for index, row in enumerate(rows)
+            if row["session_id"] in ended and row["timestamp"] > ended[row["session_id"]]]
+
+
+def insert_actions(db, rows: List[Dict[str, Any]], check_ended: bool = False) -> List[int]:
+    """在当前事务中批量插入ActionLog（操作数据按游戏类型编码），错误操作累加到ErrorRecord（不提交）；
+    check_ended 时先丢弃会话结束之后的操作，返回丢弃的下标"""
+    dropped = ended_after(db, rows) if check_ended and rows else []
+    if dropped:
+        skip = set(dropped)
+        rows = [row for index, row in enumerate(rows) if index not in skip]
+    if rows:
+        db.execute(insert(ActionLog), action_codec.encode_rows(rows))
+        upsert_errors(db, rows)
+    return dropped
+
+
+def _error_type(action_data: Optional[Dict[str, Any]]) -> str:
+    if isinstance(action_data, dict):
+        value = action_data.get("error_type") or action_data.get("type")
+        if value:
+            # 操作数据允许单独的代理字符，错误类型是普通文本列，替换为 ?
+            return str(value)[:100].encode("utf-8", "replace").decode("utf-8")
+    return "unknown"
+
+
+def upsert_errors(db, rows: List[Dict[str, Any]]):
+    """按 (session_id, error_type) 累加错误次数，保留最近一次的上下文"""
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        if row.get("action_type") != ERROR_ACTION_TYPE:
+            continue
+        key = (row["session_id"], _error_type(row.get("action_data")))
+        entry = merged.get(key)
+        if entry is None:
+            merged[key] = {
+                "session_id": key[0],
+                "error_type": key[1],
+                "error_context": row.get("action_data"),
+                "count": 1,
+                "timestamp": row.get("timestamp") or datetime.utcnow(),
+            }
+        else:
+            entry["count"] += 1
+            entry["error_context"] = row.get("action_data")
+            entry["timestamp"] = row.get("timestamp") or entry["timestamp"]
+    if not merged:
+        return
+
+    values = list(merged.values())
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(ErrorRecord).values(values)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[ErrorRecord.session_id, ErrorRecord.error_type],
+            set_={
+                "count": ErrorRecord.count + statement.excluded.count,
+                "error_context": statement.excluded.error_context,
+                "timestamp": statement.excluded.timestamp,
+            }
+        ))
+        return
+
+    # 其他数据库：逐条查询后更新或插入
+    for value in values:
+        record = db.query(ErrorRecord).filter(
+            ErrorRecord.session_id == value["session_id"],
+            ErrorRecord.error_type == value["error_type"]
+        ).with_for_update().first()
+        if record is None:
+            db.add(ErrorRecord(**value))
+        else:
+            record.count = (record.count or 0) + value["count"]
+            record.error_context = value["error_context"]
+            record.timestamp = value["timestamp"]
+    db.flush()
+
+
+class ActionQueueFull(Exception):
+    """写缓冲队列剩余空间不足，本批操作都没有入队，调用方应稍后整批重试"""
+
+
+class ActionWriteQueue:
+    """ActionLog写缓冲队列（write-behind）"""
+
+    def __init__(self, max_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.5, check_ended: bool = False):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # 写入前按数据库再检查会话是否已结束（多worker时需要）
+        self.check_ended = check_ended
+
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # 入队串行执行，检查剩余空间后整批放入
+        self._put_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        # 统计计数
+        self.enqueued = 0
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+        self.dropped_ended = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        """启动后台写入线程"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="action-write-queue", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台线程并写入剩余数据"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self.flush()
+
+    def put(self, session_id: str, action_type: str,
+            action_data: Dict[str, Any] = None, game_type: Optional[str] = None,
+            timestamp: Optional[datetime] = None):
+        """操作入队，队列满时抛出ActionQueueFull；game_type 用于选择操作数据的编码结构"""
+        self.put_many([{
+            "session_id": session_id,
+            "action_type": action_type,
+            "action_data": action_data,
+            "game_type": game_type,
+            "timestamp": timestamp,
+        }])
+
+    def put_many(self, rows: List[Dict[str, Any]]):
+        """整批入队，剩余空间不足时一条都不放入并抛出ActionQueueFull；未带时间戳的操作取入队时刻"""
+        if self._thread is None:
+            self.start()
+
+        now = datetime.utcnow()
+        rows = [{**row, "timestamp": row.get("timestamp") or now} for row in rows]
+        with self._put_lock:
+            # 后台线程只会取出数据，检查之后剩余空间不会变少
+            if self._queue.qsize() + len(rows) > self.max_size:
+                with self._stats_lock:
+                    self.rejected += len(rows)
+                raise ActionQueueFull("操作队列已满，请稍后重试")
+            for row in rows:
+                self._queue.put_nowait(row)
+
+        with self._stats_lock:
+            self.enqueued += len(rows)
+
+    def flush(self):
+        """同步写入队列中的全部数据"""
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度与写入延迟统计"""
+        with self._stats_lock:
+            return {
+                "depth": self._queue.qsize(),
+                "max_size": self.max_size,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "dropped_ended": self.dropped_ended,
+                "flushes": self.flushes,
+                "last_flush_ms": round(self.last_flush_ms, 3),
+                "avg_flush_ms": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+                "max_flush_ms": round(self.max_flush_ms, 3),
+            }
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._write(batch)
+
+    def _drain(self, block: bool) -> List[Dict[str, Any]]:
+        """取出一批数据：达到batch_size或等待超过flush_interval即返回"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        with self._write_lock:
+            db = SessionLocal()
+            try:
+                dropped = len(insert_actions(db, batch, self.check_ended))
+                db.commit()
+                ok = True
+            except Exception as e:
+                db.rollback()
+                print(f"批量写入操作日志失败: {e}")
+                ok = False
+            finally:
+                db.close()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            if ok:
+                self.written += len(batch) - dropped
+                self.dropped_ended += dropped
+            else:
+                self.failed += len(batch)
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.total_flush_ms += elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+
+# 全局实例
+action_queue = ActionWriteQueue(
+    max_size=int(os.getenv("ACTION_QUEUE_MAX_SIZE", 10000)),
+    batch_size=int(os.getenv("ACTION_QUEUE_BATCH_SIZE", 500)),
+    flush_interval=float(os.getenv("ACTION_QUEUE_FLUSH_INTERVAL", 0.5)),
+    check_ended=os.getenv("ACTION_CHECK_ENDED", "true" if worker_count() > 1 else "false").lower()
+    in ("1", "true", "yes"),
+)
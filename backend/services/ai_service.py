@@ -3,51 +3,115 @@ AI服务层
 处理所有AI相关的业务逻辑
 """
 
-from typing import Dict, Any, List
-from models.database import SessionLocal, GameSession, AIInteraction
-from utils.zhipu_ai import zhipu_ai_service
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from models.database import SessionLocal, GameSession, AIInteraction, ErrorRecord
+from utils.zhipu_ai import zhipu_ai_service, FALLBACK_MESSAGES
+from utils.concurrency import run_db, run_ai, iterate_ai
+from utils.metrics import track_token_usage
+from utils.ai_cache import make_cache_key
+from utils.single_flight import SingleFlight
+from services.quiz_bank import quiz_bank
+from services.hint_rules import hint_rules
+from services.session_registry import session_registry
 import json
+import os
+from datetime import datetime
+
+# 相同的提示/问答请求在进行中或刚完成时直接共享结果；降级文本不共享
+SINGLEFLIGHT_WINDOW = float(os.getenv("AI_SINGLEFLIGHT_WINDOW", "2"))
+
+
+def _succeeded(result: Tuple[str, int]) -> bool:
+    return result[0] not in FALLBACK_MESSAGES
+
+
+hint_flight = SingleFlight("hint", result_window=SINGLEFLIGHT_WINDOW, share=_succeeded)
+question_flight = SingleFlight("question", result_window=SINGLEFLIGHT_WINDOW, share=_succeeded)
+
+
+async def _call_counted(func, *args) -> Tuple[str, int]:
+    """在AI线程池中调用模型，返回 (文本, 本次调用消耗的token)"""
+    with track_token_usage() as usage:
+        text = await run_ai(func, *args)
+    return text, usage.total_tokens
 
 
 class AIService:
-    """AI服务类"""
+    """AI服务类
+
+    AI调用在AI线程池中执行，数据库读写在数据库线程池中执行，
+    慢速的模型调用不会阻塞事件循环上的其他请求。
+    """
 
     @staticmethod
     async def get_hint(session_id: str, game_state: Dict[str, Any],
                       error_history: List[Dict] = None) -> str:
         """获取AI智能提示"""
-        # 调用AI生成提示
-        hint = zhipu_ai_service.get_hint(game_state, error_history or [])
-
-        # 记录AI交互
-        db = SessionLocal()
-        try:
-            ai_interaction = AIInteraction(
-                session_id=session_id,
-                interaction_type="hint",
-                prompt=json.dumps({"game_state": game_state, "errors": error_history}),
-                response=hint
-            )
-            db.add(ai_interaction)
-            db.commit()
-        except Exception as e:
-            print(f"记录AI交互失败: {e}")
-        finally:
-            db.close()
+        # 常见错误由本地规则直接给出提示
+        rule = hint_rules.match(game_state, error_history or [])
+        if rule:
+            await AIService._record_rule_hint(session_id, game_state, error_history, *rule)
+            return rule[1]
+
+        # 调用AI生成提示，同一关卡的并发请求只调用一次模型
+        key = make_cache_key("hint", state=game_state, errors=error_history or [])
+        (hint, tokens), shared = await hint_flight.do(
+            key, lambda: _call_counted(zhipu_ai_service.get_hint, game_state, error_history or [])
+        )
+
+        # 记录AI交互：token只计入实际调用模型的请求，共享结果的请求记0并标记
+        prompt = {"game_state": game_state, "errors": error_history}
+        if shared:
+            prompt["shared"] = True
+        await run_db(
+            AIService._record_interaction,
+            session_id, "hint", json.dumps(prompt), hint, 0 if shared else tokens
+        )
 
         return hint
 
+    @staticmethod
+    async def stream_hint(session_id: str, game_state: Dict[str, Any],
+                          error_history: List[Dict] = None) -> AsyncIterator[str]:
+        """流式获取AI提示，结束后记录完整文本"""
+        rule = hint_rules.match(game_state, error_history or [])
+        if rule:
+            yield rule[1]
+            await AIService._record_rule_hint(session_id, game_state, error_history, *rule)
+            return
+
+        parts = []
+        with track_token_usage() as usage:
+            async for delta in iterate_ai(zhipu_ai_service.stream_hint(game_state, error_history or [])):
+                parts.append(delta)
+                yield delta
+
+        await run_db(
+            AIService._record_interaction,
+            session_id, "hint",
+            json.dumps({"game_state": game_state, "errors": error_history}),
+            "".join(parts), usage.total_tokens
+        )
+
+    @staticmethod
+    async def _record_rule_hint(session_id: str, game_state: Dict[str, Any],
+                                error_history: Optional[List[Dict]], rule_id: str, hint: str):
+        """记录规则给出的提示，不消耗token"""
+        await run_db(
+            AIService._record_interaction,
+            session_id, "hint",
+            json.dumps({"game_state": game_state, "errors": error_history, "rule": rule_id}),
+            hint, 0
+        )
+
     @staticmethod
     async def get_feedback(session_id: str) -> Dict[str, Any]:
         """获取AI个性化反馈"""
-        db = SessionLocal()
         try:
             # 获取游戏会话数据
-            session = db.query(GameSession).filter(
-                GameSession.session_id == session_id
-            ).first()
+            session_data = await run_db(AIService._load_session_data, session_id)
 
-            if not session:
+            if not session_data:
                 return {
                     "evaluation": "未找到游戏记录",
                     "suggestions": [],
@@ -55,27 +119,16 @@ class AIService:
                     "next_steps": []
                 }
 
-            # 构建会话数据
-            session_data = {
-                "game_name": session.game_type,
-                "score": session.score,
-                "time_spent": 0,  # 需要计算
-                "error_count": 0,  # 需要从错误表查询
-                "error_types": []
-            }
-
             # 调用AI生成反馈
-            feedback = zhipu_ai_service.get_feedback(session_data)
+            with track_token_usage() as usage:
+                feedback = await run_ai(zhipu_ai_service.get_feedback, session_data)
 
             # 记录AI交互
-            ai_interaction = AIInteraction(
-                session_id=session_id,
-                interaction_type="feedback",
-                prompt=json.dumps(session_data),
-                response=json.dumps(feedback)
+            await run_db(
+                AIService._record_interaction,
+                session_id, "feedback", json.dumps(session_data), json.dumps(feedback),
+                usage.total_tokens
             )
-            db.add(ai_interaction)
-            db.commit()
 
             return feedback
 
@@ -87,20 +140,114 @@ class AIService:
                 "review_topics": [],
                 "next_steps": []
             }
-        finally:
-            db.close()
 
     @staticmethod
     async def answer_question(question: str, context: str = "") -> str:
         """字节叔AI问答"""
-        answer = zhipu_ai_service.answer_question(question, context)
+        key = make_cache_key("question", question=question, context=context)
+        (answer, _), _ = await question_flight.do(
+            key, lambda: _call_counted(zhipu_ai_service.answer_question, question, context)
+        )
         return answer
 
     @staticmethod
-    async def generate_quiz(player_level: str, topic: str) -> Dict[str, Any]:
-        """AI生成练习题"""
-        quiz = zhipu_ai_service.generate_quiz(player_level, topic)
-        return quiz
+    async def stream_answer(question: str, context: str = "",
+                            session_id: Optional[str] = None) -> AsyncIterator[str]:
+        """流式回答问题，提供session_id时结束后记录完整文本"""
+        parts = []
+        with track_token_usage() as usage:
+            async for delta in iterate_ai(zhipu_ai_service.stream_answer(question, context)):
+                parts.append(delta)
+                yield delta
+
+        if session_id:
+            await run_db(
+                AIService._record_interaction,
+                session_id, "question",
+                json.dumps({"question": question, "context": context}),
+                "".join(parts), usage.total_tokens
+            )
+
+    @staticmethod
+    async def generate_quiz(player_level: str, topic: str,
+                            player_id: Optional[str] = None) -> Dict[str, Any]:
+        """AI生成练习题：优先从题库出题，题库为空时现场生成"""
+        quiz = await quiz_bank.take(player_level, topic, player_id)
+        if quiz:
+            return quiz
+
+        quiz = await quiz_bank.generate_for(player_level, topic, player_id)
+        return quiz or zhipu_ai_service.fallback_quiz(topic)
+
+    # ============ 同步数据库操作（在线程池中执行） ============
+
+    @staticmethod
+    def _load_session_data(session_id: str) -> Optional[Dict[str, Any]]:
+        """读取生成反馈所需的会话数据：登记表中有该会话时只查询错误记录，否则与会话一次查询取出"""
+        db = SessionLocal()
+        try:
+            session = session_registry.get(session_id)
+            if session is not None:
+                game_type, score, start_time, end_time = \
+                    session.game_type, session.score, session.start_time, session.end_time
+                errors = db.query(ErrorRecord.error_type, ErrorRecord.count).filter(
+                    ErrorRecord.session_id == session_id
+                ).all()
+            else:
+                rows = db.query(
+                    GameSession.game_type, GameSession.score,
+                    GameSession.start_time, GameSession.end_time,
+                    ErrorRecord.error_type, ErrorRecord.count
+                ).outerjoin(
+                    ErrorRecord, ErrorRecord.session_id == GameSession.session_id
+                ).filter(
+                    GameSession.session_id == session_id
+                ).all()
+
+                if not rows:
+                    return None
+
+                game_type, score, start_time, end_time = rows[0][:4]
+                errors = [row[4:] for row in rows]
+
+            errors = sorted(
+                ((error_type, count or 0) for error_type, count in errors if error_type),
+                key=lambda item: -item[1]
+            )
+            # 未结束的会话按当前时间计算
+            time_spent = ((end_time or datetime.utcnow()) - start_time).total_seconds() \
+                if start_time else 0
+
+            return {
+                "game_name": game_type,
+                "score": score,
+                "time_spent": int(max(time_spent, 0)),
+                "error_count": sum(count for _, count in errors),
+                "error_types": "、".join(error_type for error_type, _ in errors[:5]) or "无"
+            }
+        finally:
+            db.close()
+
+    @staticmethod
+    def _record_interaction(session_id: str, interaction_type: str,
+                            prompt: str, response: str, tokens_used: int = 0):
+        """记录AI交互"""
+        db = SessionLocal()
+        try:
+            ai_interaction = AIInteraction(
+                session_id=session_id,
+                interaction_type=interaction_type,
+                prompt=prompt,
+                response=response,
+                tokens_used=tokens_used
+            )
+            db.add(ai_interaction)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"记录AI交互失败: {e}")
+        finally:
+            db.close()
 
 
 # 全局实例
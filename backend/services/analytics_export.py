@@ -0,0 +1,275 @@
+"""
+列式分析导出
+按ID分页读取 game_sessions、action_logs、errors、ai_interactions，
+以Parquet或Arrow IPC文件写出，按日期和游戏类型分区：
+
+    <输出目录>/<表名>/date=YYYY-MM-DD/game_type=<类型>/part-<批次>-<序号>.parquet
+
+每页使用独立的短事务，不会长时间占用数据库；内存只保留有限行数。
+输出目录下的 _watermark.json 记录每张表的水位线，增量运行只导出新的行：
+action_logs、ai_interactions 只插入不修改，按最大ID；game_sessions 在结束时更新、errors 的次数在会话进行中累加，
+这两张表只导出已结束的会话，按会话结束时间。同一会话再次结束时会重新导出，读取时按 id 取最后导出的一行。
+需要安装 pyarrow。
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, select
+
+from models.database import SessionLocal, GameSession, ActionLog, ErrorRecord, AIInteraction
+from services.action_compaction import iter_archive, archive_path, list_archives
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖，只有导出时需要
+    pa = None
+
+WATERMARK_FILE = "_watermark.json"
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _json(value: Any) -> Optional[str]:
+    return json.dumps(value, default=str) if value is not None else None
+
+
+# 表名 -> (模型, 日期字段, [(列名, 类型, 取值函数)])；game_type 由会话表补齐
+def _table_specs() -> Dict[str, Tuple[Any, str, List[Tuple[str, Any, Callable]]]]:
+    timestamp = pa.timestamp("us")
+    return {
+        "game_sessions": (GameSession, "start_time", [
+            ("id", pa.int64(), lambda r: r.id),
+            ("session_id", pa.string(), lambda r: r.session_id),
+            ("player_id", pa.string(), lambda r: r.player_id),
+            ("level", pa.string(), lambda r: r.level),
+            ("start_time", timestamp, lambda r: r.start_time),
+            ("end_time", timestamp, lambda r: r.end_time),
+            ("score", pa.int32(), lambda r: r.score),
+            ("stars", pa.int32(), lambda r: r.stars),
+            ("completed", pa.bool_(), lambda r: r.completed),
+        ]),
+        "action_logs": (ActionLog, "timestamp", [
+            ("id", pa.int64(), lambda r: r.id),
+            ("session_id", pa.string(), lambda r: r.session_id),
+            ("action_type", pa.string(), lambda r: r.action_type),
+            ("action_data", pa.string(), lambda r: _json(r.action_data)),
+            ("timestamp", timestamp, lambda r: r.timestamp),
+        ]),
+        "errors": (ErrorRecord, "timestamp", [
+            ("id", pa.int64(), lambda r: r.id),
+            ("session_id", pa.string(), lambda r: r.session_id),
+            ("error_type", pa.string(), lambda r: r.error_type),
+            ("error_context", pa.string(), lambda r: _json(r.error_context)),
+            ("count", pa.int32(), lambda r: r.count),
+            ("timestamp", timestamp, lambda r: r.timestamp),
+        ]),
+        "ai_interactions": (AIInteraction, "timestamp", [
+            ("id", pa.int64(), lambda r: r.id),
+            ("session_id", pa.string(), lambda r: r.session_id),
+            ("interaction_type", pa.string(), lambda r: r.interaction_type),
+            ("prompt", pa.string(), lambda r: r.prompt),
+            ("response", pa.string(), lambda r: r.response),
+            ("tokens_used", pa.int32(), lambda r: r.tokens_used),
+            ("timestamp", timestamp, lambda r: r.timestamp),
+        ]),
+    }
+
+
+TABLES = ("game_sessions", "action_logs", "errors", "ai_interactions")
+# 按会话结束时间导出的表
+ENDED_SESSION_TABLES = ("game_sessions", "errors")
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    # 旧版本的水位线是ID，视为没有水位线
+    return datetime.fromisoformat(value) if isinstance(value, str) else None
+
+
+class _Row:
+    """让归档文件中的字典与ORM对象使用相同的取值函数"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.__dict__.update(data)
+
+
+class AnalyticsExporter:
+    """流式列式导出"""
+
+    def __init__(self, output_dir: str, fmt: str = "parquet", page_size: int = 5000,
+                 rows_per_file: int = 100000, max_buffered_rows: int = 200000,
+                 archive_dir: Optional[str] = None, settle_minutes: float = 10):
+        if pa is None:
+            raise RuntimeError("导出需要安装 pyarrow：pip install pyarrow")
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的格式: {fmt}")
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.page_size = page_size
+        self.rows_per_file = rows_per_file
+        self.max_buffered_rows = max_buffered_rows
+        self.archive_dir = archive_dir
+        # 结束后等待一段时间再导出，缓冲队列中尚未落库的错误操作已经写入
+        self.settle_minutes = settle_minutes
+        self.batch = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        self._specs = _table_specs()
+        self._files = 0
+
+    # ============ 水位线 ============
+
+    def load_watermark(self) -> Dict[str, Any]:
+        path = os.path.join(self.output_dir, WATERMARK_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def save_watermark(self, watermark: Dict[str, Any]):
+        """先写临时文件再替换，中断时不会留下损坏的水位线"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.output_dir, prefix=".watermark.")
+        with os.fdopen(fd, "w") as f:
+            json.dump(watermark, f, indent=2)
+        os.replace(tmp, os.path.join(self.output_dir, WATERMARK_FILE))
+
+    # ============ 导出 ============
+
+    def export(self, tables: Tuple[str, ...] = TABLES, incremental: bool = True) -> Dict[str, Dict[str, Any]]:
+        """导出各表，返回每张表的导出行数、文件数和新的水位线"""
+        watermark = self.load_watermark() if incremental else {}
+        ended_before = datetime.utcnow() - timedelta(minutes=self.settle_minutes)
+        results = {}
+        for table in tables:
+            if table in ENDED_SESSION_TABLES:
+                ended = (_parse_time(watermark.get(table)), ended_before)
+                rows, files, _ = self._export_table(table, 0, ended)
+                mark = ended_before.isoformat()
+            else:
+                since = watermark.get(table, 0)
+                rows, files, mark = self._export_table(table, since)
+            # 每张表导出完成后才推进水位线，中断后重跑会重新导出该表未完成的部分
+            watermark[table] = mark
+            self.save_watermark(watermark)
+            results[table] = {"rows": rows, "files": files, "watermark": mark}
+        return results
+
+    def _export_table(self, table: str, since: int,
+                      ended: Optional[Tuple[Optional[datetime], datetime]] = None) -> Tuple[int, int, int]:
+        """导出ID大于 since 的行；ended 为 (起, 止) 时只导出结束时间在该区间内的会话的行"""
+        model, date_field, columns = self._specs[table]
+        # 分区列体现在目录名中，文件内不重复存储
+        schema = pa.schema([(name, dtype) for name, dtype, _ in columns])
+        buffers: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        state = {"buffered": 0, "rows": 0, "files": 0, "last_id": since}
+
+        def add(record, game_type: Optional[str]):
+            stamp = getattr(record, date_field)
+            date = stamp.strftime("%Y-%m-%d") if stamp else "unknown"
+            key = (date, game_type or "unknown")
+            buffer = buffers.setdefault(key, [])
+            buffer.append({name: getter(record) for name, _, getter in columns})
+            state["buffered"] += 1
+            state["rows"] += 1
+            state["last_id"] = max(state["last_id"], record.id)
+            if len(buffer) >= self.rows_per_file:
+                state["files"] += self._flush(table, schema, buffers, key)
+                state["buffered"] -= len(buffer)
+                buffers.pop(key)
+            elif state["buffered"] >= self.max_buffered_rows:
+                for key in list(buffers):
+                    state["files"] += self._flush(table, schema, buffers, key)
+                buffers.clear()
+                state["buffered"] = 0
+
+        for records, game_types in self._pages(model, since, ended):
+            for record in records:
+                add(record, game_types.get(record.session_id) if table != "game_sessions"
+                    else record.game_type)
+
+        # 操作日志被压缩后原始行在归档文件中，同样按ID过滤
+        if table == "action_logs" and self.archive_dir:
+            for records, game_types in self._archive_pages(since):
+                for record in records:
+                    add(record, game_types.get(record.session_id))
+
+        for key in list(buffers):
+            state["files"] += self._flush(table, schema, buffers, key)
+        return state["rows"], state["files"], state["last_id"]
+
+    @staticmethod
+    def _ended_filter(model, ended: Tuple[Optional[datetime], datetime]):
+        after, before = ended
+        condition = GameSession.end_time <= before
+        if after is not None:
+            condition = and_(GameSession.end_time > after, condition)
+        if model is GameSession:
+            return condition
+        return model.session_id.in_(select(GameSession.session_id).where(condition))
+
+    def _pages(self, model, since: int,
+               ended: Optional[Tuple[Optional[datetime], datetime]] = None) -> Iterator[Tuple[list, Dict[str, str]]]:
+        """按ID分页读取，每页一个短事务"""
+        last_id = since
+        while True:
+            db = SessionLocal()
+            try:
+                query = db.query(model).filter(model.id > last_id)
+                if ended is not None:
+                    query = query.filter(self._ended_filter(model, ended))
+                records = query.order_by(model.id).limit(self.page_size).all()
+                if not records:
+                    return
+                game_types = {} if model is GameSession else self._game_types(
+                    db, {record.session_id for record in records})
+                db.expunge_all()
+            finally:
+                db.close()
+            yield records, game_types
+            last_id = records[-1].id
+
+    def _archive_pages(self, since: int) -> Iterator[Tuple[list, Dict[str, str]]]:
+        for month in list_archives(self.archive_dir):
+            page = []
+            for data in iter_archive(archive_path(self.archive_dir, month), min_id=since):
+                page.append(_Row(data))
+                if len(page) >= self.page_size:
+                    yield page, self._lookup_game_types(page)
+                    page = []
+            if page:
+                yield page, self._lookup_game_types(page)
+
+    def _lookup_game_types(self, records: list) -> Dict[str, str]:
+        db = SessionLocal()
+        try:
+            return self._game_types(db, {record.session_id for record in records})
+        finally:
+            db.close()
+
+    @staticmethod
+    def _game_types(db, session_ids) -> Dict[str, str]:
+        rows = db.query(GameSession.session_id, GameSession.game_type).filter(
+            GameSession.session_id.in_(list(session_ids))
+        ).all()
+        return dict(rows)
+
+    def _flush(self, table: str, schema, buffers, key: Tuple[str, str]) -> int:
+        rows = buffers.get(key)
+        if not rows:
+            return 0
+        date, game_type = key
+        directory = os.path.join(self.output_dir, table, f"date={date}", f"game_type={game_type}")
+        os.makedirs(directory, exist_ok=True)
+        self._files += 1
+        path = os.path.join(directory, f"part-{self.batch}-{self._files:05d}{FORMATS[self.fmt]}")
+
+        data = pa.Table.from_pylist(rows, schema=schema)
+        if self.fmt == "parquet":
+            pq.write_table(data, path, compression="zstd")
+        else:
+            with pa_ipc.new_file(path, data.schema) as writer:
+                writer.write_table(data)
+        return 1
@@ -0,0 +1,306 @@
+"""
+游戏会话的WebSocket通道
+一个连接承载同一会话的操作记录、提示请求和结束游戏，消息为紧凑的JSON数组，首元素为类型：
+
+客户端 -> 服务端
+    ["a", seq, action_type, action_data, client_ms]      记录操作，client_ms 为客户端记录时间（毫秒时间戳，可省略）
+    ["h", seq, game_state, error_history]                请求提示
+    ["e", seq, score, stars, completed, submission]      结束游戏
+    ["p"]                                                心跳
+
+服务端 -> 客户端
+    ["w", acked, heartbeat]          连接建立：已确认的最大操作序号和心跳间隔（秒）
+    ["k", seq]                       序号不超过 seq 的操作都已入队
+    ["h", seq, hint]                 提示
+    ["e", seq, final_score, stars, validated]
+    ["x", seq, status, detail]       错误，status 与HTTP状态码含义相同
+    ["p"]                            心跳回复
+
+seq 由客户端按会话递增生成，断线重连后继续使用。操作先在服务端攒批，
+攒够 batch_size 条或等待 flush_interval 后一次放入写缓冲队列并回复一个累计确认。
+已确认的序号保存在共享状态中，重连（包括连到其他worker）后客户端从 acked 之后重发，
+重复的操作直接确认而不会再次写入；提示可以安全地重复执行。支持服务端校验的游戏只按第一次结束计分，
+重发的结束游戏在第一次已经生效时回复409。
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from services.action_queue import action_queue, ActionQueueFull
+from services.ai_service import ai_service
+from services.game_service import game_service, action_time
+from services.session_registry import session_registry, InactiveSession, LiveSession
+from simulation import SubmissionError
+from utils.concurrency import run_db
+from utils.shared_state import shared_state
+
+# 关闭码：会话不存在或已结束时客户端不应重连；1013 表示稍后重试
+CLOSE_SESSION_NOT_FOUND = 4404
+CLOSE_IDLE = 4408
+CLOSE_TRY_AGAIN = 1013
+
+# 客户端消息类型：操作、提示、结束游戏、心跳
+MESSAGE_TYPES = ("a", "h", "e", "p")
+
+
+def _dumps(message: List[Any]) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+class ChannelStats:
+    """所有连接的汇总统计"""
+
+    def __init__(self):
+        self.active = 0
+        self.connections = 0
+        self.messages: Counter = Counter()
+        self.batches = 0
+        self.duplicates = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "connections": self.connections,
+            "messages": dict(self.messages),
+            "batches": self.batches,
+            "duplicate_actions": self.duplicates,
+        }
+
+
+class GameChannel:
+    """单个WebSocket连接"""
+
+    def __init__(self, websocket: WebSocket, session_id: str, stats: ChannelStats,
+                 batch_size: int, flush_interval: float, heartbeat: float, resume_ttl: float):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.stats = stats
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.heartbeat = heartbeat
+        self.resume_ttl = resume_ttl
+
+        self.session: Optional[LiveSession] = None
+        self.acked = 0
+        # 待入队的操作：(seq, row)
+        self._pending: List[tuple] = []
+        self._flush_at = 0.0
+        self._last_seen = time.monotonic()
+        self._send_lock = asyncio.Lock()
+        self._tasks: set = set()
+
+    @property
+    def _ack_key(self) -> str:
+        return f"ws-ack:{self.session_id}"
+
+    async def run(self):
+        await self.websocket.accept()
+        try:
+            self.session = await session_registry.require_active(self.session_id)
+        except InactiveSession as e:
+            await self.websocket.close(code=CLOSE_SESSION_NOT_FOUND, reason=str(e))
+            return
+
+        self.stats.active += 1
+        self.stats.connections += 1
+        try:
+            self.acked = int(await run_db(shared_state.get, self._ack_key, 0) or 0)
+            await self.send(["w", self.acked, self.heartbeat])
+            await self._receive_loop()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.stats.active -= 1
+            for task in self._tasks:
+                task.cancel()
+            # 断开时已收到的操作照常入队，客户端重连后按 acked 跳过
+            try:
+                await self.flush(reply=False)
+            except ActionQueueFull:
+                pass
+
+    async def _receive_loop(self):
+        # 空闲超过两个心跳间隔视为断线
+        idle_timeout = self.heartbeat * 2
+        while True:
+            now = time.monotonic()
+            deadline = self._last_seen + idle_timeout
+            if self._pending:
+                deadline = min(deadline, self._flush_at)
+            try:
+                text = await asyncio.wait_for(self.websocket.receive_text(), max(deadline - now, 0))
+            except asyncio.TimeoutError:
+                if self._pending and time.monotonic() >= self._flush_at:
+                    if not await self._flush_or_close():
+                        return
+                    continue
+                if time.monotonic() - self._last_seen >= idle_timeout:
+                    await self.websocket.close(code=CLOSE_IDLE, reason="心跳超时")
+                    return
+                continue
+
+            self._last_seen = time.monotonic()
+            if not await self._handle(text):
+                return
+
+    async def _handle(self, text: str) -> bool:
+        """处理一条消息，需要关闭连接时返回False"""
+        try:
+            message = json.loads(text)
+            kind = message[0]
+            if kind not in MESSAGE_TYPES:
+                raise ValueError
+            seq = int(message[1]) if kind != "p" else 0
+        except (ValueError, TypeError, IndexError, KeyError):
+            self.stats.messages["invalid"] += 1
+            await self.send(["x", 0, 400, "消息格式错误"])
+            return True
+        self.stats.messages[kind] += 1
+
+        if kind == "p":
+            await self.send(["p"])
+        elif kind == "a":
+            return await self._on_action(seq, message)
+        elif kind == "h":
+            task = asyncio.create_task(self._on_hint(seq, message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif kind == "e":
+            if not await self._flush_or_close():
+                return False
+            await self._on_end(seq, message)
+        return True
+
+    async def _on_action(self, seq: int, message: List[Any]) -> bool:
+        action_type = message[2] if len(message) > 2 else None
+        action_data = message[3] if len(message) > 3 else None
+        client_ms = message[4] if len(message) > 4 else None
+        try:
+            if not isinstance(action_type, str) or not (action_data is None or isinstance(action_data, dict)):
+                raise ValueError
+            client_time = datetime.fromtimestamp(client_ms / 1000, timezone.utc) if client_ms is not None else None
+        except (ValueError, TypeError, OverflowError, OSError):
+            await self.send(["x", seq, 400, "操作格式错误"])
+            return True
+
+        if self.session.ended:
+            await self.send(["x", seq, 409, "游戏会话已结束"])
+            return True
+
+        last = self._pending[-1][0] if self._pending else self.acked
+        if seq <= last:
+            # 重连后重发的操作已经入队
+            self.stats.duplicates += 1
+            if not self._pending:
+                await self.send(["k", self.acked])
+            return True
+
+        if not self._pending:
+            self._flush_at = time.monotonic() + self.flush_interval
+        self._pending.append((seq, {
+            "session_id": self.session_id,
+            "action_type": action_type,
+            "action_data": action_data,
+            "game_type": self.session.game_type,
+            "timestamp": action_time(client_time, self.session.start_time),
+        }))
+        if len(self._pending) >= self.batch_size:
+            return await self._flush_or_close()
+        return True
+
+    async def _on_hint(self, seq: int, message: List[Any]):
+        game_state = message[2] if len(message) > 2 else None
+        error_history = message[3] if len(message) > 3 else None
+        if not isinstance(game_state, dict) or not (error_history is None or isinstance(error_history, list)):
+            await self.send(["x", seq, 400, "提示请求格式错误"])
+            return
+        try:
+            hint = await ai_service.get_hint(self.session_id, game_state, error_history)
+            await self.send(["h", seq, hint])
+        except Exception as e:
+            await self.send(["x", seq, 500, str(e)])
+
+    async def _on_end(self, seq: int, message: List[Any]):
+        try:
+            score, stars, completed = int(message[2]), int(message[3]), bool(message[4])
+            submission = message[5] if len(message) > 5 else None
+            if submission is not None and not isinstance(submission, dict):
+                raise ValueError
+        except (ValueError, TypeError, IndexError):
+            await self.send(["x", seq, 400, "结束游戏请求格式错误"])
+            return
+        try:
+            result = await game_service.end_game(self.session_id, score, stars, completed, submission)
+            await self.send(["e", seq, result["score"], result["stars"], result["validated"]])
+        except InactiveSession as e:
+            await self.send(["x", seq, 409, str(e)])
+        except SubmissionError as e:
+            await self.send(["x", seq, 400, str(e)])
+        except Exception as e:
+            await self.send(["x", seq, 500, str(e)])
+
+    async def flush(self, reply: bool = True):
+        """攒下的操作整批入队并记录确认序号，队列满时抛出ActionQueueFull（这批操作都不确认）"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        action_queue.put_many([row for _, row in pending])
+        self.stats.batches += 1
+        session_registry.touch(self.session, len(pending))
+        self.acked = pending[-1][0]
+        await run_db(shared_state.set, self._ack_key, self.acked, ttl=self.resume_ttl)
+        if reply:
+            await self.send(["k", self.acked])
+
+    async def _flush_or_close(self) -> bool:
+        """入队失败时关闭连接，客户端稍后重连并从已确认的位置重发，保证操作顺序"""
+        try:
+            await self.flush()
+            return True
+        except ActionQueueFull as e:
+            await self.send(["x", self.acked, 503, str(e)])
+            await self.websocket.close(code=CLOSE_TRY_AGAIN, reason=str(e))
+            return False
+
+    async def send(self, message: List[Any]):
+        # 提示在独立任务中返回，发送需要串行
+        async with self._send_lock:
+            await self.websocket.send_text(_dumps(message))
+
+
+class GameChannelManager:
+    """创建连接并汇总统计"""
+
+    def __init__(self, batch_size: int = 50, flush_interval: float = 0.05,
+                 heartbeat: float = 15.0, resume_ttl: float = 3600.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.heartbeat = heartbeat
+        self.resume_ttl = resume_ttl
+        self._stats = ChannelStats()
+
+    async def serve(self, websocket: WebSocket, session_id: str):
+        await GameChannel(
+            websocket, session_id, self._stats,
+            batch_size=self.batch_size, flush_interval=self.flush_interval,
+            heartbeat=self.heartbeat, resume_ttl=self.resume_ttl,
+        ).run()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._stats.stats()
+
+
+# 全局实例
+game_channels = GameChannelManager(
+    batch_size=int(os.getenv("WS_ACTION_BATCH_SIZE") or 50),
+    flush_interval=float(os.getenv("WS_ACTION_FLUSH_INTERVAL") or 0.05),
+    heartbeat=float(os.getenv("WS_HEARTBEAT_INTERVAL") or 15),
+    resume_ttl=float(os.getenv("WS_RESUME_TTL") or 3600),
+)
@@ -3,43 +3,146 @@
 处理游戏相关的业务逻辑
 """
 
-from typing import Dict, Any
-from models.database import SessionLocal, Player, GameSession, ActionLog, ErrorRecord
-from datetime import datetime
+from typing import Dict, Any, List, Optional
+from sqlalchemy import case, func, update
+from models.database import SessionLocal, Player, GameSession, PlayerProgress, ActionLog, ErrorRecord, Report
+from services.action_queue import action_queue, insert_actions
+from services.leaderboard import leaderboard
+from services.session_registry import session_registry, LiveSession, InactiveSession
+from simulation import validate_submission, generate_problem, SubmissionError, VALIDATED_GAMES
+from utils.concurrency import run_db
+from collections import Counter
+from datetime import datetime, timezone
 import uuid
 
 
+def action_time(timestamp: Optional[datetime], start_time: Optional[datetime],
+                now: Optional[datetime] = None) -> datetime:
+    """操作时间：优先使用客户端时间（转为UTC），截断到 [会话开始时间, 服务器当前时间]"""
+    now = now or datetime.utcnow()
+    if timestamp is None:
+        return now
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    if timestamp > now:
+        return now
+    if start_time is not None and timestamp < start_time:
+        return start_time
+    return timestamp
+
+
+def _upsert_insert(db, model):
+    """支持 ON CONFLICT 的数据库返回对应方言的insert，其他数据库返回None"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(model)
+
+
 class GameService:
     """游戏服务类"""
 
+    # ============ 异步接口：阻塞的数据库操作放入线程池执行 ============
+
+    @staticmethod
+    async def start_game(player_id: str, game_type: str, level: str = "beginner") -> Dict[str, Any]:
+        """开始新游戏，返回会话ID和服务端生成的题目（不支持服务端校验的游戏为None）"""
+        return await run_db(GameService._start_game, player_id, game_type, level)
+
+    @staticmethod
+    async def record_action(session_id: str, action_type: str,
+                           action_data: Dict[str, Any] = None,
+                           timestamp: Optional[datetime] = None) -> bool:
+        """记录游戏操作（写入缓冲队列，由后台线程批量落库）；会话不存在或已结束时抛出InactiveSession"""
+        session = await session_registry.require_active(session_id)
+        action_queue.put(session_id, action_type, action_data, session.game_type,
+                         action_time(timestamp, session.start_time))
+        session_registry.touch(session)
+        return True
+
+    @staticmethod
+    async def record_actions(actions: List[Dict[str, Any]]) -> List[int]:
+        """批量记录游戏操作（可跨会话），单个事务写入；返回没有记录的操作（会话不存在或已结束）的下标"""
+        sessions = {}
+        for session_id in {action["session_id"] for action in actions}:
+            session = await session_registry.resolve(session_id)
+            if session is not None and not session.ended:
+                sessions[session_id] = session
+        now = datetime.utcnow()
+        indexes = [index for index, action in enumerate(actions) if action["session_id"] in sessions]
+        accepted = [{
+            **actions[index],
+            "game_type": sessions[actions[index]["session_id"]].game_type,
+            "timestamp": action_time(actions[index].get("timestamp"),
+                                     sessions[actions[index]["session_id"]].start_time, now),
+        } for index in indexes]
+        rejected = sorted(set(range(len(actions))) - set(indexes))
+        if accepted:
+            dropped = await run_db(GameService._record_actions, accepted)
+            rejected = sorted(rejected + [indexes[position] for position in dropped])
+            for session_id, actions_in_session in Counter(action["session_id"] for action in accepted).items():
+                session_registry.touch(sessions[session_id], actions_in_session)
+        if rejected:
+            session_registry.reject(len(rejected))
+        return rejected
+
+    @staticmethod
+    async def end_game(session_id: str, score: int, stars: int, completed: bool,
+                       submission: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """结束游戏"""
+        return await run_db(GameService._end_game, session_id, score, stars, completed, submission)
+
+    @staticmethod
+    async def check_answer(session_id: str, submission: Dict[str, Any]) -> Dict[str, Any]:
+        """按已结束会话的题目校验答案（不记录成绩）"""
+        return await run_db(GameService._check_answer, session_id, submission)
+
     @staticmethod
-    async def start_game(player_id: str, game_type: str, level: str = "beginner") -> str:
-        """开始新游戏"""
+    async def get_progress(player_id: str) -> Dict[str, Any]:
+        """获取玩家进度"""
+        return await run_db(GameService._get_progress, player_id)
+
+    @staticmethod
+    async def get_history(player_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """获取玩家历史记录"""
+        return await run_db(GameService._get_history, player_id, limit)
+
+    # ============ 同步实现 ============
+
+    @staticmethod
+    def _start_game(player_id: str, game_type: str, level: str = "beginner") -> Dict[str, Any]:
+        """开始新游戏；支持服务端校验的游戏同时出题并保存在会话中"""
         db = SessionLocal()
         try:
-            # 确保玩家存在
-            player = db.query(Player).filter(Player.player_id == player_id).first()
-            if not player:
-                player = Player(player_id=player_id, name=player_id)
-                db.add(player)
-                db.commit()
+            # 确保玩家存在并更新最后游戏时间
+            start_time = datetime.utcnow()
+            GameService._touch_player(db, player_id, start_time)
 
             # 创建游戏会话
             session_id = str(uuid.uuid4())
+            problem = generate_problem(game_type, level)
             game_session = GameSession(
                 session_id=session_id,
                 player_id=player_id,
                 game_type=game_type,
-                level=level
+                level=level,
+                start_time=start_time,
+                problem=problem
             )
             db.add(game_session)
 
-            # 更新玩家最后游戏时间
-            player.last_played = datetime.utcnow()
+            # 同一事务内累加进度汇总中的尝试次数
+            GameService._update_progress(db, player_id, game_type, attempts=1)
+            GameService._mark_report_stale(db, player_id)
 
             db.commit()
 
-            return session_id
+            session_registry.register(LiveSession(session_id, player_id, game_type, level, start_time))
+            return {"session_id": session_id, "problem": problem}
 
         except Exception as e:
             db.rollback()
@@ -49,50 +152,104 @@ class GameService:
             db.close()
 
     @staticmethod
-    async def record_action(session_id: str, action_type: str,
-                           action_data: Dict[str, Any] = None) -> bool:
-        """记录游戏操作"""
+    def _record_actions(actions: List[Dict[str, Any]]) -> List[int]:
+        """批量记录游戏操作（可跨会话），单个事务写入；没有时间的操作取服务器当前时间。
+        返回因会话已在其他进程结束而丢弃的下标"""
+        now = datetime.utcnow()
+        rows = [{
+            "session_id": action["session_id"],
+            "action_type": action["action_type"],
+            "action_data": action.get("action_data"),
+            "game_type": action.get("game_type"),
+            "timestamp": action.get("timestamp") or now,
+        } for action in actions]
+
         db = SessionLocal()
         try:
-            action_log = ActionLog(
-                session_id=session_id,
-                action_type=action_type,
-                action_data=action_data
-            )
-            db.add(action_log)
+            dropped = insert_actions(db, rows, action_queue.check_ended)
             db.commit()
-            return True
+            return dropped
 
         except Exception as e:
-            print(f"记录操作失败: {e}")
-            return False
+            db.rollback()
+            print(f"批量记录操作失败: {e}")
+            raise e
         finally:
             db.close()
 
     @staticmethod
-    async def end_game(session_id: str, score: int, stars: int, completed: bool) -> Dict[str, Any]:
-        """结束游戏"""
+    def _end_game(session_id: str, score: int, stars: int, completed: bool,
+                  submission: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """结束游戏；支持服务端校验的游戏必须提交答案，按开始时保存的题目校验，以校验结果作为分数和星级，
+        忽略客户端上报的分数和星级。这些游戏只按第一次提交计分，会话已结束时抛出InactiveSession"""
         db = SessionLocal()
         try:
-            game_session = db.query(GameSession).filter(
-                GameSession.session_id == session_id
-            ).first()
-
-            if not game_session:
+            # 登记表中未结束的会话不必再查询，更新时以 end_time 为空确认没有在其他进程中结束
+            session = session_registry.get(session_id)
+            if session is None or session.ended:
+                session = session_registry.load(session_id)
+            if session is None:
                 raise ValueError("游戏会话不存在")
 
-            game_session.end_time = datetime.utcnow()
-            game_session.score = score
-            game_session.stars = stars
-            game_session.completed = completed
+            validated = session.game_type in VALIDATED_GAMES
+            if validated:
+                if session.ended:
+                    raise InactiveSession(session_id, ended=True)
+                if submission is None:
+                    raise SubmissionError("该游戏由服务端校验计分，需要提交答案")
+                problem = GameService._session_problem(db, session_id)
+                verdict = validate_submission(session.game_type, submission, problem)
+                score, stars = verdict["score"], verdict["stars"]
+
+            now = datetime.utcnow()
+            values = {"end_time": now, "score": score, "stars": stars, "completed": completed}
+            query = db.query(GameSession).filter(GameSession.session_id == session_id)
+            # 未结束的会话尚未完成过，按 end_time 为空直接更新
+            updated = not session.ended and query.filter(
+                GameSession.end_time.is_(None)
+            ).update(values, synchronize_session=False)
+            was_completed = False
+            if not updated:
+                if validated:
+                    # 已在其他请求或进程中结束，不重新计分
+                    raise InactiveSession(session_id, ended=True)
+                # 同一会话可能多次结束，完成数只按状态变化增减
+                row = query.with_entities(GameSession.completed).first()
+                if not row:
+                    raise ValueError("游戏会话不存在")
+                was_completed = bool(row.completed)
+                query.update(values, synchronize_session=False)
+
+            completed_delta = int(bool(completed)) - int(was_completed)
+            GameService._update_progress(
+                db, session.player_id, session.game_type,
+                completed_delta=completed_delta, score=score, stars=stars
+            )
+            GameService._mark_report_stale(db, session.player_id)
+
+            level = session.level or "beginner"
+            improved = leaderboard.upsert_entry(
+                db, session.game_type, level, session.player_id,
+                score, stars, now
+            )
 
             db.commit()
 
+            # 提交后再更新内存排行榜和会话登记表，回滚时不会留下脏数据
+            session_registry.end(session, score, completed, now)
+            if improved:
+                leaderboard.apply(
+                    session.game_type, level, session.player_id,
+                    score, stars, now
+                )
+
             return {
                 "session_id": session_id,
+                "player_id": session.player_id,
                 "score": score,
                 "stars": stars,
-                "completed": completed
+                "completed": completed,
+                "validated": validated
             }
 
         except Exception as e:
@@ -103,43 +260,52 @@ class GameService:
             db.close()
 
     @staticmethod
-    async def get_progress(player_id: str) -> Dict[str, Any]:
-        """获取玩家进度"""
+    def _session_problem(db, session_id: str) -> Dict[str, Any]:
+        problem = db.query(GameSession.problem).filter(GameSession.session_id == session_id).scalar()
+        if problem is None:
+            # 升级前开始的会话没有保存题目
+            raise SubmissionError("会话没有服务端题目，无法校验")
+        return problem
+
+    @staticmethod
+    def _check_answer(session_id: str, submission: Dict[str, Any]) -> Dict[str, Any]:
+        """按会话的题目校验答案；会话结束前不校验，避免逐项试出答案"""
+        session = session_registry.get(session_id) or session_registry.load(session_id)
+        if session is None:
+            raise ValueError("游戏会话不存在")
+        if session.game_type not in VALIDATED_GAMES:
+            raise SubmissionError(f"游戏 {session.game_type} 不支持服务端校验")
+        if not session.ended:
+            raise SubmissionError("游戏结束后才能查看校验结果，答案在结束游戏时提交")
         db = SessionLocal()
         try:
-            # 获取所有游戏会话
-            sessions = db.query(GameSession).filter(
-                GameSession.player_id == player_id
-            ).all()
+            problem = GameService._session_problem(db, session_id)
+        finally:
+            db.close()
+        return validate_submission(session.game_type, submission, problem)
+
+    @staticmethod
+    def _get_progress(player_id: str) -> Dict[str, Any]:
+        """获取玩家进度（读取汇总表，与会话数量无关）"""
+        db = SessionLocal()
+        try:
+            rows = db.query(PlayerProgress).filter(
+                PlayerProgress.player_id == player_id
+            ).order_by(PlayerProgress.id).all()
 
             # 统计数据
-            total_games = len(set(s.game_type for s in sessions))
-            completed_games = len([s for s in sessions if s.completed])
+            total_games = len(rows)
+            completed_games = sum(row.completed_count for row in rows)
 
             # 按游戏类型分组
             games_data = {}
-            for session in sessions:
-                if session.game_type not in games_data:
-                    games_data[session.game_type] = {
-                        "attempts": 0,
-                        "best_score": 0,
-                        "best_stars": 0,
-                        "completed": False
-                    }
-
-                games_data[session.game_type]["attempts"] += 1
-                if session.score:
-                    games_data[session.game_type]["best_score"] = max(
-                        games_data[session.game_type]["best_score"],
-                        session.score
-                    )
-                if session.stars:
-                    games_data[session.game_type]["best_stars"] = max(
-                        games_data[session.game_type]["best_stars"],
-                        session.stars
-                    )
-                if session.completed:
-                    games_data[session.game_type]["completed"] = True
+            for row in rows:
+                games_data[row.game_type] = {
+                    "attempts": row.attempts,
+                    "best_score": row.best_score,
+                    "best_stars": row.best_stars,
+                    "completed": row.completed
+                }
 
             overall_progress = (completed_games / 6) * 100 if total_games > 0 else 0
 
@@ -154,6 +320,150 @@ class GameService:
         finally:
             db.close()
 
+    @staticmethod
+    def _touch_player(db, player_id: str, now: datetime):
+        """在调用方事务中创建玩家或更新最后游戏时间（不提交）"""
+        statement = _upsert_insert(db, Player)
+        if statement is not None:
+            db.execute(statement.values(
+                player_id=player_id, name=player_id, created_at=now, last_played=now
+            ).on_conflict_do_update(index_elements=[Player.player_id], set_={"last_played": now}))
+            return
+
+        player = db.query(Player).filter(Player.player_id == player_id).first()
+        if player is None:
+            db.add(Player(player_id=player_id, name=player_id, created_at=now, last_played=now))
+            db.flush()
+        else:
+            player.last_played = now
+
+    @staticmethod
+    def _update_progress(db, player_id: str, game_type: str, attempts: int = 0,
+                         completed_delta: int = 0, score: int = None,
+                         stars: int = None):
+        """在调用方事务中增量更新进度汇总（不提交）；completed 与 rebuild_progress 一样由完成次数决定"""
+        now = datetime.utcnow()
+        values = {
+            "attempts": PlayerProgress.attempts + attempts,
+            "completed_count": PlayerProgress.completed_count + completed_delta,
+            "completed": PlayerProgress.completed_count + completed_delta > 0,
+            "updated_at": now,
+        }
+        if score:
+            values["best_score"] = case(
+                (PlayerProgress.best_score < score, score),
+                else_=PlayerProgress.best_score
+            )
+        if stars:
+            values["best_stars"] = case(
+                (PlayerProgress.best_stars < stars, stars),
+                else_=PlayerProgress.best_stars
+            )
+        row = {
+            "player_id": player_id,
+            "game_type": game_type,
+            "attempts": attempts,
+            "completed_count": max(completed_delta, 0),
+            "best_score": max(score or 0, 0),
+            "best_stars": max(stars or 0, 0),
+            "completed": completed_delta > 0,
+            "updated_at": now,
+        }
+
+        statement = _upsert_insert(db, PlayerProgress)
+        if statement is not None:
+            # 同一玩家同时开始第一局时两个事务都会插入，用 ON CONFLICT 合并为更新
+            db.execute(statement.values(row).on_conflict_do_update(
+                index_elements=[PlayerProgress.player_id, PlayerProgress.game_type],
+                set_=values
+            ))
+            return
+
+        # 其他数据库：先更新，没有记录时再插入
+        result = db.execute(
+            update(PlayerProgress)
+            .where(PlayerProgress.player_id == player_id,
+                   PlayerProgress.game_type == game_type)
+            .values(**values)
+        )
+        if result.rowcount == 0:
+            db.add(PlayerProgress(**row))
+            db.flush()
+
+    @staticmethod
+    def _mark_report_stale(db, player_id: str):
+        """在调用方事务中将玩家的学习报告标记为过期（不提交）"""
+        db.query(Report).filter(
+            Report.player_id == player_id, Report.stale == False
+        ).update({"stale": True}, synchronize_session=False)
+
+    @staticmethod
+    def rebuild_progress() -> int:
+        """根据全部游戏会话重建进度汇总表，返回写入的行数"""
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                GameSession.player_id,
+                GameSession.game_type,
+                func.count(GameSession.id),
+                func.sum(case((GameSession.completed == True, 1), else_=0)),
+                func.max(GameSession.score),
+                func.max(GameSession.stars),
+            ).group_by(
+                GameSession.player_id, GameSession.game_type
+            ).order_by(func.min(GameSession.id)).all()
+
+            db.query(PlayerProgress).delete()
+            now = datetime.utcnow()
+            db.add_all([
+                PlayerProgress(
+                    player_id=player_id,
+                    game_type=game_type,
+                    attempts=attempts,
+                    completed_count=completed_count or 0,
+                    best_score=max(best_score or 0, 0),
+                    best_stars=max(best_stars or 0, 0),
+                    completed=bool(completed_count),
+                    updated_at=now
+                )
+                for player_id, game_type, attempts, completed_count, best_score, best_stars in rows
+            ])
+            db.commit()
+            return len(rows)
+
+        except Exception as e:
+            db.rollback()
+            print(f"重建进度汇总失败: {e}")
+            raise e
+        finally:
+            db.close()
+
+    @staticmethod
+    def _get_history(player_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            sessions = db.query(GameSession).filter(
+                GameSession.player_id == player_id
+            ).order_by(GameSession.start_time.desc()).limit(limit).all()
+
+            history = []
+            for session in sessions:
+                history.append({
+                    "session_id": session.session_id,
+                    "game_type": session.game_type,
+                    "level": session.level,
+                    "score": session.score,
+                    "stars": session.stars,
+                    "completed": session.completed,
+                    "start_time": session.start_time.isoformat(),
+                    "end_time": session.end_time.isoformat() if session.end_time else None
+                })
+
+            return history
+
+        finally:
+            db.close()
+
 
 # 全局实例
 game_service = GameService()
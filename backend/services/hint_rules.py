@@ -0,0 +1,205 @@
+"""
+规则提示
+常见、答案明确的错误由本地规则表直接给出提示，不调用大模型。
+规则按 game_state 字段（game、topic、game_stage、algorithm 等）和最近错误记录中的错误类型匹配，
+同一错误重复出现时使用更直接的提示。没有 errors 的规则只按 game_state 字段匹配，
+必须包含表示错误状态的条件（CONTEXT_FIELDS 之外的字段），只说明玩家所在游戏和模式的请求
+由大模型回答；优先使用按错误匹配的规则。规则表是JSON文件，修改后自动重新加载。
+
+规则格式：
+    {
+      "id": "sched-sjf-order",
+      "when": {"game": ["process-scheduling"], "algorithm": ["sjf"]},
+      "errors": ["wrong_order"],
+      "min_count": 1,
+      "priority": 10,
+      "hints": ["第一次出错时的提示", "再次出错时更直接的提示"]
+    }
+
+when 中省略的字段不限制；errors 中任一错误类型在最近 window 条错误里出现至少 min_count 次即命中。
+省略 errors 时 when 中至少要有一个 CONTEXT_FIELDS 之外的字段，最近错误越多使用越靠后的提示。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.ai_cache import normalize_text
+
+# 只说明玩家所在的游戏、模式和阶段，不能单独说明玩家犯了什么错误
+CONTEXT_FIELDS = frozenset({
+    "game", "topic", "stage", "game_stage", "level",
+    "algorithm", "mode", "strategy", "technique", "mechanism",
+})
+
+
+def _error_type(error: Dict[str, Any]) -> str:
+    return normalize_text(error.get("error_type") or error.get("type") or "")
+
+
+class HintRule:
+    """编译后的单条规则"""
+
+    __slots__ = ("id", "when", "errors", "min_count", "priority", "hints")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.id = str(spec["id"])
+        self.when = {
+            field: frozenset(normalize_text(value) for value in
+                             (values if isinstance(values, list) else [values]))
+            for field, values in (spec.get("when") or {}).items()
+        }
+        self.errors = [normalize_text(error) for error in spec.get("errors") or []]
+        self.min_count = int(spec.get("min_count", 1 if self.errors else 0))
+        self.priority = int(spec.get("priority", 0))
+        self.hints = [str(hint) for hint in spec["hints"]]
+        if not self.hints:
+            raise ValueError(f"规则 {self.id} 缺少 hints")
+        if not self.errors and not set(self.when) - CONTEXT_FIELDS:
+            raise ValueError(f"规则 {self.id} 缺少 errors 或表示错误状态的 when 条件")
+
+    def match(self, state: Dict[str, str], counts: Counter) -> Optional[str]:
+        for field, allowed in self.when.items():
+            if state.get(field) not in allowed:
+                return None
+        if self.errors:
+            count = max(counts.get(error, 0) for error in self.errors)
+        else:
+            count = sum(counts.values())
+        if count < self.min_count:
+            return None
+        # 重复次数越多，提示越直接
+        return self.hints[min(count - self.min_count, len(self.hints) - 1)]
+
+
+class HintRuleEngine:
+    """规则表的加载、热更新与匹配"""
+
+    def __init__(self, path: str, window: int = 5, reload_interval: float = 5.0,
+                 enabled: bool = True):
+        self.path = path
+        self.window = window
+        self.reload_interval = reload_interval
+        self.enabled = enabled
+
+        # 错误类型 -> 关注该错误的规则（按优先级从高到低）
+        self._index: Dict[str, List[HintRule]] = {}
+        # 只按 game_state 匹配的规则：when.game 中的游戏 -> 规则，不限游戏的规则在 None 下
+        self._state_index: Dict[Optional[str], List[HintRule]] = {}
+        self._version: Optional[str] = None
+        self._rule_count = 0
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.rule_hits = 0
+        self.fallthrough = 0
+        self.by_rule: Counter = Counter()
+        self.reload_errors = 0
+
+    def match(self, game_state: Dict[str, Any],
+              error_history: List[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+        """返回 (规则ID, 提示)，没有规则命中时返回None（由大模型生成）"""
+        if not self.enabled:
+            self.fallthrough += 1
+            return None
+        self._maybe_reload()
+
+        recent = [error for error in (error_history or [])[-self.window:] if isinstance(error, dict)]
+        counts = Counter(filter(None, map(_error_type, recent)))
+        index, state_index = self._index, self._state_index
+        candidates = {id(rule): rule for error in counts for rule in index.get(error, ())}
+        state = {
+            field: normalize_text(value)
+            for field, value in (game_state or {}).items() if isinstance(value, (str, int, float))
+        }
+        state_rules = state_index.get(state.get("game"), []) + state_index.get(None, [])
+        # 按错误匹配的规则更具体，先于只按状态匹配的规则
+        for group in (sorted(candidates.values(), key=lambda rule: -rule.priority),
+                      sorted(state_rules, key=lambda rule: -rule.priority)):
+            for rule in group:
+                hint = rule.match(state, counts)
+                if hint is not None:
+                    self.rule_hits += 1
+                    self.by_rule[rule.id] += 1
+                    return rule.id, hint
+        self.fallthrough += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.rule_hits + self.fallthrough
+        return {
+            "enabled": self.enabled,
+            "version": self._version,
+            "rules": self._rule_count,
+            "rule_hits": self.rule_hits,
+            "fallthrough": self.fallthrough,
+            "fast_path_ratio": round(self.rule_hits / total, 4) if total else 0.0,
+            "by_rule": dict(self.by_rule.most_common(20)),
+            "reload_errors": self.reload_errors,
+        }
+
+    # ============ 加载 ============
+
+    def load(self) -> int:
+        """立即读取规则表并替换当前规则，返回规则数；格式错误时保留原有规则并抛出异常"""
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        rules = sorted((HintRule(spec) for spec in data.get("rules", [])),
+                       key=lambda rule: -rule.priority)
+        ids = [rule.id for rule in rules]
+        if len(ids) != len(set(ids)):
+            raise ValueError("规则ID重复")
+
+        index: Dict[str, List[HintRule]] = {}
+        state_index: Dict[Optional[str], List[HintRule]] = {}
+        for rule in rules:
+            for error in rule.errors:
+                index.setdefault(error, []).append(rule)
+            if not rule.errors:
+                for game in rule.when.get("game") or [None]:
+                    state_index.setdefault(game, []).append(rule)
+        # 整体替换索引，匹配中的请求继续使用旧索引
+        self._index = index
+        self._state_index = state_index
+        self._version = str(data.get("version")) if data.get("version") is not None else None
+        self._rule_count = len(rules)
+        self._mtime = mtime
+        return len(rules)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval and self._mtime is not None:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval and self._mtime is not None:
+                return
+            self._checked_at = now
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    count = self.load()
+                    self._last_error = None
+                    print(f"已加载提示规则 {count} 条")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # 文件缺失或损坏时保留原有规则，同样的错误只输出一次
+                self._mtime = self._mtime or -1.0
+                if str(e) != self._last_error:
+                    self._last_error = str(e)
+                    self.reload_errors += 1
+                    print(f"加载提示规则失败，继续使用原有规则: {e}")
+
+
+# 全局实例
+hint_rules = HintRuleEngine(
+    path=os.getenv("HINT_RULES_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                                   "data", "hint_rules.json")),
+    window=int(os.getenv("HINT_RULES_WINDOW", 5)),
+    reload_interval=float(os.getenv("HINT_RULES_RELOAD_INTERVAL", 5)),
+    enabled=os.getenv("HINT_RULES_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
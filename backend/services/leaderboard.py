@@ -0,0 +1,348 @@
+"""
+排行榜
+每个 (game_type, level) 一个按成绩排序的内存列表（sortedcontainers.SortedList，分块存储）：
+更新和查询名次都是 O(log n)，不需要移动整个列表，读取时不需要重新排序。
+成绩持久化在 leaderboard_entries 表中，内存列表在第一次访问时从表中加载；
+加载在全局锁之外进行，每个排行榜只加载一次，不会阻塞其他排行榜的读取。
+多worker部署时，每个进程定期按 updated_at 增量读取其他进程写入的成绩；
+重建排行榜时递增共享计数器，各进程据此丢弃内存列表。
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from models.database import SessionLocal, GameSession, LeaderboardEntry
+from utils.shared_state import shared_state, worker_count
+
+GENERATION_KEY = "leaderboard:generation"
+# 增量同步时多读一段时间，覆盖写入时间早于提交时间的行
+SYNC_SKEW = timedelta(seconds=5)
+
+# 排序键：分数高、星级高、先达到、玩家ID小的排前面
+SortKey = Tuple[int, int, datetime, str]
+
+
+def _sort_key(score: int, stars: int, achieved_at: datetime, player_id: str) -> SortKey:
+    return (-(score or 0), -(stars or 0), achieved_at, player_id)
+
+
+def _is_better(score: int, stars: int, entry_score: int, entry_stars: int) -> bool:
+    return (score or 0, stars or 0) > (entry_score or 0, entry_stars or 0)
+
+
+class Board:
+    """单个排行榜的有序列表"""
+
+    def __init__(self):
+        self._keys: SortedList = SortedList()
+        self._by_player: Dict[str, SortKey] = {}
+        self._lock = threading.Lock()
+        # 第一次访问时从表中加载，同一排行榜的并发访问只加载一次
+        self._load_lock = threading.Lock()
+        self.loaded = False
+        # 已读取的最大 updated_at 与上次同步时间
+        self.watermark: Optional[datetime] = None
+        self.synced_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def upsert(self, player_id: str, score: int, stars: int, achieved_at: datetime) -> bool:
+        """玩家成绩更好时更新位置，返回是否有变化"""
+        key = _sort_key(score, stars, achieved_at, player_id)
+        with self._lock:
+            old = self._by_player.get(player_id)
+            if old is not None:
+                if old <= key:
+                    return False
+                self._keys.remove(old)
+            self._keys.add(key)
+            self._by_player[player_id] = key
+            return True
+
+    def load(self, rows):
+        """用 (player_id, score, stars, achieved_at) 一次排序构建，避免逐个插入；
+        加载期间已经写入的更好成绩保留"""
+        by_player = {player: _sort_key(score, stars, achieved, player)
+                     for player, score, stars, achieved in rows}
+        with self._lock:
+            for player_id, key in self._by_player.items():
+                if player_id not in by_player or key < by_player[player_id]:
+                    by_player[player_id] = key
+            self._keys = SortedList(by_player.values())
+            self._by_player = by_player
+            self.loaded = True
+
+    def ensure_loaded(self, loader):
+        """尚未加载时调用 loader(board)，并发调用只有一个执行"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                loader(self)
+
+    def rank(self, player_id: str) -> Optional[int]:
+        """名次（从1开始）"""
+        with self._lock:
+            key = self._by_player.get(player_id)
+            if key is None:
+                return None
+            return self._keys.index(key) + 1
+
+    def slice(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        offset = max(offset, 0)
+        with self._lock:
+            keys = list(self._keys.islice(offset, offset + limit))
+        return self._entries(keys, offset)
+
+    def window(self, player_id: str, before: int = 0,
+               after: int = 0) -> Optional[Tuple[int, int, List[Dict[str, Any]]]]:
+        """玩家名次、总人数和名次前后的条目，在同一次加锁中读取，不会与并发更新交错"""
+        with self._lock:
+            key = self._by_player.get(player_id)
+            if key is None:
+                return None
+            index = self._keys.index(key)
+            offset = max(index - before, 0)
+            keys = list(self._keys.islice(offset, index + after + 1))
+            total = len(self._keys)
+        return index + 1, total, self._entries(keys, offset)
+
+    @staticmethod
+    def _entries(keys: List[SortKey], offset: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "rank": offset + index + 1,
+                "player_id": player_id,
+                "score": -neg_score,
+                "stars": -neg_stars,
+                "achieved_at": achieved,
+            }
+            for index, (neg_score, neg_stars, achieved, player_id) in enumerate(keys)
+        ]
+
+
+class Leaderboard:
+    """排行榜服务"""
+
+    def __init__(self, sync_interval: float = 0):
+        self._boards: Dict[Tuple[str, str], Board] = {}
+        self._lock = threading.Lock()
+        # 从表中同步其他进程写入的间隔（秒），0表示不同步（单进程）
+        self.sync_interval = sync_interval
+        self._generation = shared_state.counter(GENERATION_KEY)
+
+    # ============ 写入 ============
+
+    @staticmethod
+    def upsert_entry(db, game_type: str, level: str, player_id: str,
+                     score: int, stars: int, achieved_at: datetime) -> bool:
+        """在调用方事务中更新玩家的最好成绩（不提交），返回成绩是否提高"""
+        now = datetime.utcnow()
+        entry = db.query(LeaderboardEntry).filter(
+            LeaderboardEntry.game_type == game_type,
+            LeaderboardEntry.level == level,
+            LeaderboardEntry.player_id == player_id
+        ).first()
+        if entry is None:
+            try:
+                with db.begin_nested():
+                    db.add(LeaderboardEntry(
+                        game_type=game_type, level=level, player_id=player_id,
+                        best_score=score or 0, best_stars=stars or 0,
+                        achieved_at=achieved_at, updated_at=now
+                    ))
+                return True
+            except IntegrityError:
+                # 同一玩家的另一局同时写入了第一条记录，改为条件更新
+                entry = db.query(LeaderboardEntry).filter(
+                    LeaderboardEntry.game_type == game_type,
+                    LeaderboardEntry.level == level,
+                    LeaderboardEntry.player_id == player_id
+                ).one()
+        if not _is_better(score, stars, entry.best_score, entry.best_stars):
+            return False
+        # 条件更新，并发提交时只保留更好的成绩
+        result = db.execute(
+            update(LeaderboardEntry)
+            .where(LeaderboardEntry.id == entry.id,
+                   (LeaderboardEntry.best_score < (score or 0))
+                   | ((LeaderboardEntry.best_score == (score or 0))
+                      & (LeaderboardEntry.best_stars < (stars or 0))))
+            .values(best_score=score or 0, best_stars=stars or 0,
+                    achieved_at=achieved_at, updated_at=now)
+        )
+        return result.rowcount > 0
+
+    def apply(self, game_type: str, level: str, player_id: str,
+              score: int, stars: int, achieved_at: datetime):
+        """事务提交后更新内存排行榜（尚未创建的排行榜下次访问时从表中读取；
+        正在加载的排行榜先记下，加载完成时与表中的成绩合并）"""
+        with self._lock:
+            board = self._boards.get((game_type, level))
+        if board is not None:
+            board.upsert(player_id, score, stars, achieved_at)
+
+    # ============ 查询 ============
+
+    def top(self, game_type: str, level: str, limit: int = 10, offset: int = 0) -> Dict[str, Any]:
+        board = self._board(game_type, level)
+        return {
+            "game_type": game_type,
+            "level": level,
+            "total": len(board),
+            "entries": board.slice(offset, limit),
+        }
+
+    def rank(self, game_type: str, level: str, player_id: str) -> Optional[Dict[str, Any]]:
+        window = self._board(game_type, level).window(player_id)
+        if window is None:
+            return None
+        rank, total, (entry,) = window
+        return {
+            "game_type": game_type,
+            "level": level,
+            "total": total,
+            **entry,
+            # 超过了多少比例的玩家
+            "percentile": round((total - rank) / total * 100, 2) if total else 0.0,
+        }
+
+    def around(self, game_type: str, level: str, player_id: str,
+               radius: int = 5) -> Optional[Dict[str, Any]]:
+        """玩家名次前后各radius名"""
+        window = self._board(game_type, level).window(player_id, radius, radius)
+        if window is None:
+            return None
+        _, total, entries = window
+        return {
+            "game_type": game_type,
+            "level": level,
+            "total": total,
+            "entries": entries,
+        }
+
+    # ============ 加载与重建 ============
+
+    def _board(self, game_type: str, level: str) -> Board:
+        key = (game_type, level)
+        with self._lock:
+            if self.sync_interval > 0:
+                generation = shared_state.counter(GENERATION_KEY)
+                if generation != self._generation:
+                    self._boards.clear()
+                    self._generation = generation
+            board = self._boards.get(key)
+            if board is None:
+                board = self._boards[key] = Board()
+        if not board.loaded:
+            # 在全局锁之外查询数据库
+            board.ensure_loaded(lambda board: self._load(board, game_type, level))
+            return board
+        if self.sync_interval > 0 and time.monotonic() - board.synced_at >= self.sync_interval:
+            self._sync(board, game_type, level)
+        return board
+
+    @staticmethod
+    def _load(board: Board, game_type: str, level: str):
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                LeaderboardEntry.player_id, LeaderboardEntry.best_score,
+                LeaderboardEntry.best_stars, LeaderboardEntry.achieved_at
+            ).filter(
+                LeaderboardEntry.game_type == game_type,
+                LeaderboardEntry.level == level
+            ).all()
+            board.watermark = db.query(func.max(LeaderboardEntry.updated_at)).filter(
+                LeaderboardEntry.game_type == game_type,
+                LeaderboardEntry.level == level
+            ).scalar()
+        finally:
+            db.close()
+        board.load(rows)
+        board.synced_at = time.monotonic()
+
+    @staticmethod
+    def _sync(board: Board, game_type: str, level: str):
+        """读取水位线之后更新的成绩；Board.upsert 只接受更好的成绩，重复读取无影响"""
+        board.synced_at = time.monotonic()
+        db = SessionLocal()
+        try:
+            query = db.query(
+                LeaderboardEntry.player_id, LeaderboardEntry.best_score,
+                LeaderboardEntry.best_stars, LeaderboardEntry.achieved_at,
+                LeaderboardEntry.updated_at
+            ).filter(
+                LeaderboardEntry.game_type == game_type,
+                LeaderboardEntry.level == level
+            )
+            if board.watermark is not None:
+                query = query.filter(LeaderboardEntry.updated_at >= board.watermark - SYNC_SKEW)
+            rows = query.all()
+        finally:
+            db.close()
+        for player_id, score, stars, achieved_at, updated_at in rows:
+            board.upsert(player_id, score, stars, achieved_at)
+            if updated_at and (board.watermark is None or updated_at > board.watermark):
+                board.watermark = updated_at
+
+    def invalidate(self):
+        """清空内存排行榜，下次访问时重新加载"""
+        with self._lock:
+            self._boards.clear()
+
+    def rebuild(self) -> int:
+        """根据全部已结束的游戏会话重建排行榜表，返回写入的行数"""
+        best: Dict[Tuple[str, str, str], Tuple[int, int, datetime]] = {}
+        db = SessionLocal()
+        try:
+            sessions = db.query(
+                GameSession.game_type, GameSession.level, GameSession.player_id,
+                GameSession.score, GameSession.stars, GameSession.end_time
+            ).filter(
+                GameSession.end_time.isnot(None), GameSession.score.isnot(None)
+            ).order_by(GameSession.end_time).yield_per(5000)
+
+            for game_type, level, player_id, score, stars, end_time in sessions:
+                key = (game_type, level or "beginner", player_id)
+                current = best.get(key)
+                # 按结束时间顺序遍历，同分时保留先达到的
+                if current is None or _is_better(score, stars, current[0], current[1]):
+                    best[key] = (score or 0, stars or 0, end_time)
+
+            db.query(LeaderboardEntry).delete()
+            now = datetime.utcnow()
+            db.add_all([
+                LeaderboardEntry(
+                    game_type=game_type, level=level, player_id=player_id,
+                    best_score=score, best_stars=stars, achieved_at=achieved_at,
+                    updated_at=now
+                )
+                for (game_type, level, player_id), (score, stars, achieved_at) in best.items()
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"重建排行榜失败: {e}")
+            raise e
+        finally:
+            db.close()
+
+        self.invalidate()
+        # 通知其他进程（包括运行中的服务）丢弃内存排行榜
+        self._generation = shared_state.incr(GENERATION_KEY)
+        return len(best)
+
+
+# 全局实例
+leaderboard = Leaderboard(
+    sync_interval=float(os.getenv("LEADERBOARD_SYNC_INTERVAL") or (1 if worker_count() > 1 else 0))
+)
@@ -0,0 +1,253 @@
+"""
+练习题库
+按 (topic, player_level) 预先生成并校验练习题，请求时直接从库存出题；
+库存低于水位线时由后台线程补充
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from models.database import SessionLocal, QuizBankItem, QuizServed
+from models.schemas import QuizResponse
+from utils.ai_cache import normalize_text
+from utils.concurrency import run_db, run_ai
+from utils.shared_state import shared_state
+from utils.zhipu_ai import zhipu_ai_service
+
+
+def _fingerprint(quiz: Dict[str, Any]) -> str:
+    return hashlib.sha1(normalize_text(quiz["question"]).encode("utf-8")).hexdigest()
+
+
+class QuizBank:
+    """练习题库"""
+
+    def __init__(self, low_water: int = 5, refill_batch: int = 3,
+                 max_per_bucket: int = 200):
+        self.low_water = low_water
+        self.refill_batch = refill_batch
+        self.max_per_bucket = max_per_bucket
+
+        self._pending: set = set()
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # 计数在请求线程和补题线程中都会更新
+        self._stats_lock = threading.Lock()
+
+        # 统计计数
+        self.served = 0
+        self.misses = 0
+        self.generated = 0
+        self.invalid = 0
+
+    def start(self):
+        """启动后台补题线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="quiz-bank-refill", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台补题线程"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    async def take(self, player_level: str, topic: str,
+                   player_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """从库存取一道玩家没做过的题，库存不足时触发补题；没有可用题目返回None"""
+        quiz, unseen = await run_db(self._take, topic, player_level, player_id)
+        if unseen - 1 < self.low_water:
+            self.request_refill(topic, player_level)
+        self._count("misses" if quiz is None else "served")
+        return quiz
+
+    async def generate_for(self, player_level: str, topic: str,
+                           player_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """库存为空时现场生成一道题，校验通过后入库并记为已出"""
+        quiz = await run_ai(self._generate, player_level, topic)
+        if quiz:
+            await run_db(self._store, topic, player_level, [quiz], player_id)
+        return quiz
+
+    def request_refill(self, topic: str, player_level: str):
+        """登记需要补题的题库分组"""
+        with self._pending_lock:
+            self._pending.add((topic, player_level))
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """题库统计"""
+        db = SessionLocal()
+        try:
+            buckets = db.query(
+                QuizBankItem.topic, QuizBankItem.player_level, func.count(QuizBankItem.id)
+            ).group_by(QuizBankItem.topic, QuizBankItem.player_level).all()
+        finally:
+            db.close()
+
+        with self._pending_lock:
+            pending = len(self._pending)
+        with self._stats_lock:
+            counters = {
+                "served": self.served,
+                "misses": self.misses,
+                "generated": self.generated,
+                "invalid": self.invalid,
+            }
+        return {
+            **counters,
+            "pending_refills": pending,
+            "buckets": [
+                {"topic": topic, "player_level": level, "stock": count}
+                for topic, level, count in buckets
+            ],
+        }
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # ============ 后台补题 ============
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            while not self._stop.is_set():
+                with self._pending_lock:
+                    if not self._pending:
+                        break
+                    topic, player_level = self._pending.pop()
+                try:
+                    self._refill(topic, player_level)
+                except Exception as e:
+                    print(f"补充题库失败: {e}")
+
+    def _refill(self, topic: str, player_level: str):
+        # 多worker时同一分组只由一个进程补题，避免重复调用AI
+        lease = f"quiz-refill:{topic}:{player_level}"
+        if not shared_state.acquire_lease(lease, ttl=300):
+            return
+        try:
+            self._refill_bucket(topic, player_level)
+        finally:
+            shared_state.release_lease(lease)
+
+    def _refill_bucket(self, topic: str, player_level: str):
+        db = SessionLocal()
+        try:
+            stock = db.query(func.count(QuizBankItem.id)).filter(
+                QuizBankItem.topic == topic,
+                QuizBankItem.player_level == player_level
+            ).scalar()
+        finally:
+            db.close()
+
+        count = min(self.refill_batch, self.max_per_bucket - stock)
+        quizzes = []
+        for _ in range(max(count, 0)):
+            quiz = self._generate(player_level, topic)
+            if quiz:
+                quizzes.append(quiz)
+        if quizzes:
+            self._store(topic, player_level, quizzes)
+
+    def _generate(self, player_level: str, topic: str) -> Optional[Dict[str, Any]]:
+        """调用AI生成一道题，并按QuizResponse校验"""
+        raw = zhipu_ai_service.generate_quiz(player_level, topic, fallback=False)
+        try:
+            quiz = QuizResponse.model_validate(raw) if raw is not None else None
+        except ValidationError:
+            quiz = None
+        if quiz is None or not quiz.question.strip() or len(quiz.options) < 2:
+            self._count("invalid")
+            return None
+        self._count("generated")
+        return quiz.model_dump()
+
+    # ============ 数据库操作 ============
+
+    @staticmethod
+    def _take(topic: str, player_level: str,
+              player_id: Optional[str]) -> Tuple[Optional[Dict[str, Any]], int]:
+        db = SessionLocal()
+        try:
+            query = db.query(QuizBankItem).filter(
+                QuizBankItem.topic == topic,
+                QuizBankItem.player_level == player_level
+            )
+            if player_id:
+                seen = select(QuizServed.quiz_id).where(QuizServed.player_id == player_id)
+                query = query.filter(QuizBankItem.id.notin_(seen))
+
+            unseen = query.count()
+            item = query.order_by(func.random()).first() if unseen else None
+            if item is None:
+                return None, 0
+
+            if player_id:
+                db.add(QuizServed(player_id=player_id, quiz_id=item.id))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+
+            return {
+                "question": item.question,
+                "options": item.options,
+                "correct_answer": item.correct_answer,
+                "explanation": item.explanation,
+            }, unseen
+        finally:
+            db.close()
+
+    @staticmethod
+    def _store(topic: str, player_level: str, quizzes: List[Dict[str, Any]],
+               served_to: Optional[str] = None):
+        """题目入库，同一分组中重复的题目跳过"""
+        db = SessionLocal()
+        try:
+            for quiz in quizzes:
+                try:
+                    with db.begin_nested():
+                        item = QuizBankItem(
+                            topic=topic,
+                            player_level=player_level,
+                            question=quiz["question"],
+                            options=quiz["options"],
+                            correct_answer=quiz["correct_answer"],
+                            explanation=quiz["explanation"],
+                            fingerprint=_fingerprint(quiz)
+                        )
+                        db.add(item)
+                        db.flush()
+                        if served_to:
+                            db.add(QuizServed(player_id=served_to, quiz_id=item.id))
+                except IntegrityError:
+                    continue
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"题目入库失败: {e}")
+        finally:
+            db.close()
+
+
+# 全局实例
+quiz_bank = QuizBank(
+    low_water=int(os.getenv("QUIZ_BANK_LOW_WATER", 5)),
+    refill_batch=int(os.getenv("QUIZ_BANK_REFILL_BATCH", 3)),
+    max_per_bucket=int(os.getenv("QUIZ_BANK_MAX_PER_BUCKET", 200)),
+)
@@ -0,0 +1,257 @@
+"""
+学习报告
+报告按玩家保存一行，查询报告只需按ID读取。玩家开始或结束新的会话时报告被标记为过期，
+读取到过期的报告时才重新计算（后台线程或 /generate 请求中），生成AI建议的次数与查看报告的次数相关，
+与游戏局数无关；同一玩家的重复计算请求合并为一次
+"""
+
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models.database import SessionLocal, GameSession, ErrorRecord, Report
+from services.game_service import GameService
+from utils.concurrency import run_db, run_ai
+from utils.single_flight import SingleFlight
+from utils.zhipu_ai import zhipu_ai_service
+
+DEFAULT_SUGGESTIONS = [
+    "继续保持学习热情！",
+    "建议多练习基础操作",
+    "可以尝试更高难度的挑战"
+]
+
+
+class ReportBuilder:
+    """学习报告的计算与存储"""
+
+    def __init__(self):
+        self._pending: set = set()
+        # 后台线程正在计算的玩家，计算期间的重复登记忽略
+        self._building: set = set()
+        self._pending_lock = threading.Lock()
+        # 同一玩家并发的 /generate 请求只计算一次
+        self._flight = SingleFlight("report", result_window=0)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计计数
+        self.built = 0
+        self.failed = 0
+
+    def start(self):
+        """启动后台计算线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="report-builder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台计算线程"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def request(self, player_id: str):
+        """登记需要重新计算报告的玩家，已登记或正在计算的玩家不再重复登记"""
+        with self._pending_lock:
+            if player_id in self._building:
+                return
+            self._pending.add(player_id)
+        self._wake.set()
+
+    async def generate(self, player_id: str) -> Dict[str, Any]:
+        """立即计算并保存报告"""
+        report, _ = await self._flight.do(player_id, lambda: self._generate(player_id))
+        return report
+
+    async def _generate(self, player_id: str) -> Dict[str, Any]:
+        data = await run_db(self._collect, player_id)
+        data["ai_suggestions"] = await run_ai(self._suggest, data)
+        return await run_db(self._save, data)
+
+    async def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """按报告ID读取，过期的报告照常返回并触发重新计算"""
+        report = await run_db(self._get, Report.report_id == report_id)
+        if report and report["stale"]:
+            self.request(report["player_id"])
+        return report
+
+    async def get_for_player(self, player_id: str) -> Optional[Dict[str, Any]]:
+        """读取玩家当前的报告"""
+        return await run_db(self._get, Report.player_id == player_id)
+
+    # ============ 后台计算 ============
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            while not self._stop.is_set():
+                with self._pending_lock:
+                    if not self._pending:
+                        break
+                    player_id = self._pending.pop()
+                    self._building.add(player_id)
+                try:
+                    # 读取时的过期状态可能已被刚完成的计算清除
+                    if not self._is_stale(player_id):
+                        continue
+                    data = self._collect(player_id)
+                    data["ai_suggestions"] = self._suggest(data)
+                    self._save(data)
+                except Exception as e:
+                    self.failed += 1
+                    print(f"生成学习报告失败: {e}")
+                finally:
+                    with self._pending_lock:
+                        self._building.discard(player_id)
+
+    @staticmethod
+    def _collect(player_id: str) -> Dict[str, Any]:
+        """汇总进度、游戏时长和各游戏的错误统计"""
+        progress = GameService._get_progress(player_id)
+
+        db = SessionLocal()
+        try:
+            sessions = db.query(GameSession.start_time, GameSession.end_time).filter(
+                GameSession.player_id == player_id
+            ).all()
+            total_time = sum(
+                (end - start).total_seconds()
+                for start, end in sessions if start and end and end > start
+            )
+
+            error_rows = db.query(
+                GameSession.game_type, ErrorRecord.error_type, func.sum(ErrorRecord.count)
+            ).join(
+                GameSession, GameSession.session_id == ErrorRecord.session_id
+            ).filter(
+                GameSession.player_id == player_id
+            ).group_by(GameSession.game_type, ErrorRecord.error_type).all()
+        finally:
+            db.close()
+
+        error_stats: Dict[str, Dict[str, int]] = {}
+        for game_type, error_type, count in error_rows:
+            error_stats.setdefault(game_type, {})[error_type] = int(count or 0)
+
+        return {
+            "player_id": player_id,
+            "total_time": round(total_time, 1),
+            "total_games": progress["total_games"],
+            "overall_score": progress["overall_progress"],
+            "game_breakdown": progress["games"],
+            "error_stats": error_stats,
+            # 计算开始时的会话数，保存时用于判断期间是否有新会话
+            "session_count": len(sessions),
+        }
+
+    @staticmethod
+    def _suggest(data: Dict[str, Any]) -> List[str]:
+        """根据汇总数据生成AI学习建议"""
+        errors = Counter()
+        for stats in data["error_stats"].values():
+            errors.update(stats)
+        feedback = zhipu_ai_service.get_feedback({
+            "game_name": "智慧乡村全部关卡",
+            "score": data["overall_score"],
+            "time_spent": int(data["total_time"]),
+            "error_count": sum(errors.values()),
+            "error_types": "、".join(error for error, _ in errors.most_common(3)) or "无",
+        })
+        suggestions = [
+            item for item in (feedback.get("suggestions") or []) + (feedback.get("next_steps") or [])
+            if isinstance(item, str) and item.strip()
+        ]
+        return suggestions or list(DEFAULT_SUGGESTIONS)
+
+    # ============ 数据库操作 ============
+
+    def _save(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """保存报告（每个玩家一行，报告ID保持不变）"""
+        player_id = data["player_id"]
+        values = {key: value for key, value in data.items() if key not in ("player_id", "session_count")}
+        db = SessionLocal()
+        try:
+            session_count = db.query(func.count(GameSession.id)).filter(
+                GameSession.player_id == player_id
+            ).scalar()
+            values["stale"] = session_count != data["session_count"]
+            values["updated_at"] = datetime.utcnow()
+
+            report = db.query(Report).filter(Report.player_id == player_id).first()
+            if report is None:
+                report = Report(report_id=str(uuid.uuid4()), player_id=player_id,
+                                created_at=values["updated_at"], **values)
+                db.add(report)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # 并发创建时改为更新已有的一行
+                    db.rollback()
+                    report = db.query(Report).filter(Report.player_id == player_id).one()
+                    for key, value in values.items():
+                        setattr(report, key, value)
+                    db.commit()
+            else:
+                for key, value in values.items():
+                    setattr(report, key, value)
+                db.commit()
+
+            # 计算期间有新会话时保持过期，下次读取时再重新计算
+            self.built += 1
+            return self._to_dict(report)
+
+        except Exception as e:
+            db.rollback()
+            print(f"保存学习报告失败: {e}")
+            raise e
+        finally:
+            db.close()
+
+    @staticmethod
+    def _is_stale(player_id: str) -> bool:
+        db = SessionLocal()
+        try:
+            return bool(db.query(Report.stale).filter(Report.player_id == player_id).scalar())
+        finally:
+            db.close()
+
+    @staticmethod
+    def _get(condition) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            report = db.query(Report).filter(condition).first()
+            return ReportBuilder._to_dict(report) if report else None
+        finally:
+            db.close()
+
+    @staticmethod
+    def _to_dict(report: Report) -> Dict[str, Any]:
+        return {
+            "report_id": report.report_id,
+            "player_id": report.player_id,
+            "total_time": report.total_time,
+            "total_games": report.total_games,
+            "overall_score": report.overall_score,
+            "game_breakdown": report.game_breakdown,
+            "error_stats": report.error_stats,
+            "ai_suggestions": report.ai_suggestions,
+            "created_at": report.created_at,
+            "updated_at": report.updated_at,
+            "stale": report.stale,
+        }
+
+
+# 全局实例
+report_builder = ReportBuilder()
@@ -0,0 +1,222 @@
+"""
+活跃会话登记表
+开始游戏时登记会话的玩家、游戏类型、难度和开始时间，记录操作、结束游戏和生成反馈时
+直接读取，不必每次按 session_id 查询 GameSession。
+结束的会话移入一个有上限的已结束表，之后写入的操作直接拒绝；长时间没有操作的会话被移出，
+再次访问时从数据库重新读取。不存在的 session_id 短时间内记住，重复的无效写入也不查库。
+多worker部署时每个进程各有一份，没有登记的会话第一次访问时从数据库读取。
+"""
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from models.database import SessionLocal, GameSession
+from utils.concurrency import run_db
+
+
+class InactiveSession(Exception):
+    """会话不存在或已结束，不能再记录操作"""
+
+    def __init__(self, session_id: str, ended: bool = False):
+        super().__init__("游戏会话已结束" if ended else "游戏会话不存在")
+        self.session_id = session_id
+        self.ended = ended
+
+
+class LiveSession:
+    """登记表中的一个会话"""
+
+    __slots__ = ("session_id", "player_id", "game_type", "level", "start_time",
+                 "end_time", "score", "completed", "actions", "last_seen")
+
+    def __init__(self, session_id: str, player_id: str, game_type: str, level: Optional[str],
+                 start_time: Optional[datetime], end_time: Optional[datetime] = None,
+                 score: Optional[int] = None, completed: bool = False):
+        self.session_id = session_id
+        self.player_id = player_id
+        self.game_type = game_type
+        self.level = level or "beginner"
+        self.start_time = start_time
+        self.end_time = end_time
+        self.score = score
+        self.completed = bool(completed)
+        # 本进程中记录的操作数
+        self.actions = 0
+        self.last_seen = time.monotonic()
+
+    @property
+    def ended(self) -> bool:
+        return self.end_time is not None
+
+
+class SessionRegistry:
+    """进程内的会话登记表"""
+
+    def __init__(self, idle_timeout: float = 1800.0, max_live: int = 100000,
+                 max_ended: int = 10000, miss_ttl: float = 30.0, max_missing: int = 10000):
+        self.idle_timeout = idle_timeout
+        self.max_live = max_live
+        self.max_ended = max_ended
+        self.miss_ttl = miss_ttl
+        self.max_missing = max_missing
+
+        # 按最近访问时间排序，最久未访问的在前面
+        self._live: "OrderedDict[str, LiveSession]" = OrderedDict()
+        self._ended: "OrderedDict[str, LiveSession]" = OrderedDict()
+        # 不存在的 session_id -> 过期时间
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        self._live_by_game: Counter = Counter()
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.hits = 0
+        self.loads = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    # ============ 查询 ============
+
+    def get(self, session_id: str) -> Optional[LiveSession]:
+        """返回已登记的会话（包括已结束的），没有登记时返回None"""
+        with self._lock:
+            session = self._live.get(session_id) or self._ended.get(session_id)
+            if session is not None:
+                self.hits += 1
+            return session
+
+    async def resolve(self, session_id: str) -> Optional[LiveSession]:
+        """返回会话，没有登记时从数据库读取；会话不存在时返回None"""
+        session = self.get(session_id)
+        if session is not None:
+            return session
+        with self._lock:
+            expires = self._missing.get(session_id)
+            if expires is not None and expires > time.monotonic():
+                return None
+        return await run_db(self.load, session_id)
+
+    async def require_active(self, session_id: str) -> LiveSession:
+        """返回未结束的会话，否则抛出InactiveSession"""
+        session = await self.resolve(session_id)
+        if session is None or session.ended:
+            self.reject()
+            raise InactiveSession(session_id, ended=session is not None)
+        return session
+
+    def reject(self, count: int = 1):
+        """记录被拒绝的写入（会话不存在或已结束）"""
+        with self._lock:
+            self.rejected += count
+
+    def load(self, session_id: str) -> Optional[LiveSession]:
+        """从数据库读取会话并登记"""
+        db = SessionLocal()
+        try:
+            row = db.query(
+                GameSession.player_id, GameSession.game_type, GameSession.level,
+                GameSession.start_time, GameSession.end_time,
+                GameSession.score, GameSession.completed
+            ).filter(GameSession.session_id == session_id).first()
+        finally:
+            db.close()
+
+        if row is None:
+            with self._lock:
+                self.loads += 1
+                self._missing[session_id] = time.monotonic() + self.miss_ttl
+                self._missing.move_to_end(session_id)
+                while len(self._missing) > self.max_missing:
+                    self._missing.popitem(last=False)
+            return None
+
+        session = LiveSession(session_id, row.player_id, row.game_type, row.level,
+                              row.start_time, row.end_time, row.score, row.completed)
+        with self._lock:
+            self.loads += 1
+            if session.ended:
+                self._remember_ended(session)
+        if not session.ended:
+            self.register(session)
+        return session
+
+    # ============ 更新 ============
+
+    def register(self, session: LiveSession):
+        """登记新开始的会话"""
+        with self._lock:
+            self._missing.pop(session.session_id, None)
+            if session.session_id not in self._live:
+                self._live_by_game[session.game_type] += 1
+            self._live[session.session_id] = session
+            self._evict()
+
+    def touch(self, session: LiveSession, actions: int = 1):
+        """记录了操作：更新操作数和最近访问时间"""
+        with self._lock:
+            session.actions += actions
+            session.last_seen = time.monotonic()
+            if session.session_id in self._live:
+                self._live.move_to_end(session.session_id)
+            self._evict()
+
+    def end(self, session: LiveSession, score: int, completed: bool, end_time: datetime):
+        """会话结束：移入已结束表"""
+        with self._lock:
+            session.score = score
+            session.completed = bool(completed)
+            session.end_time = end_time
+            if self._live.pop(session.session_id, None) is not None:
+                self._live_by_game[session.game_type] -= 1
+            self._remember_ended(session)
+
+    def _remember_ended(self, session: LiveSession):
+        self._ended[session.session_id] = session
+        self._ended.move_to_end(session.session_id)
+        while len(self._ended) > self.max_ended:
+            self._ended.popitem(last=False)
+
+    def _evict(self):
+        """移出空闲超时或超出上限的会话（调用方持有锁）"""
+        deadline = time.monotonic() - self.idle_timeout
+        while self._live:
+            session = next(iter(self._live.values()))
+            if session.last_seen > deadline and len(self._live) <= self.max_live:
+                return
+            self._live.popitem(last=False)
+            self._live_by_game[session.game_type] -= 1
+            self.evicted += 1
+
+    # ============ 统计 ============
+
+    def live_count(self) -> Dict[str, int]:
+        """按游戏类型统计的活跃会话数"""
+        with self._lock:
+            self._evict()
+            return {game_type: count for game_type, count in self._live_by_game.items() if count}
+
+    def stats(self) -> Dict[str, Any]:
+        by_game = self.live_count()
+        with self._lock:
+            return {
+                "live": sum(by_game.values()),
+                "live_by_game": by_game,
+                "ended_cached": len(self._ended),
+                "missing_cached": len(self._missing),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evicted": self.evicted,
+                "rejected": self.rejected,
+            }
+
+
+# 全局实例
+session_registry = SessionRegistry(
+    idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT") or 1800),
+    max_live=int(os.getenv("SESSION_REGISTRY_MAX_LIVE") or 100000),
+    max_ended=int(os.getenv("SESSION_REGISTRY_MAX_ENDED") or 10000),
+    miss_ttl=float(os.getenv("SESSION_MISS_TTL") or 30),
+)
@@ -0,0 +1,22 @@
+"""
+操作系统算法模拟引擎
+进程调度、页面置换、银行家算法与磁盘调度的服务端实现，
+用于出题、校验玩家提交的答案、计算标准答案，以及为提示提供确定的中间状态。
+能整体向量化的计算（FCFS调度、后续访问位置、安全序列校验、SCAN类磁盘调度）使用NumPy，
+本身按时间推进的算法（SJF/优先级/RR、LRU/FIFO/OPT、SSTF）用堆或双端队列逐步模拟。
+"""
+
+from simulation.scheduling import schedule, compare_schedules, SCHEDULING_ALGORITHMS
+from simulation.paging import simulate_paging, fault_curve, PAGING_ALGORITHMS
+from simulation.banker import check_safety, is_safe_sequence, request_resources, detect_deadlock
+from simulation.disk import schedule_disk, DISK_ALGORITHMS
+from simulation.validation import validate_submission, SubmissionError, VALIDATED_GAMES
+from simulation.problems import generate_problem
+
+__all__ = [
+    "schedule", "compare_schedules", "SCHEDULING_ALGORITHMS",
+    "simulate_paging", "fault_curve", "PAGING_ALGORITHMS",
+    "check_safety", "is_safe_sequence", "request_resources", "detect_deadlock",
+    "schedule_disk", "DISK_ALGORITHMS",
+    "validate_submission", "SubmissionError", "VALIDATED_GAMES", "generate_problem",
+]
@@ -0,0 +1,110 @@
+"""
+银行家算法与死锁检测
+安全性检查每一轮用矩阵比较找出所有能运行完的进程并一起释放资源
+（资源只增不减，同一轮的进程按任意顺序执行都安全），轮数不超过进程数；
+给定序列是否安全由前缀和一次判断。
+"""
+
+from typing import Dict, Any, List, Sequence
+
+import numpy as np
+
+
+def _matrices(available, allocation, demand, demand_name: str):
+    available = np.asarray(available, dtype=np.int64)
+    allocation = np.asarray(allocation, dtype=np.int64)
+    demand = np.asarray(demand, dtype=np.int64)
+    if available.ndim != 1 or allocation.ndim != 2 or allocation.shape != demand.shape \
+            or allocation.shape[1] != available.size:
+        raise ValueError(f"可用向量、分配矩阵与{demand_name}矩阵的维度不一致")
+    if (available < 0).any() or (allocation < 0).any():
+        raise ValueError("资源数量不能为负")
+    return available, allocation, demand
+
+
+def _need(allocation: np.ndarray, maximum: np.ndarray) -> np.ndarray:
+    need = maximum - allocation
+    if (need < 0).any():
+        raise ValueError("已分配的资源超过了最大需求")
+    return need
+
+
+def _reduce(work: np.ndarray, allocation: np.ndarray, demand: np.ndarray,
+            finished: np.ndarray) -> List[int]:
+    """反复让需求能被满足的进程运行完并归还资源，返回完成顺序；finished 原地更新"""
+    sequence: List[int] = []
+    while True:
+        runnable = ~finished & (demand <= work).all(axis=1)
+        if not runnable.any():
+            return sequence
+        indices = np.flatnonzero(runnable)
+        work += allocation[indices].sum(axis=0)
+        finished[indices] = True
+        sequence.extend(indices.tolist())
+
+
+def check_safety(available: Sequence[int], allocation: Sequence[Sequence[int]],
+                 maximum: Sequence[Sequence[int]]) -> Dict[str, Any]:
+    """安全性检查，安全时给出一个安全序列（进程下标）"""
+    available, allocation, maximum = _matrices(available, allocation, maximum, "最大需求")
+    need = _need(allocation, maximum)
+    finished = np.zeros(allocation.shape[0], dtype=bool)
+    sequence = _reduce(available.copy(), allocation, need, finished)
+    return {
+        "safe": bool(finished.all()),
+        "sequence": sequence if finished.all() else None,
+        "blocked": np.flatnonzero(~finished).tolist(),
+        "need": need.tolist(),
+    }
+
+
+def is_safe_sequence(available: Sequence[int], allocation: Sequence[Sequence[int]],
+                     maximum: Sequence[Sequence[int]], sequence: Sequence[int]) -> bool:
+    """判断玩家给出的执行顺序是否是安全序列（任何合法的安全序列都接受）"""
+    available, allocation, maximum = _matrices(available, allocation, maximum, "最大需求")
+    need = _need(allocation, maximum)
+    order = np.asarray(sequence, dtype=np.int64)
+    n = allocation.shape[0]
+    if order.shape != (n,) or not np.array_equal(np.sort(order), np.arange(n)):
+        return False
+    # 第k个进程开始时可用的资源 = 初始可用 + 之前各进程归还的资源
+    released = np.cumsum(allocation[order], axis=0) - allocation[order]
+    return bool((need[order] <= available + released).all())
+
+
+def request_resources(available: Sequence[int], allocation: Sequence[Sequence[int]],
+                      maximum: Sequence[Sequence[int]], process: int,
+                      request: Sequence[int]) -> Dict[str, Any]:
+    """进程申请资源：先检查是否超过需求和可用量，再试分配并做安全性检查"""
+    available, allocation, maximum = _matrices(available, allocation, maximum, "最大需求")
+    need = _need(allocation, maximum)
+    request = np.asarray(request, dtype=np.int64)
+    if not 0 <= process < allocation.shape[0]:
+        raise ValueError("进程下标越界")
+    if request.shape != available.shape or (request < 0).any():
+        raise ValueError("申请向量的维度与资源种类不一致")
+
+    if (request > need[process]).any():
+        return {"granted": False, "reason": "exceeds_need", "sequence": None}
+    if (request > available).any():
+        return {"granted": False, "reason": "must_wait", "sequence": None}
+
+    allocation = allocation.copy()
+    allocation[process] += request
+    result = check_safety(available - request, allocation, maximum)
+    return {
+        "granted": result["safe"],
+        "reason": "safe" if result["safe"] else "unsafe",
+        "sequence": result["sequence"],
+    }
+
+
+def detect_deadlock(available: Sequence[int], allocation: Sequence[Sequence[int]],
+                    request: Sequence[Sequence[int]]) -> Dict[str, Any]:
+    """死锁检测：按当前申请量归约，无法完成的进程处于死锁"""
+    available, allocation, request = _matrices(available, allocation, request, "申请")
+    # 没有占用资源的进程不会参与死锁
+    finished = ~allocation.any(axis=1)
+    _reduce(available.copy(), allocation, request, finished)
+    deadlocked = np.flatnonzero(~finished).tolist()
+    return {"deadlocked": bool(deadlocked), "processes": deadlocked}
@@ -0,0 +1,96 @@
+"""
+磁盘调度
+FCFS、SSTF、SCAN、C-SCAN、LOOK和C-LOOK。除SSTF外，服务顺序都由一次排序和按磁头位置切分得到；
+SSTF在有序请求上用左右两个指针逐步选择距离更近的一侧。
+寻道距离为磁头实际经过的路径长度（SCAN/C-SCAN包括到达磁盘端点和C-SCAN的回扫）。
+"""
+
+from typing import Dict, Any, Sequence
+
+import numpy as np
+
+DISK_ALGORITHMS = ("fcfs", "sstf", "scan", "cscan", "look", "clook")
+
+
+def _sstf(ordered: np.ndarray, head: int, upward: bool) -> np.ndarray:
+    """ordered 已排序；已服务的请求总是磁头两侧指针之间的连续一段"""
+    values = ordered.tolist()
+    right = int(np.searchsorted(ordered, head, side="left"))
+    left = right - 1
+    position = head
+    result = []
+    while left >= 0 or right < len(values):
+        if left < 0:
+            take_right = True
+        elif right >= len(values):
+            take_right = False
+        else:
+            down, up = position - values[left], values[right] - position
+            # 距离相同时沿当前方向继续
+            take_right = up < down or (up == down and upward)
+        if take_right:
+            position = values[right]
+            right += 1
+        else:
+            position = values[left]
+            left -= 1
+        upward = take_right
+        result.append(position)
+    return np.asarray(result, dtype=np.int64)
+
+
+def schedule_disk(requests: Sequence[int], head: int, algorithm: str = "fcfs",
+                  cylinders: int = 200, direction: str = "up") -> Dict[str, Any]:
+    """
+    计算磁盘请求的服务顺序和总寻道距离
+
+    Args:
+        direction: 磁头初始移动方向，up 为柱面号增大方向
+    """
+    if algorithm not in DISK_ALGORITHMS:
+        raise ValueError(f"不支持的磁盘调度算法: {algorithm}")
+    if direction not in ("up", "down"):
+        raise ValueError("方向只能是 up 或 down")
+    requests = np.asarray(requests, dtype=np.int64)
+    if requests.ndim != 1:
+        raise ValueError("请求必须是一维序列")
+    if not 0 <= head < cylinders or (requests < 0).any() or (requests >= cylinders).any():
+        raise ValueError("磁头位置和请求必须在 [0, cylinders) 范围内")
+
+    upward = direction == "up"
+    last = cylinders - 1
+    if algorithm == "fcfs":
+        order, stops = requests, []
+    elif algorithm == "sstf":
+        order, stops = _sstf(np.sort(requests), head, upward), []
+    else:
+        ordered = np.sort(requests)
+        # 正好在磁头位置的请求归入先服务的一侧
+        split = int(np.searchsorted(ordered, head, side="left" if upward else "right"))
+        above, below = ordered[split:], ordered[:split]
+        first, second = (above, below[::-1]) if upward else (below[::-1], above)
+        end, start = (last, 0) if upward else (0, last)
+
+        if algorithm in ("scan", "look"):
+            order = np.concatenate([first, second])
+            # SCAN 需要反向时先走到磁盘端点
+            stops = [(len(first), end)] if algorithm == "scan" and second.size else []
+        else:
+            # 循环扫描：第二段与第一段同方向服务
+            second = second[::-1]
+            order = np.concatenate([first, second])
+            stops = [(len(first), end), (len(first), start)] if algorithm == "cscan" and second.size else []
+
+    path = order.tolist()
+    # 在服务顺序中插入端点，得到磁头经过的完整路径
+    for offset, (index, cylinder) in enumerate(stops):
+        path.insert(index + offset, cylinder)
+    path = np.asarray([head] + path, dtype=np.int64)
+    total = int(np.abs(np.diff(path)).sum())
+    return {
+        "algorithm": algorithm,
+        "order": order.tolist(),
+        "path": path.tolist(),
+        "total_seek": total,
+        "average_seek": round(total / requests.size, 4) if requests.size else 0.0,
+    }
@@ -0,0 +1,110 @@
+"""
+页面置换
+FIFO、LRU和OPT。OPT需要的"每次访问之后下一次访问同一页的位置"由一次排序整体算出，
+置换时用堆找出最晚再被访问的页，整体复杂度 O(n log f)。
+"""
+
+import heapq
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Sequence
+
+import numpy as np
+
+PAGING_ALGORITHMS = ("fifo", "lru", "opt")
+
+
+def next_use(reference: np.ndarray) -> np.ndarray:
+    """每个位置之后同一页下一次被访问的位置，不再访问时为 len(reference)"""
+    n = reference.size
+    positions = np.arange(n)
+    # 按 (页号, 位置) 排序后，相邻且页号相同的两项就是同一页的相邻两次访问
+    order = np.lexsort((positions, reference))
+    same = reference[order[1:]] == reference[order[:-1]]
+    result = np.full(n, n, dtype=np.int64)
+    result[order[:-1][same]] = order[1:][same]
+    return result
+
+
+def _fifo(pages: List[int], frames: int) -> List[bool]:
+    resident, queue, faults = set(), deque(), []
+    for page in pages:
+        if page in resident:
+            faults.append(False)
+            continue
+        faults.append(True)
+        if len(resident) >= frames:
+            resident.discard(queue.popleft())
+        resident.add(page)
+        queue.append(page)
+    return faults
+
+
+def _lru(pages: List[int], frames: int) -> List[bool]:
+    resident: OrderedDict = OrderedDict()
+    faults = []
+    for page in pages:
+        if page in resident:
+            resident.move_to_end(page)
+            faults.append(False)
+            continue
+        faults.append(True)
+        if len(resident) >= frames:
+            resident.popitem(last=False)
+        resident[page] = None
+    return faults
+
+
+def _opt(pages: List[int], frames: int, upcoming: List[int]) -> List[bool]:
+    # resident: 页号 -> 下一次访问位置；堆中过期的项在弹出时跳过
+    resident: Dict[int, int] = {}
+    heap: list = []
+    faults = []
+    for page, following in zip(pages, upcoming):
+        if page in resident:
+            faults.append(False)
+        else:
+            faults.append(True)
+            if len(resident) >= frames:
+                while True:
+                    neg_next, victim = heapq.heappop(heap)
+                    if resident.get(victim) == -neg_next:
+                        del resident[victim]
+                        break
+        resident[page] = following
+        heapq.heappush(heap, (-following, page))
+    return faults
+
+
+def simulate_paging(reference: Sequence[int], frames: int, algorithm: str = "lru") -> Dict[str, Any]:
+    """模拟页面置换，返回缺页次数、缺页率和每次访问是否缺页"""
+    if algorithm not in PAGING_ALGORITHMS:
+        raise ValueError(f"不支持的页面置换算法: {algorithm}")
+    if frames <= 0:
+        raise ValueError("页框数必须为正")
+    reference = np.asarray(reference, dtype=np.int64)
+    if reference.ndim != 1 or reference.size == 0:
+        raise ValueError("访问序列不能为空")
+
+    pages = reference.tolist()
+    if algorithm == "fifo":
+        faults = _fifo(pages, frames)
+    elif algorithm == "lru":
+        faults = _lru(pages, frames)
+    else:
+        faults = _opt(pages, frames, next_use(reference).tolist())
+
+    mask = np.asarray(faults, dtype=bool)
+    fault_count = int(mask.sum())
+    return {
+        "algorithm": algorithm,
+        "frames": frames,
+        "faults": fault_count,
+        "hits": int(reference.size - fault_count),
+        "fault_rate": round(fault_count / reference.size, 4),
+        "fault_positions": np.flatnonzero(mask).tolist(),
+    }
+
+
+def fault_curve(reference: Sequence[int], max_frames: int, algorithm: str = "fifo") -> List[int]:
+    """页框数为 1..max_frames 时的缺页次数（FIFO可以由此观察Belady异常）"""
+    return [simulate_paging(reference, frames, algorithm)["faults"] for frames in range(1, max_frames + 1)]
@@ -0,0 +1,82 @@
+"""
+服务端出题
+支持服务端校验的游戏在开始时由服务端生成题目参数并保存在会话中，
+结束时只按保存的题目校验玩家的 answer，客户端不能自己选择题目。难度决定题目规模。
+"""
+
+import random
+from typing import Dict, Any, Callable, Optional
+
+from simulation.disk import DISK_ALGORITHMS
+from simulation.paging import PAGING_ALGORITHMS
+from simulation.scheduling import SCHEDULING_ALGORITHMS
+
+# 难度 -> 规模增量
+LEVEL_SIZES = {"beginner": 0, "intermediate": 1, "advanced": 2}
+
+
+def _scheduling(rng: random.Random, size: int) -> Dict[str, Any]:
+    processes = []
+    arrival = 0
+    for i in range(4 + size):
+        processes.append({
+            "id": f"P{i + 1}",
+            "arrival": arrival,
+            "burst": rng.randint(1, 8 + 2 * size),
+            "priority": rng.randint(1, 5),
+        })
+        arrival += rng.randint(0, 3)
+    return {
+        "algorithm": rng.choice(SCHEDULING_ALGORITHMS),
+        "quantum": rng.randint(2, 4),
+        "processes": processes,
+    }
+
+
+def _paging(rng: random.Random, size: int) -> Dict[str, Any]:
+    pages = 5 + size
+    return {
+        "algorithm": rng.choice(PAGING_ALGORITHMS),
+        "frames": 3 + (size > 0),
+        "reference": [rng.randrange(pages) for _ in range(12 + 4 * size)],
+    }
+
+
+def _deadlock(rng: random.Random, size: int) -> Dict[str, Any]:
+    processes, resources = 4 + size, 3
+    maximum = [[rng.randint(1, 7 + size) for _ in range(resources)] for _ in range(processes)]
+    allocation = [[rng.randint(0, value // 2) for value in row] for row in maximum]
+    return {
+        "available": [rng.randint(1, 4) for _ in range(resources)],
+        "allocation": allocation,
+        "maximum": maximum,
+    }
+
+
+def _disk(rng: random.Random, size: int) -> Dict[str, Any]:
+    cylinders = 200
+    return {
+        "algorithm": rng.choice(DISK_ALGORITHMS),
+        "requests": rng.sample(range(cylinders), 8 + 2 * size),
+        "head": rng.randrange(cylinders),
+        "cylinders": cylinders,
+        "direction": rng.choice(("up", "down")),
+    }
+
+
+# 游戏类型 -> 出题函数，与 validation.VALIDATORS 的游戏类型一致
+GENERATORS: Dict[str, Callable[[random.Random, int], Dict[str, Any]]] = {
+    "process-scheduling": _scheduling,
+    "memory-management": _paging,
+    "deadlock": _deadlock,
+    "io-management": _disk,
+}
+
+
+def generate_problem(game_type: str, level: Optional[str] = "beginner",
+                     rng: Optional[random.Random] = None) -> Optional[Dict[str, Any]]:
+    """生成一道题目的参数，不支持服务端校验的游戏返回None"""
+    generator = GENERATORS.get(game_type)
+    if generator is None:
+        return None
+    return generator(rng or random.SystemRandom(), LEVEL_SIZES.get(level or "beginner", 0))
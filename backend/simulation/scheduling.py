@@ -0,0 +1,193 @@
+"""
+进程调度
+FCFS、SJF（非抢占）、优先级（非抢占，数值越小优先级越高）和时间片轮转。
+FCFS的开始时间可以由累加和一次算出；其余算法按时间推进，用堆选择下一个进程，
+等待时间、周转时间等统计量统一用数组计算。
+"""
+
+import heapq
+from collections import deque
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+SCHEDULING_ALGORITHMS = ("fcfs", "sjf", "priority", "rr")
+
+
+def _as_arrays(arrival: Sequence[int], burst: Sequence[int],
+               priority: Optional[Sequence[int]] = None):
+    arrival = np.asarray(arrival, dtype=np.int64)
+    burst = np.asarray(burst, dtype=np.int64)
+    if arrival.ndim != 1 or arrival.shape != burst.shape:
+        raise ValueError("到达时间与运行时间的数量必须一致")
+    if arrival.size == 0:
+        raise ValueError("至少需要一个进程")
+    if (arrival < 0).any() or (burst <= 0).any():
+        raise ValueError("到达时间不能为负，运行时间必须为正")
+    if priority is None:
+        priority = np.zeros_like(arrival)
+    else:
+        priority = np.asarray(priority, dtype=np.int64)
+        if priority.shape != arrival.shape:
+            raise ValueError("优先级的数量必须与进程数一致")
+    return arrival, burst, priority
+
+
+def _fcfs(arrival: np.ndarray, burst: np.ndarray):
+    """按到达顺序执行：第k个进程的开始时间 = 之前运行时间之和 + max(到达时间 - 之前运行时间之和)"""
+    order = np.argsort(arrival, kind="stable")
+    runs = burst[order]
+    before = np.cumsum(runs) - runs
+    starts = np.maximum.accumulate(arrival[order] - before) + before
+    return order, starts, starts + runs
+
+
+def _non_preemptive(arrival: np.ndarray, burst: np.ndarray, keys: np.ndarray):
+    """每次从已到达的进程中选择键最小的一个执行完毕（键相同时先到达、编号小的优先）"""
+    n = arrival.size
+    by_arrival = np.argsort(arrival, kind="stable").tolist()
+    arrival_list, burst_list, key_list = arrival.tolist(), burst.tolist(), keys.tolist()
+
+    order: List[int] = []
+    starts: List[int] = []
+    ready: list = []
+    now, next_arrival = 0, 0
+    while len(order) < n:
+        while next_arrival < n and arrival_list[by_arrival[next_arrival]] <= now:
+            index = by_arrival[next_arrival]
+            heapq.heappush(ready, (key_list[index], arrival_list[index], index))
+            next_arrival += 1
+        if not ready:
+            # CPU空闲，直接跳到下一个进程到达
+            now = arrival_list[by_arrival[next_arrival]]
+            continue
+        _, _, index = heapq.heappop(ready)
+        order.append(index)
+        starts.append(now)
+        now += burst_list[index]
+
+    order = np.asarray(order, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    return order, starts, starts + burst[order]
+
+
+def _round_robin(arrival: np.ndarray, burst: np.ndarray, quantum: int):
+    """时间片轮转：时间片内到达的进程排在被抢占的进程之前"""
+    if quantum <= 0:
+        raise ValueError("时间片必须为正")
+    n = arrival.size
+    by_arrival = np.argsort(arrival, kind="stable").tolist()
+    arrival_list = arrival.tolist()
+    remaining = burst.tolist()
+
+    segments: List[tuple] = []
+    completion = [0] * n
+    first_start = [-1] * n
+    queue: deque = deque()
+    now, next_arrival, done = 0, 0, 0
+
+    def admit(until: int):
+        nonlocal next_arrival
+        while next_arrival < n and arrival_list[by_arrival[next_arrival]] <= until:
+            queue.append(by_arrival[next_arrival])
+            next_arrival += 1
+
+    while done < n:
+        admit(now)
+        if not queue:
+            now = arrival_list[by_arrival[next_arrival]]
+            continue
+        index = queue.popleft()
+        run = min(quantum, remaining[index])
+        if first_start[index] < 0:
+            first_start[index] = now
+        segments.append((index, now, now + run))
+        now += run
+        remaining[index] -= run
+        admit(now)
+        if remaining[index]:
+            queue.append(index)
+        else:
+            completion[index] = now
+            done += 1
+
+    return segments, np.asarray(first_start, dtype=np.int64), np.asarray(completion, dtype=np.int64)
+
+
+def schedule(arrival: Sequence[int], burst: Sequence[int], algorithm: str = "fcfs",
+             priority: Optional[Sequence[int]] = None, quantum: int = 2,
+             ids: Optional[Sequence[str]] = None, detail: bool = True) -> Dict[str, Any]:
+    """
+    模拟一次调度
+
+    Args:
+        detail: 是否返回执行片段和每个进程的指标（大规模输入时构造这些列表是主要开销）
+
+    Returns:
+        完成顺序和平均的等待、周转、响应时间，detail 时包括执行片段和每个进程的指标
+    """
+    if algorithm not in SCHEDULING_ALGORITHMS:
+        raise ValueError(f"不支持的调度算法: {algorithm}")
+    arrival, burst, priority = _as_arrays(arrival, burst, priority)
+    ids = list(ids) if ids is not None else [f"P{i + 1}" for i in range(arrival.size)]
+    if len(ids) != arrival.size:
+        raise ValueError("进程编号的数量必须与进程数一致")
+
+    if algorithm == "rr":
+        segments, first_start, completion = _round_robin(arrival, burst, quantum)
+        finish_order = np.argsort(completion, kind="stable")
+    else:
+        if algorithm == "fcfs":
+            order, starts, ends = _fcfs(arrival, burst)
+        else:
+            keys = burst if algorithm == "sjf" else priority
+            order, starts, ends = _non_preemptive(arrival, burst, keys)
+        # 非抢占算法每个进程只有一个执行片段
+        segments = None
+        first_start = np.empty_like(arrival)
+        first_start[order] = starts
+        completion = np.empty_like(arrival)
+        completion[order] = ends
+        finish_order = order
+
+    turnaround = completion - arrival
+    waiting = turnaround - burst
+    response = first_start - arrival
+    makespan = int(completion.max() - arrival.min())
+    result = {
+        "algorithm": algorithm,
+        "order": [ids[i] for i in finish_order.tolist()],
+        "avg_waiting": round(float(waiting.mean()), 4),
+        "avg_turnaround": round(float(turnaround.mean()), 4),
+        "avg_response": round(float(response.mean()), 4),
+        "makespan": makespan,
+        "cpu_utilization": round(float(burst.sum()) / makespan, 4) if makespan else 1.0,
+    }
+    if detail:
+        if segments is None:
+            segments = zip(order.tolist(), starts.tolist(), ends.tolist())
+        result["segments"] = [{"id": ids[i], "start": start, "end": end} for i, start, end in segments]
+        result["processes"] = [
+            {"id": ids[i], "completion": c, "turnaround": t, "waiting": w, "response": r}
+            for i, (c, t, w, r) in enumerate(zip(completion.tolist(), turnaround.tolist(),
+                                                 waiting.tolist(), response.tolist()))
+        ]
+    return result
+
+
+def compare_schedules(arrival: Sequence[int], burst: Sequence[int],
+                      priority: Optional[Sequence[int]] = None, quantum: int = 2,
+                      ids: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """用所有算法调度同一组进程，返回各算法的平均指标和平均等待时间最短的算法"""
+    results = {
+        algorithm: schedule(arrival, burst, algorithm, priority, quantum, ids, detail=False)
+        for algorithm in SCHEDULING_ALGORITHMS
+    }
+    summary = {
+        algorithm: {key: result[key] for key in ("avg_waiting", "avg_turnaround", "avg_response")}
+        for algorithm, result in results.items()
+    }
+    return {
+        "algorithms": summary,
+        "best": min(summary, key=lambda algorithm: summary[algorithm]["avg_waiting"]),
+    }
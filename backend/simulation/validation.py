@@ -0,0 +1,160 @@
+"""
+提交答案校验
+服务端用模拟引擎计算题目的标准答案，逐项比对 answer 中提交的字段，按正确的比例给出分数和星级。
+计分时题目取开始游戏时服务端生成并保存的参数（见 problems.py），submission 中只使用 answer；
+练习时可以不传 problem，直接使用 submission 中的题目参数。
+"""
+
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from simulation.banker import check_safety, is_safe_sequence, request_resources
+from simulation.disk import schedule_disk
+from simulation.paging import simulate_paging
+from simulation.scheduling import schedule
+
+# 平均时间等浮点答案的允许误差
+TOLERANCE = 0.01
+
+
+class SubmissionError(ValueError):
+    """提交的题目参数或答案无法校验"""
+
+
+Checks = List[Tuple[str, bool]]
+
+
+def _close(value: Any, expected: float) -> bool:
+    try:
+        return abs(float(value) - expected) <= TOLERANCE
+    except (TypeError, ValueError):
+        return False
+
+
+def _validate_scheduling(submission: Dict[str, Any], answer: Dict[str, Any]) -> Tuple[Dict[str, Any], Checks]:
+    processes = submission.get("processes") or []
+    expected = schedule(
+        arrival=[p.get("arrival", 0) for p in processes],
+        burst=[p.get("burst") for p in processes],
+        algorithm=submission.get("algorithm", "fcfs"),
+        priority=[p.get("priority", 0) for p in processes],
+        quantum=submission.get("quantum", 2),
+        ids=[str(p.get("id", f"P{i + 1}")) for i, p in enumerate(processes)],
+        detail=False,
+    )
+    checks = []
+    if "order" in answer:
+        checks.append(("order", [str(item) for item in answer["order"]] == expected["order"]))
+    for key in ("avg_waiting", "avg_turnaround", "avg_response"):
+        if key in answer:
+            checks.append((key, _close(answer[key], expected[key])))
+    return expected, checks
+
+
+def _validate_paging(submission: Dict[str, Any], answer: Dict[str, Any]) -> Tuple[Dict[str, Any], Checks]:
+    expected = simulate_paging(
+        submission.get("reference") or [],
+        submission.get("frames", 3),
+        submission.get("algorithm", "lru"),
+    )
+    checks = []
+    for key in ("faults", "hits"):
+        if key in answer:
+            checks.append((key, answer[key] == expected[key]))
+    if "fault_positions" in answer:
+        checks.append(("fault_positions", list(answer["fault_positions"]) == expected["fault_positions"]))
+    return expected, checks
+
+
+def _validate_deadlock(submission: Dict[str, Any], answer: Dict[str, Any]) -> Tuple[Dict[str, Any], Checks]:
+    available = submission.get("available") or []
+    allocation = submission.get("allocation") or []
+    maximum = submission.get("maximum") or []
+    expected = check_safety(available, allocation, maximum)
+    checks = []
+    if "safe" in answer:
+        checks.append(("safe", bool(answer["safe"]) == expected["safe"]))
+    if "sequence" in answer:
+        # 安全序列不唯一，只要按该顺序执行安全即可
+        checks.append(("sequence", bool(
+            expected["safe"] and answer["sequence"] is not None
+            and is_safe_sequence(available, allocation, maximum, answer["sequence"])
+        )))
+    request = submission.get("request")
+    if request is not None:
+        expected["request"] = request_resources(
+            available, allocation, maximum, request.get("process", 0), request.get("resources") or []
+        )
+        if "granted" in answer:
+            checks.append(("granted", bool(answer["granted"]) == expected["request"]["granted"]))
+    return expected, checks
+
+
+def _validate_disk(submission: Dict[str, Any], answer: Dict[str, Any]) -> Tuple[Dict[str, Any], Checks]:
+    expected = schedule_disk(
+        submission.get("requests") or [],
+        submission.get("head", 0),
+        submission.get("algorithm", "fcfs"),
+        submission.get("cylinders", 200),
+        submission.get("direction", "up"),
+    )
+    checks = []
+    if "order" in answer:
+        checks.append(("order", list(answer["order"]) == expected["order"]))
+    if "total_seek" in answer:
+        checks.append(("total_seek", answer["total_seek"] == expected["total_seek"]))
+    return expected, checks
+
+
+# 游戏类型 -> 校验函数
+VALIDATORS: Dict[str, Callable] = {
+    "process-scheduling": _validate_scheduling,
+    "memory-management": _validate_paging,
+    "deadlock": _validate_deadlock,
+    "io-management": _validate_disk,
+}
+VALIDATED_GAMES = tuple(VALIDATORS)
+
+
+def _stars(score: int) -> int:
+    if score >= 100:
+        return 3
+    if score >= 60:
+        return 2
+    return 1 if score > 0 else 0
+
+
+def validate_submission(game_type: str, submission: Dict[str, Any],
+                        problem: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    校验一次提交
+
+    Args:
+        game_type: 游戏类型
+        submission: 包含 answer；没有 problem 时同时包含题目参数
+        problem: 服务端保存的题目参数，提供时忽略 submission 中的题目参数
+
+    Returns:
+        各项是否正确、标准答案，以及据此计算的分数（0-100）和星级（0-3）
+    """
+    validator = VALIDATORS.get(game_type)
+    if validator is None:
+        raise SubmissionError(f"游戏 {game_type} 不支持服务端校验")
+    answer = submission.get("answer")
+    if not isinstance(answer, dict):
+        raise SubmissionError("缺少 answer")
+    try:
+        expected, checks = validator(submission if problem is None else problem, answer)
+    except (TypeError, ValueError, AttributeError) as e:
+        raise SubmissionError(f"提交的题目参数格式错误: {e}")
+    if not checks:
+        raise SubmissionError("answer 中没有可校验的字段")
+
+    passed = sum(1 for _, correct in checks if correct)
+    score = round(passed / len(checks) * 100)
+    return {
+        "game_type": game_type,
+        "checks": dict(checks),
+        "expected": expected,
+        "score": score,
+        "stars": _stars(score),
+    }
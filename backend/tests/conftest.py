@@ -0,0 +1,38 @@
+"""
+测试公共配置
+导入应用模块前把数据库、共享状态、AI缓存和归档目录指向临时目录，不影响本地数据。
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TMPDIR = tempfile.mkdtemp(prefix="os_village_test_")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TMPDIR, 'test.db')}",
+    "SHARED_STATE_BACKEND": "memory",
+    "SHARED_STATE_PATH": os.path.join(_TMPDIR, "shared_state.db"),
+    "AI_CACHE_BACKEND": "none",
+    "AI_CACHE_PATH": os.path.join(_TMPDIR, "ai_cache.db"),
+    "ACTION_LOG_ARCHIVE_DIR": os.path.join(_TMPDIR, "archive"),
+    "ACTION_LOG_COMPACT_INTERVAL": "0",
+})
+
+import pytest
+
+from models.database import init_db
+
+init_db()
+
+
+@pytest.fixture
+def client():
+    """进程内运行应用（含启动和关闭事件）"""
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as test_client:
+        yield test_client
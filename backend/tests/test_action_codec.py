@@ -0,0 +1,113 @@
+"""
+操作数据紧凑编码
+"""
+
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from models.database import SessionLocal, ActionLog
+from models.migrations import encode_action_payloads
+from services.action_queue import action_queue
+from utils import action_codec as codec_module
+from utils.action_codec import ActionCodec, action_codec
+
+ROUND_TRIPS = [
+    ("process-scheduling", "select", {"x": 10, "y": -3, "process": "P1", "algorithm": "rr", "time": 4}),
+    ("memory-management", "access", {"page": 3, "hit": False, "algorithm": "lru", "note": "第二次"}),
+    ("deadlock", "request", {"process": 1, "resource": 2, "amount": 1 << 40, "granted": True}),
+    # 类型不符、不在结构中和 None 的字段进入其余字段
+    ("io-management", "seek", {"cylinder": "98", "head": None, "extra": [1, 2.5, {"a": None}]}),
+    (None, "click", {"x": 1.5, "y": 2, "target": "村口"}),
+    (None, "error", {"error_type": "wrong_order", "expected": "P1,P2", "actual": "P2,P1"}),
+    (None, "custom", {"anything": "goes", "nested": {"list": [True, False]}}),
+    (None, "custom", ["not", "a", "dict"]),
+    (None, "custom", "plain string"),
+    # JSON允许的单独代理字符
+    (None, "click", {"x": 1, "target": "\ud800"}),
+    (None, "custom", {"text": "a\udfffb", "list": ["\ud83d"]}),
+    (None, "custom", {"long": "\ud800" * 200 + "压缩" * 200}),
+]
+
+
+@pytest.mark.parametrize("game_type, action_type, data", ROUND_TRIPS)
+@pytest.mark.parametrize("use_msgpack", [True, False])
+def test_round_trip(monkeypatch, game_type, action_type, data, use_msgpack):
+    if not use_msgpack:
+        monkeypatch.setattr(codec_module, "msgpack", None)
+    codec = ActionCodec(compress_min=64)
+    assert codec.decode(codec.encode(game_type, action_type, data)) == data
+
+
+def test_none_is_stored_as_null():
+    assert action_codec.encode(None, "click", None) is None
+    assert action_codec.decode(None) is None
+
+
+def test_encode_rows_falls_back_per_row(monkeypatch):
+    codec = ActionCodec()
+    original = codec.encode
+
+    def encode(game_type, action_type, data):
+        if data.get("bad"):
+            raise ValueError("无法编码")
+        return original(game_type, action_type, data)
+
+    monkeypatch.setattr(codec, "encode", encode)
+    rows = codec.encode_rows([
+        {"session_id": "s", "action_type": "click", "action_data": {"bad": True}},
+        {"session_id": "s", "action_type": "click", "action_data": {"x": 1}},
+    ])
+    assert rows[0]["raw_data"] == {"bad": True} and rows[0]["payload"] is None
+    assert rows[1]["raw_data"] is None and codec.decode(rows[1]["payload"]) == {"x": 1}
+
+
+def test_lone_surrogate_does_not_drop_the_batch(client):
+    session_id = client.post("/api/game/start", json={"player_id": "p-codec", "game_type": "process-sync"}).json()[
+        "session_id"]
+    # 请求体中的 \ud800 是合法JSON
+    bad = '{"session_id": "%s", "action_type": "click", "action_data": {"target": "\\ud800"}}' % session_id
+    assert client.post("/api/game/action", content=bad,
+                       headers={"Content-Type": "application/json"}).status_code == 200
+    client.post("/api/game/action", json={"session_id": session_id, "action_type": "click",
+                                          "action_data": {"target": "ok"}})
+
+    deadline = time.monotonic() + 5
+    while True:
+        action_queue.flush()
+        db = SessionLocal()
+        try:
+            rows = db.query(ActionLog).filter(ActionLog.session_id == session_id).order_by(ActionLog.id).all()
+            data = [row.action_data for row in rows]
+        finally:
+            db.close()
+        if len(data) == 2 or time.monotonic() > deadline:
+            break
+        time.sleep(0.02)
+    # 后台线程和 flush 可能分两批写入，不比较顺序
+    assert sorted(data, key=lambda value: value["target"]) == [{"target": "ok"}, {"target": "\ud800"}]
+
+
+def test_migration_encodes_existing_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    originals = [data for _, _, data in ROUND_TRIPS]
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE game_sessions (session_id VARCHAR(50), game_type VARCHAR(50))"))
+        conn.execute(text("CREATE TABLE action_logs (id INTEGER PRIMARY KEY, session_id VARCHAR(50), "
+                          "action_type VARCHAR(50), action_data JSON, payload BLOB)"))
+        for index, (game_type, action_type, data) in enumerate(ROUND_TRIPS):
+            conn.execute(text("INSERT INTO game_sessions VALUES (:session_id, :game_type)"),
+                         {"session_id": f"s{index}", "game_type": game_type})
+            # 旧数据由SQLAlchemy的JSON类型写入（ensure_ascii）
+            conn.execute(text("INSERT INTO action_logs (session_id, action_type, action_data) "
+                              "VALUES (:session_id, :action_type, :data)"),
+                         {"session_id": f"s{index}", "action_type": action_type, "data": json.dumps(data)})
+
+    with engine.begin() as conn:
+        assert encode_action_payloads(conn, batch_size=5) == len(ROUND_TRIPS)
+    with engine.begin() as conn:
+        rows = conn.execute(text("SELECT action_data, payload FROM action_logs ORDER BY id")).fetchall()
+    assert all(data is None for data, _ in rows)
+    assert [action_codec.decode(payload) for _, payload in rows] == originals
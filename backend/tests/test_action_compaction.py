@@ -0,0 +1,55 @@
+"""
+操作日志压缩与归档
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from models.database import SessionLocal, ActionLog, ActionSummary
+from services.action_compaction import ActionLogCompactor, archive_path, iter_archive, list_archives
+from services.action_queue import action_queue
+from services.game_service import GameService
+
+
+def _live_count(session_id):
+    db = SessionLocal()
+    try:
+        return db.query(ActionLog).filter(ActionLog.session_id == session_id).count()
+    finally:
+        db.close()
+
+
+def _ended_session(player_id, *actions):
+    session_id = GameService._start_game(player_id, "process-sync")["session_id"]
+    for action_data in actions:
+        action_queue.put(session_id, "click", action_data, "process-sync")
+    # 后台线程可能已经取出一部分，等全部落库后再结束会话
+    deadline = time.monotonic() + 5
+    while _live_count(session_id) < len(actions) and time.monotonic() < deadline:
+        action_queue.flush()
+        time.sleep(0.02)
+    GameService._end_game(session_id, score=50, stars=1, completed=True)
+    return session_id
+
+
+def _archived(archive_dir, session_id):
+    return [row for month in list_archives(archive_dir)
+            for row in iter_archive(archive_path(archive_dir, month)) if row["session_id"] == session_id]
+
+
+def test_lone_surrogate_is_archived(tmp_path):
+    # 编码器用 surrogatepass 接受的数据，归档时也不能让整批压缩失败
+    session_id = _ended_session("p-compact", {"target": "\ud800"}, {"target": "ok"})
+    compactor = ActionLogCompactor(archive_dir=str(tmp_path), settle_minutes=0, interval=0)
+    result = compactor.run_once(now=datetime.utcnow() + timedelta(minutes=1))
+    assert result["rows"] >= 2
+
+    assert _live_count(session_id) == 0
+    db = SessionLocal()
+    try:
+        summary = db.query(ActionSummary).filter(ActionSummary.session_id == session_id).one()
+        assert summary.action_count == 2
+    finally:
+        db.close()
+    archived = [row["action_data"] for row in _archived(str(tmp_path), session_id)]
+    assert sorted(archived, key=lambda value: value["target"]) == [{"target": "ok"}, {"target": "\ud800"}]
@@ -0,0 +1,97 @@
+"""
+操作日志写缓冲队列
+"""
+
+from datetime import datetime
+
+import pytest
+
+from models.database import SessionLocal, ErrorRecord
+from services.action_queue import ActionWriteQueue, ActionQueueFull, insert_actions
+from services.ai_service import AIService
+from services.game_service import GameService
+
+
+def _rows(count, session_id="s1"):
+    return [{"session_id": session_id, "action_type": "click", "action_data": {"i": i}}
+            for i in range(count)]
+
+
+@pytest.fixture
+def write_queue():
+    # 不启动后台线程，队列内容保持可见
+    queue = ActionWriteQueue(max_size=5, batch_size=100, flush_interval=0.01)
+    queue._thread = object()
+    return queue
+
+
+def test_put_many_is_all_or_nothing(write_queue):
+    write_queue.put_many(_rows(3))
+    with pytest.raises(ActionQueueFull):
+        write_queue.put_many(_rows(3))
+
+    stats = write_queue.stats()
+    assert stats["depth"] == 3
+    assert stats["enqueued"] == 3
+    assert stats["rejected"] == 3
+
+    # 剩余空间刚好够时整批放入
+    write_queue.put_many(_rows(2))
+    assert write_queue.stats()["depth"] == 5
+
+
+def test_put_many_does_not_mutate_caller_rows(write_queue):
+    rows = _rows(2)
+    write_queue.put_many(rows)
+    assert all("timestamp" not in row for row in rows)
+
+    batch = write_queue._drain(block=False)
+    assert [row["action_data"] for row in batch] == [{"i": 0}, {"i": 1}]
+    assert all(row["timestamp"] is not None for row in batch)
+
+
+def _errors(session_id):
+    db = SessionLocal()
+    try:
+        return {record.error_type: (record.count, record.error_context) for record in
+                db.query(ErrorRecord).filter(ErrorRecord.session_id == session_id)}
+    finally:
+        db.close()
+
+
+def _insert(rows):
+    db = SessionLocal()
+    try:
+        insert_actions(db, rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _error(session_id, **action_data):
+    return {"session_id": session_id, "action_type": "error", "action_data": action_data,
+            "timestamp": datetime.utcnow()}
+
+
+def test_error_actions_accumulate_per_session_and_type():
+    session_id = GameService._start_game("p-errors", "process-sync")["session_id"]
+    _insert([
+        _error(session_id, error_type="deadlock", step=1),
+        _error(session_id, error_type="deadlock", step=2),
+        _error(session_id, type="starvation"),
+        _error(session_id),
+        {"session_id": session_id, "action_type": "click", "action_data": {"error_type": "deadlock"},
+         "timestamp": datetime.utcnow()},
+    ])
+    # 之后的批次在已有的行上累加，保留最近一次的上下文
+    _insert([_error(session_id, error_type="deadlock", step=3)])
+
+    assert _errors(session_id) == {
+        "deadlock": (3, {"error_type": "deadlock", "step": 3}),
+        "starvation": (1, {"type": "starvation"}),
+        "unknown": (1, {}),
+    }
+
+    data = AIService._load_session_data(session_id)
+    assert data["error_count"] == 5
+    assert data["error_types"].startswith("deadlock、")
@@ -0,0 +1,113 @@
+"""
+分析数据导出：增量水位线
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from models.database import SessionLocal, ActionLog, ErrorRecord
+from services.action_compaction import ActionLogCompactor
+from services.action_queue import action_queue
+from services.analytics_export import AnalyticsExporter
+from services.game_service import GameService
+
+
+def _exported(output_dir, table, session_id):
+    directory = output_dir / table
+    if not directory.exists():
+        return []
+    rows = pq.read_table(str(directory)).to_pylist()
+    return [row for row in rows if row["session_id"] == session_id]
+
+
+def _action_count(session_id):
+    db = SessionLocal()
+    try:
+        return db.query(ActionLog).filter(ActionLog.session_id == session_id).count()
+    finally:
+        db.close()
+
+
+def _set_error_count(session_id, count):
+    db = SessionLocal()
+    try:
+        record = db.query(ErrorRecord).filter(ErrorRecord.session_id == session_id).first()
+        if record is None:
+            db.add(ErrorRecord(session_id=session_id, error_type="wrong_order", count=count))
+        else:
+            record.count = count
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_mutable_tables_are_exported_after_the_session_ends(tmp_path):
+    session_id = GameService._start_game("p-export", "process-sync")["session_id"]
+    _set_error_count(session_id, 1)
+
+    first = AnalyticsExporter(str(tmp_path / "first"), settle_minutes=0)
+    first.export(("game_sessions", "errors"))
+    # 进行中的会话还会被修改，不导出
+    assert _exported(tmp_path / "first", "game_sessions", session_id) == []
+    assert _exported(tmp_path / "first", "errors", session_id) == []
+
+    _set_error_count(session_id, 3)
+    GameService._end_game(session_id, score=70, stars=2, completed=True)
+
+    second = AnalyticsExporter(str(tmp_path / "first"), settle_minutes=0)
+    second.export(("game_sessions", "errors"))
+    [session] = _exported(tmp_path / "first", "game_sessions", session_id)
+    assert (session["score"], session["stars"], session["completed"]) == (70, 2, True)
+    assert session["end_time"] is not None
+    [error] = _exported(tmp_path / "first", "errors", session_id)
+    assert error["count"] == 3
+
+    # 没有新结束的会话时不再重复导出
+    results = AnalyticsExporter(str(tmp_path / "first"), settle_minutes=0).export(("game_sessions", "errors"))
+    assert results["game_sessions"]["rows"] == 0
+    assert results["errors"]["rows"] == 0
+
+
+def test_sessions_inside_settle_window_wait_for_next_run(tmp_path):
+    session_id = GameService._start_game("p-export-settle", "process-sync")["session_id"]
+    GameService._end_game(session_id, score=50, stars=1, completed=False)
+
+    AnalyticsExporter(str(tmp_path), settle_minutes=10).export(("game_sessions",))
+    assert _exported(tmp_path, "game_sessions", session_id) == []
+    AnalyticsExporter(str(tmp_path), settle_minutes=0).export(("game_sessions",))
+    assert len(_exported(tmp_path, "game_sessions", session_id)) == 1
+
+
+def test_lone_surrogate_survives_queue_compaction_and_export(tmp_path):
+    session_id = GameService._start_game("p-export-surrogate", "process-sync")["session_id"]
+    action_queue.put(session_id, "click", {"target": "\ud800"}, "process-sync")
+    action_queue.put(session_id, "error", {"error_type": "\ud800"}, "process-sync")
+    deadline = time.monotonic() + 5
+    while _action_count(session_id) < 2 and time.monotonic() < deadline:
+        action_queue.flush()
+        time.sleep(0.02)
+    GameService._end_game(session_id, score=50, stars=1, completed=True)
+
+    def exported_data(output_dir, archive_dir=None):
+        AnalyticsExporter(str(output_dir), archive_dir=archive_dir, settle_minutes=0).export(("action_logs",))
+        rows = _exported(output_dir, "action_logs", session_id)
+        return [json.loads(row["action_data"]) for row in sorted(rows, key=lambda row: row["action_type"])]
+
+    # 在线表；错误类型列中的代理字符替换为 ?
+    assert exported_data(tmp_path / "live") == [{"target": "\ud800"}, {"error_type": "\ud800"}]
+    AnalyticsExporter(str(tmp_path / "live"), settle_minutes=0).export(("errors",))
+    [error] = _exported(tmp_path / "live", "errors", session_id)
+    assert error["error_type"] == "?"
+    assert json.loads(error["error_context"]) == {"error_type": "\ud800"}
+
+    # 压缩归档后从归档文件导出
+    archive_dir = str(tmp_path / "archive")
+    ActionLogCompactor(archive_dir=archive_dir, settle_minutes=0, interval=0).run_once(
+        now=datetime.utcnow() + timedelta(minutes=1))
+    assert exported_data(tmp_path / "archived", archive_dir) == [{"target": "\ud800"}, {"error_type": "\ud800"}]
@@ -0,0 +1,133 @@
+"""
+记录游戏操作：客户端时间
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from models.database import SessionLocal, ActionLog, GameSession
+from services.action_queue import action_queue
+from services.game_service import action_time
+
+
+def _start(client, game_type="deadlock"):
+    response = client.post("/api/game/start", json={"player_id": "p-actions", "game_type": game_type})
+    assert response.status_code == 200
+    return response.json()["session_id"]
+
+
+def _timestamps(session_id, count):
+    """等待后台线程写入 count 条操作"""
+    deadline = time.monotonic() + 5
+    while True:
+        action_queue.flush()
+        db = SessionLocal()
+        try:
+            rows = db.query(ActionLog).filter(ActionLog.session_id == session_id).order_by(ActionLog.id).all()
+        finally:
+            db.close()
+        if len(rows) >= count or time.monotonic() > deadline:
+            return [(row.action_data["i"], row.timestamp) for row in rows]
+        time.sleep(0.02)
+
+
+def test_action_time_clamps_to_session_and_server_clock():
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    now = datetime(2026, 1, 1, 12, 10, 0)
+    inside = datetime(2026, 1, 1, 12, 5, 0)
+    assert action_time(None, start, now) == now
+    assert action_time(inside, start, now) == inside
+    assert action_time(now + timedelta(hours=1), start, now) == now
+    assert action_time(start - timedelta(days=1), start, now) == start
+    # 带时区的客户端时间转为UTC
+    assert action_time(datetime(2026, 1, 1, 20, 5, tzinfo=timezone(timedelta(hours=8))), start, now) == inside
+
+
+def test_batch_keeps_client_timestamps(client):
+    session_id = _start(client)
+    time.sleep(0.5)
+    base = datetime.now(timezone.utc) - timedelta(seconds=0.4)
+    actions = [{
+        "session_id": session_id, "action_type": "click", "action_data": {"i": i},
+        "timestamp": (base + timedelta(milliseconds=100 * i)).isoformat(),
+    } for i in range(3)]
+    actions.append({"session_id": session_id, "action_type": "click", "action_data": {"i": 3},
+                    "timestamp": (base + timedelta(days=1)).isoformat()})
+    response = client.post("/api/game/actions/batch", json={"actions": actions})
+    assert response.json()["accepted"] == 4
+
+    rows = _timestamps(session_id, 4)
+    naive = base.replace(tzinfo=None)
+    assert [ts for _, ts in rows[:3]] == [naive + timedelta(milliseconds=100 * i) for i in range(3)]
+    # 晚于服务器时间的截断为写入时刻
+    assert rows[3][1] <= datetime.utcnow()
+
+
+def test_websocket_action_uses_client_time(client):
+    session_id = _start(client)
+    time.sleep(0.5)
+    client_ms = int(time.time() * 1000) - 400
+    with client.websocket_connect(f"/api/game/ws/{session_id}") as ws:
+        assert ws.receive_json()[0] == "w"
+        ws.send_json(["a", 1, "click", {"i": 0}, client_ms])
+        ws.send_json(["a", 2, "click", {"i": 1}, "not-a-time"])
+        assert ws.receive_json() == ["x", 2, 400, "操作格式错误"]
+        assert ws.receive_json() == ["k", 1]
+
+    [(_, timestamp)] = _timestamps(session_id, 1)
+    expected = datetime.fromtimestamp(client_ms / 1000, timezone.utc).replace(tzinfo=None)
+    assert abs((timestamp - expected).total_seconds()) < 0.01
+
+
+def _count(session_id):
+    db = SessionLocal()
+    try:
+        return db.query(ActionLog).filter(ActionLog.session_id == session_id).count()
+    finally:
+        db.close()
+
+
+def test_batch_reports_rejected_actions(client):
+    live, ended = _start(client), _start(client)
+    client.post("/api/game/end", json={"session_id": ended, "score": 0, "stars": 0, "completed": False,
+                                       "submission": {"answer": {"safe": True}}})
+    actions = [{"session_id": session_id, "action_type": "click", "action_data": {"i": i}}
+               for i, session_id in enumerate([live, "missing-session", ended, live])]
+    result = client.post("/api/game/actions/batch", json={"actions": actions}).json()
+    assert (result["accepted"], result["rejected"]) == (2, [1, 2])
+    assert len(_timestamps(live, 2)) == 2
+
+
+def _end_elsewhere(session_id):
+    """模拟另一个worker结束会话：只改数据库，本进程的登记表仍认为会话进行中"""
+    db = SessionLocal()
+    try:
+        db.query(GameSession).filter(GameSession.session_id == session_id).update(
+            {"end_time": datetime.utcnow() - timedelta(seconds=1)}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_actions_for_sessions_ended_in_another_worker_are_dropped(client, monkeypatch):
+    monkeypatch.setattr(action_queue, "check_ended", True)
+    session_id = _start(client)
+    _end_elsewhere(session_id)
+
+    result = client.post("/api/game/actions/batch", json={"actions": [
+        {"session_id": session_id, "action_type": "click", "action_data": {"i": 0}},
+    ]}).json()
+    assert result["rejected"] == [0]
+
+    dropped = action_queue.stats()["dropped_ended"]
+    assert client.post("/api/game/action", json={
+        "session_id": session_id, "action_type": "click", "action_data": {"i": 1},
+    }).status_code == 200
+    # 后台线程可能已经取走这条操作，等待写入完成
+    deadline = time.monotonic() + 5
+    while action_queue.stats()["dropped_ended"] == dropped and time.monotonic() < deadline:
+        action_queue.flush()
+        time.sleep(0.02)
+    assert action_queue.stats()["dropped_ended"] == dropped + 1
+    assert _count(session_id) == 0
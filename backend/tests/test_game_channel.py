@@ -0,0 +1,106 @@
+"""
+游戏会话WebSocket通道：确认、断线续传、心跳与结束游戏
+"""
+
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from models.database import SessionLocal, ActionLog
+from services.action_queue import action_queue
+from services.game_channel import game_channels, CLOSE_IDLE, CLOSE_SESSION_NOT_FOUND
+
+
+@pytest.fixture
+def channel_options(monkeypatch):
+    # 每条操作立即入队，默认不触发心跳超时
+    monkeypatch.setattr(game_channels, "batch_size", 1)
+    monkeypatch.setattr(game_channels, "heartbeat", 15.0)
+    return game_channels
+
+
+def _start(client, player_id):
+    return client.post("/api/game/start", json={"player_id": player_id, "game_type": "process-sync"}).json()[
+        "session_id"]
+
+
+def _logged_targets(session_id, expected):
+    deadline = time.monotonic() + 5
+    while True:
+        action_queue.flush()
+        db = SessionLocal()
+        try:
+            rows = db.query(ActionLog).filter(ActionLog.session_id == session_id).all()
+            targets = sorted(row.action_data["target"] for row in rows)
+        finally:
+            db.close()
+        if len(targets) >= expected or time.monotonic() > deadline:
+            return targets
+        time.sleep(0.02)
+
+
+def test_actions_are_acked_and_resent_actions_are_not_written_twice(client, channel_options):
+    session_id = _start(client, "p-ws-resume")
+    with client.websocket_connect(f"/api/game/ws/{session_id}") as ws:
+        assert ws.receive_json() == ["w", 0, 15.0]
+        ws.send_json(["p"])
+        assert ws.receive_json() == ["p"]
+        for seq in (1, 2):
+            ws.send_json(["a", seq, "click", {"target": f"t{seq}"}])
+            assert ws.receive_json() == ["k", seq]
+        ws.send_text("not json")
+        assert ws.receive_json() == ["x", 0, 400, "消息格式错误"]
+
+    # 重连后从已确认的位置继续，重发的操作只确认不写入
+    with client.websocket_connect(f"/api/game/ws/{session_id}") as ws:
+        assert ws.receive_json() == ["w", 2, 15.0]
+        ws.send_json(["a", 2, "click", {"target": "t2"}])
+        assert ws.receive_json() == ["k", 2]
+        ws.send_json(["a", 3, "click", {"target": "t3"}])
+        assert ws.receive_json() == ["k", 3]
+
+    assert _logged_targets(session_id, 3) == ["t1", "t2", "t3"]
+    assert client.get("/api/game/channel/stats").json()["duplicate_actions"] >= 1
+
+
+def test_pending_actions_are_flushed_before_a_partial_batch_times_out(client, channel_options, monkeypatch):
+    monkeypatch.setattr(game_channels, "batch_size", 10)
+    monkeypatch.setattr(game_channels, "flush_interval", 0.05)
+    session_id = _start(client, "p-ws-batch")
+    with client.websocket_connect(f"/api/game/ws/{session_id}") as ws:
+        ws.receive_json()
+        for seq in (1, 2, 3):
+            ws.send_json(["a", seq, "click", {"target": f"t{seq}"}])
+        # 不足一批时等待 flush_interval 后一次确认
+        assert ws.receive_json() == ["k", 3]
+    assert _logged_targets(session_id, 3) == ["t1", "t2", "t3"]
+
+
+def test_end_over_channel_closes_the_session(client, channel_options):
+    session_id = _start(client, "p-ws-end")
+    with client.websocket_connect(f"/api/game/ws/{session_id}") as ws:
+        ws.receive_json()
+        ws.send_json(["a", 1, "click", {"target": "t1"}])
+        assert ws.receive_json() == ["k", 1]
+        ws.send_json(["e", 2, 80, 2, True])
+        assert ws.receive_json() == ["e", 2, 80, 2, False]
+        ws.send_json(["a", 3, "click", {"target": "late"}])
+        assert ws.receive_json() == ["x", 3, 409, "游戏会话已结束"]
+
+    # 已结束的会话不再接受连接
+    with client.websocket_connect(f"/api/game/ws/{session_id}") as ws:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == CLOSE_SESSION_NOT_FOUND
+    assert _logged_targets(session_id, 1) == ["t1"]
+
+
+def test_idle_connection_is_closed_after_two_heartbeats(client, channel_options, monkeypatch):
+    monkeypatch.setattr(game_channels, "heartbeat", 0.05)
+    session_id = _start(client, "p-ws-idle")
+    with client.websocket_connect(f"/api/game/ws/{session_id}") as ws:
+        assert ws.receive_json() == ["w", 0, 0.05]
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == CLOSE_IDLE
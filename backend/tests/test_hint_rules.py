@@ -0,0 +1,86 @@
+"""
+规则提示
+"""
+
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from services.hint_rules import HintRule, HintRuleEngine, hint_rules
+
+FRONTEND_GAMES = Path(__file__).resolve().parents[2] / "frontend" / "games"
+
+
+def _engine(tmp_path, rules):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"version": 1, "rules": rules}), encoding="utf-8")
+    engine = HintRuleEngine(str(path), reload_interval=0)
+    engine.load()
+    return engine
+
+
+def test_state_pattern_rules_match_without_error_history(tmp_path):
+    engine = _engine(tmp_path, [
+        {"id": "unsafe", "when": {"game": ["g"], "result": ["unsafe"]}, "hints": ["先想想", "再想想"]},
+        {"id": "error", "when": {"game": ["g"]}, "errors": ["wrong"], "hints": ["错了"]},
+    ])
+    assert engine.match({"game": "g", "result": "unsafe"}, []) == ("unsafe", "先想想")
+    assert engine.match({"game": "g", "result": "safe"}, []) is None
+    # 按错误匹配的规则优先
+    assert engine.match({"game": "g", "result": "unsafe"}, [{"error_type": "wrong"}]) == ("error", "错了")
+    # 其他错误越多，提示越直接
+    assert engine.match({"game": "g", "result": "unsafe"}, [{"error_type": "other"}]) == ("unsafe", "再想想")
+
+
+@pytest.mark.parametrize("spec", [
+    {"id": "everything", "hints": ["提示"]},
+    {"id": "concept", "when": {"game": ["g"], "mode": ["a"], "stage": ["learning"]}, "hints": ["提示"]},
+])
+def test_rule_needs_errors_or_state_pattern(spec):
+    with pytest.raises(ValueError):
+        HintRule(spec)
+
+
+@pytest.mark.parametrize("game_state, errors, rule_id", [
+    ({"game": "process-scheduling", "algorithm": "sjf"}, ["wrong_order"], "sched-sjf-order"),
+    ({"game": "deadlock", "strategy": "avoidance"}, ["request_exceeds_need"], "deadlock-exceeds-need"),
+    ({"game": "memory-management", "mode": "virtual"}, ["wrong_victim", "wrong_victim"], "mem-wrong-victim"),
+])
+def test_shipped_rules_answer_specific_mistakes(game_state, errors, rule_id):
+    hint_rules.load()
+    matched = hint_rules.match(game_state, [{"error_type": error} for error in errors])
+    assert matched is not None and matched[0] == rule_id
+
+
+def test_repeated_mistake_gets_more_direct_hint():
+    hint_rules.load()
+    state = {"game": "process-scheduling", "algorithm": "sjf"}
+    first = hint_rules.match(state, [{"error_type": "wrong_order"}])
+    again = hint_rules.match(state, [{"error_type": "wrong_order"}] * 2)
+    assert first[1] != again[1]
+
+
+def _shipped_hint_states():
+    """各游戏页面 showHint 发送的 game_state（字段取页面中的初始值）"""
+    for page in sorted(FRONTEND_GAMES.glob("*/index.html")):
+        source = page.read_text(encoding="utf-8")
+        call = re.search(r"getHint\(\s*[^,]+,\s*\{(.*?)\}", source, re.S).group(1)
+        state = {}
+        for field, value in re.findall(r"(\w+):\s*([^,\n]+)", call):
+            value = value.strip()
+            if value.startswith("this."):
+                initial = re.search(rf"{re.escape(value)}\s*=\s*'([^']*)'", source)
+                value = initial.group(1) if initial else "/"
+            state[field] = value.strip("'")
+        yield page.parent.name, state
+
+
+@pytest.mark.parametrize("game, state", list(_shipped_hint_states()))
+def test_generic_states_fall_through_to_the_model(game, state):
+    # 游戏页面只发送所在游戏和模式、没有错误记录，由大模型回答
+    hint_rules.load()
+    assert state["game"] == game
+    assert hint_rules.match(state, []) is None
+    assert hint_rules.match(state, [{"error_type": "something_new"}]) is None
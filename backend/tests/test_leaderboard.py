@@ -0,0 +1,150 @@
+"""
+内存排行榜
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+from models.database import SessionLocal
+from services.leaderboard import Board, Leaderboard, GENERATION_KEY
+from utils.shared_state import shared_state
+
+T0 = datetime(2026, 1, 1)
+
+
+def test_board_keeps_best_score_and_ranks():
+    board = Board()
+    board.load([("a", 80, 2, T0), ("b", 90, 3, T0), ("c", 80, 2, T0 - timedelta(minutes=1))])
+    assert [entry["player_id"] for entry in board.slice(0, 10)] == ["b", "c", "a"]
+
+    assert board.upsert("a", 95, 3, T0 + timedelta(minutes=1))
+    # 更差的成绩不替换
+    assert not board.upsert("a", 10, 0, T0 + timedelta(minutes=2))
+    assert board.rank("a") == 1
+    assert board.rank("c") == 3
+    assert [entry["rank"] for entry in board.slice(1, 2)] == [2, 3]
+    assert board.rank("missing") is None
+
+
+def test_updates_during_load_are_merged():
+    board = Board()
+    board.upsert("a", 100, 3, T0)
+    board.upsert("b", 10, 1, T0)
+    board.load([("a", 50, 1, T0), ("b", 60, 2, T0), ("c", 70, 2, T0)])
+    assert [(entry["player_id"], entry["score"]) for entry in board.slice(0, 10)] == [
+        ("a", 100), ("c", 70), ("b", 60)
+    ]
+
+
+def test_cold_load_does_not_block_other_boards(monkeypatch):
+    loading, release = threading.Event(), threading.Event()
+    loads = []
+
+    def slow_load(board, game_type, level):
+        loads.append(game_type)
+        if game_type == "slow":
+            loading.set()
+            release.wait(2)
+        board.load([("p", 10, 1, T0)])
+
+    monkeypatch.setattr(Leaderboard, "_load", staticmethod(slow_load))
+    leaderboard = Leaderboard()
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(leaderboard.top("slow", "beginner")["total"]))
+               for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    assert loading.wait(2)
+
+    # 另一个排行榜的加载不等待
+    assert leaderboard.top("fast", "beginner")["total"] == 1
+    release.set()
+    for reader in readers:
+        reader.join()
+    assert results == [1] * 4
+    assert sorted(loads) == ["fast", "slow"]
+
+
+def test_window_returns_rank_and_neighbours():
+    board = Board()
+    board.load([(f"p{i}", 100 - i, 1, T0) for i in range(10)])
+    rank, total, entries = board.window("p5", 2, 2)
+    assert (rank, total) == (6, 10)
+    assert [(entry["rank"], entry["player_id"]) for entry in entries] == [
+        (4, "p3"), (5, "p4"), (6, "p5"), (7, "p6"), (8, "p7")
+    ]
+    # 榜首和榜尾截断到列表范围
+    assert [entry["player_id"] for entry in board.window("p0", 2, 1)[2]] == ["p0", "p1"]
+    assert [entry["player_id"] for entry in board.window("p9", 1, 3)[2]] == ["p8", "p9"]
+    assert board.window("missing") is None
+
+
+def test_rank_stays_consistent_with_concurrent_updates(monkeypatch):
+    monkeypatch.setattr(Leaderboard, "_load", staticmethod(
+        lambda board, game_type, level: board.load([(f"p{i}", 50, 1, T0) for i in range(200)])
+    ))
+    leaderboard = Leaderboard()
+    leaderboard.top("race", "beginner")
+    stop = threading.Event()
+
+    def writer():
+        # 不断有新玩家排到 p199 前面，它的名次一直在变
+        count = 0
+        while not stop.is_set():
+            leaderboard.apply("race", "beginner", f"new{count}", 60, 1, T0)
+            count += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(2000):
+            result = leaderboard.rank("race", "beginner", "p199")
+            assert result["player_id"] == "p199"
+            around = leaderboard.around("race", "beginner", "p199", radius=2)
+            assert "p199" in [entry["player_id"] for entry in around["entries"]]
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _write_entry(game_type, player_id, score, stars=1):
+    """模拟另一个进程写入成绩并提交"""
+    db = SessionLocal()
+    try:
+        Leaderboard.upsert_entry(db, game_type, "beginner", player_id, score, stars, datetime.utcnow())
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_sync_reads_other_workers_scores_after_watermark():
+    _write_entry("sync-game", "w1", 50)
+    other = Leaderboard(sync_interval=60)
+    board = other._board("sync-game", "beginner")
+    watermark = board.watermark
+    assert watermark is not None
+
+    _write_entry("sync-game", "w2", 70)
+    _write_entry("sync-game", "w1", 90)
+    # 未到同步间隔时仍是内存中的成绩
+    assert other.top("sync-game", "beginner")["total"] == 1
+
+    board.synced_at -= 60
+    entries = other.top("sync-game", "beginner")["entries"]
+    assert [(entry["player_id"], entry["score"]) for entry in entries] == [("w1", 90), ("w2", 70)]
+    assert board.watermark > watermark
+
+
+def test_generation_change_drops_boards_in_other_workers():
+    _write_entry("generation-game", "g1", 40)
+    worker = Leaderboard(sync_interval=60)
+    board = worker._board("generation-game", "beginner")
+
+    # 其他进程重建排行榜后递增共享计数器
+    shared_state.incr(GENERATION_KEY)
+    assert worker._board("generation-game", "beginner") is not board
+    # 单进程（不同步）时不检查计数器
+    single = Leaderboard()
+    board = single._board("generation-game", "beginner")
+    shared_state.incr(GENERATION_KEY)
+    assert single._board("generation-game", "beginner") is board
@@ -0,0 +1,61 @@
+"""
+运行指标：直方图输出、请求级SQL统计与Server-Timing
+"""
+
+import re
+
+from utils import metrics
+from utils.metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "耗时", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, route='/a"b')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds 耗时", "# TYPE latency_seconds histogram"]
+    assert lines[2:] == [
+        'latency_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a\\"b",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a\\"b"} 4.05',
+        'latency_seconds_count{route="/a\\"b"} 4',
+    ]
+
+
+def test_failing_collector_is_skipped():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "请求数").inc(2)
+
+    def broken():
+        raise RuntimeError("stats unavailable")
+
+    registry.register_collector(broken)
+    registry.register_collector(lambda: [("queue_depth", "gauge", "深度", [({"queue": "q"}, 3)])])
+    assert registry.render().splitlines()[-3:] == [
+        "# HELP queue_depth 深度", "# TYPE queue_depth gauge", 'queue_depth{queue="q"} 3']
+    assert "requests_total 2" in registry.render()
+
+
+def test_request_reports_its_queries_in_server_timing(client):
+    route = "/api/game/progress/{player_id}"
+    before = metrics.http_requests_total.value(method="GET", route=route, status=200)
+    queries = metrics.db_queries_total.value()
+
+    response = client.get("/api/game/progress/p-metrics")
+    assert response.status_code == 200
+    timing = re.fullmatch(r'app;dur=([\d.]+), db;dur=([\d.]+);desc="(\d+) queries"',
+                          response.headers["Server-Timing"])
+    assert timing, response.headers["Server-Timing"]
+    request_queries = int(timing.group(3))
+    assert request_queries >= 1
+    assert float(timing.group(2)) <= float(timing.group(1))
+    assert metrics.db_queries_total.value() - queries >= request_queries
+
+    # 按路由模板而不是具体路径计数
+    assert metrics.http_requests_total.value(method="GET", route=route, status=200) == before + 1
+    body = client.get("/metrics").text
+    assert 'db_queries_per_request_count{route="/api/game/progress/{player_id}"}' in body
+    assert "p-metrics" not in body
@@ -0,0 +1,55 @@
+"""
+数据库迁移
+"""
+
+import sqlite3
+
+from sqlalchemy import create_engine, inspect, text
+
+from models.migrations import rebuild_action_logs
+
+LEGACY_ACTION_LOGS = (
+    "CREATE TABLE action_logs (id INTEGER NOT NULL, session_id VARCHAR(50) NOT NULL, "
+    "action_type VARCHAR(50) NOT NULL, action_data JSON, payload BLOB, timestamp DATETIME, "
+    "PRIMARY KEY (id))"
+)
+
+
+def _archive(directory, month, max_id):
+    conn = sqlite3.connect(str(directory / f"action_logs_{month}.db"))
+    conn.execute("CREATE TABLE action_logs (archive_id INTEGER PRIMARY KEY, id INTEGER NOT NULL, "
+                 "session_id TEXT NOT NULL, action_type TEXT NOT NULL, action_data TEXT, timestamp TEXT)")
+    conn.execute("INSERT INTO action_logs (id, session_id, action_type) VALUES (?, 's-old', 'click')", (max_id,))
+    conn.commit()
+    conn.close()
+
+
+def test_rebuild_action_logs_stops_id_reuse(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    archive_dir = tmp_path / "archive"
+    archive_dir.mkdir()
+    _archive(archive_dir, "202601", 40)
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_ACTION_LOGS))
+        conn.execute(text("CREATE INDEX ix_action_logs_session_id ON action_logs (session_id)"))
+        conn.execute(text(
+            "INSERT INTO action_logs (id, session_id, action_type, action_data) VALUES "
+            "(1, 's1', 'click', '{\"i\": 1}'), (2, 's1', 'drag', '{\"i\": 2}')"
+        ))
+
+    with engine.begin() as conn:
+        rebuild_action_logs(conn, archive_dir=str(archive_dir))
+        # 已经重建的表再次执行不做任何事
+        rebuild_action_logs(conn, archive_dir=str(archive_dir))
+
+    with engine.begin() as conn:
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'action_logs'")).scalar()
+        assert "AUTOINCREMENT" in sql
+        rows = conn.execute(text("SELECT id, action_type, action_data FROM action_logs ORDER BY id")).fetchall()
+        assert [(row[0], row[1]) for row in rows] == [(1, "click"), (2, "drag")]
+        # 新行的ID排在归档中最大的ID之后，删除在线表的行也不会复用
+        conn.execute(text("DELETE FROM action_logs"))
+        conn.execute(text("INSERT INTO action_logs (session_id, action_type) VALUES ('s2', 'click')"))
+        assert conn.execute(text("SELECT id FROM action_logs")).scalar() == 41
+    indexes = {index["name"] for index in inspect(engine).get_indexes("action_logs")}
+    assert "ix_action_logs_session_id" in indexes
@@ -0,0 +1,58 @@
+"""
+进度汇总的增量更新
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from models.database import SessionLocal, PlayerProgress
+from services.game_service import GameService
+
+
+def _progress(player_id, game_type):
+    db = SessionLocal()
+    try:
+        return db.query(PlayerProgress).filter(
+            PlayerProgress.player_id == player_id, PlayerProgress.game_type == game_type
+        ).one()
+    finally:
+        db.close()
+
+
+def test_concurrent_first_starts_merge_into_one_row():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        session_ids = list(pool.map(
+            lambda _: GameService._start_game("p-progress-race", "deadlock")["session_id"], range(16)
+        ))
+    assert len(set(session_ids)) == 16
+    assert _progress("p-progress-race", "deadlock").attempts == 16
+
+
+def test_upsert_keeps_best_and_completed_counts():
+    db = SessionLocal()
+    try:
+        GameService._update_progress(db, "p-progress", "io-management", attempts=1)
+        GameService._update_progress(db, "p-progress", "io-management",
+                                     completed_delta=1, score=80, stars=2)
+        GameService._update_progress(db, "p-progress", "io-management",
+                                     completed_delta=-1, score=60, stars=1)
+        db.commit()
+    finally:
+        db.close()
+
+    row = _progress("p-progress", "io-management")
+    assert (row.attempts, row.completed_count, row.best_score, row.best_stars, row.completed) == (1, 0, 80, 2, False)
+
+
+def test_re_ending_as_incomplete_matches_rebuild():
+    session_id = GameService._start_game("p-progress-reend", "process-sync")["session_id"]
+    GameService._end_game(session_id, score=90, stars=3, completed=True)
+    assert _progress("p-progress-reend", "process-sync").completed
+
+    GameService._end_game(session_id, score=40, stars=1, completed=False)
+    incremental = _progress("p-progress-reend", "process-sync")
+    assert (incremental.completed_count, incremental.completed) == (0, False)
+
+    GameService.rebuild_progress()
+    rebuilt = _progress("p-progress-reend", "process-sync")
+    assert (rebuilt.attempts, rebuilt.completed_count, rebuilt.completed) == (
+        incremental.attempts, incremental.completed_count, incremental.completed)
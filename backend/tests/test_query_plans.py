@@ -0,0 +1,33 @@
+"""
+高频查询的执行计划（SQLite）
+"""
+
+from models.database import engine
+from models.migrations import HOT_QUERIES, check_query_plans, plan_problems, query_plan
+
+
+def _plan(name):
+    query = next(query for query_name, query, _ in HOT_QUERIES if query_name == name)
+    with engine.connect() as conn:
+        return " | ".join(query_plan(conn, query))
+
+
+def test_hot_queries_use_indexes():
+    assert check_query_plans(engine) == []
+
+
+def test_migration_indexes_are_used():
+    assert "ix_game_sessions_player_start" in _plan("history")
+    assert "ix_game_sessions_player_game" in _plan("player_game_sessions")
+    assert "ix_ai_interactions_session_id" in _plan("ai_interactions_by_session")
+
+
+def test_plan_problems_matches_old_and_new_scan_format():
+    assert plan_problems("q", "game_sessions", ["SCAN game_sessions"]) == ["q: SCAN game_sessions"]
+    assert plan_problems("q", "game_sessions", ["SCAN TABLE game_sessions"]) == ["q: SCAN TABLE game_sessions"]
+    assert plan_problems("q", "errors", ["USE TEMP B-TREE FOR ORDER BY"]) == ["q: USE TEMP B-TREE FOR ORDER BY"]
+    assert plan_problems("q", "game_sessions", [
+        "SEARCH game_sessions USING INDEX ix_game_sessions_player_game (player_id=? AND game_type=?)",
+        "SEARCH TABLE game_sessions USING INDEX ix_game_sessions_player_start (player_id=?)",
+        "SCAN game_sessions_archive",
+    ]) == []
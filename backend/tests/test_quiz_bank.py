@@ -0,0 +1,145 @@
+"""
+练习题库：出题、补题、校验与去重
+"""
+
+import asyncio
+import itertools
+import time
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from benchmarks.stub_ai import StubZhipuAI
+from models.database import SessionLocal, QuizBankItem
+from models.migrations import _quiz_fingerprint_per_bucket
+from services.quiz_bank import QuizBank
+from utils.ai_cache import AICache, MemoryCacheBackend
+from utils.zhipu_ai import ZhipuAIService, zhipu_ai_service
+
+
+def _quiz(question, options=("甲", "乙", "丙", "丁")):
+    return {"question": question, "options": list(options), "correct_answer": "A", "explanation": "解析"}
+
+
+def _stock(topic, level):
+    db = SessionLocal()
+    try:
+        return db.query(QuizBankItem).filter(
+            QuizBankItem.topic == topic, QuizBankItem.player_level == level
+        ).count()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """让AI依次返回给定的题目，用完后生成编号递增的新题"""
+    queue = []
+    counter = itertools.count()
+
+    def generate_quiz(player_level, topic, fallback=True):
+        return queue.pop(0) if queue else _quiz(f"{topic}-{player_level}-{next(counter)}")
+
+    monkeypatch.setattr(zhipu_ai_service, "generate_quiz", generate_quiz)
+    return queue
+
+
+def test_take_serves_each_question_once_per_player():
+    QuizBank._store("pop", "beginner", [_quiz("第一题"), _quiz("第二题")])
+    bank = QuizBank(low_water=0)
+
+    served = {asyncio.run(bank.take("beginner", "pop", "p-quiz"))["question"] for _ in range(2)}
+    assert served == {"第一题", "第二题"}
+    # 都做过以后没有可用的题目
+    assert asyncio.run(bank.take("beginner", "pop", "p-quiz")) is None
+    # 其他玩家仍然可以做
+    assert asyncio.run(bank.take("beginner", "pop", "p-quiz-other")) is not None
+    assert (bank.stats()["served"], bank.stats()["misses"]) == (3, 1)
+
+
+def test_take_below_low_water_refills_in_background(generated):
+    bank = QuizBank(low_water=5, refill_batch=3)
+    bank.start()
+    try:
+        assert asyncio.run(bank.take("beginner", "refill", "p-refill")) is None
+        deadline = time.monotonic() + 5
+        while _stock("refill", "beginner") < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        bank.stop()
+    assert _stock("refill", "beginner") == 3
+    assert bank.stats()["generated"] == 3
+
+
+def test_refill_respects_bucket_limit(generated):
+    bank = QuizBank(refill_batch=5, max_per_bucket=2)
+    bank._refill("limit", "beginner")
+    bank._refill("limit", "beginner")
+    assert _stock("limit", "beginner") == 2
+
+
+@pytest.mark.parametrize("raw", [
+    None,
+    {"question": "缺少选项"},
+    _quiz("   "),
+    _quiz("只有一个选项", options=("甲",)),
+])
+def test_invalid_questions_are_rejected(generated, raw):
+    generated.append(raw)
+    bank = QuizBank(refill_batch=1)
+    bank._refill("invalid", "beginner")
+    assert _stock("invalid", "beginner") == 0
+    assert (bank.stats()["invalid"], bank.stats()["generated"]) == (1, 0)
+
+
+def test_duplicates_are_dropped_within_a_bucket_only(generated):
+    # 同一分组中标点和大小写不同的同一道题只保留一道
+    generated.extend([_quiz("什么是死锁？"), _quiz("什么是死锁?"), _quiz("什么是死锁？")])
+    bank = QuizBank(refill_batch=2)
+    bank._refill("dedupe", "beginner")
+    assert _stock("dedupe", "beginner") == 1
+    # 另一个难度的分组不受影响
+    bank.refill_batch = 1
+    bank._refill("dedupe", "advanced")
+    assert _stock("dedupe", "advanced") == 1
+
+
+def test_migration_makes_fingerprint_unique_per_bucket(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE quiz_bank (id INTEGER NOT NULL, topic VARCHAR(100) NOT NULL, "
+            "player_level VARCHAR(20) NOT NULL, question VARCHAR(1000) NOT NULL, options JSON NOT NULL, "
+            "correct_answer VARCHAR(50) NOT NULL, explanation VARCHAR(2000), fingerprint VARCHAR(40) NOT NULL, "
+            "created_at DATETIME, PRIMARY KEY (id), UNIQUE (fingerprint))"
+        ))
+        conn.execute(text("CREATE INDEX ix_quiz_bank_topic_level ON quiz_bank (topic, player_level)"))
+        conn.execute(text(
+            "INSERT INTO quiz_bank (id, topic, player_level, question, options, correct_answer, fingerprint) "
+            "VALUES (7, 't', 'beginner', 'q', '[\"a\", \"b\"]', 'A', 'f')"
+        ))
+
+    with engine.begin() as conn:
+        _quiz_fingerprint_per_bucket(conn)
+        _quiz_fingerprint_per_bucket(conn)
+
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT id, fingerprint FROM quiz_bank")).fetchall() == [(7, "f")]
+        conn.execute(text(
+            "INSERT INTO quiz_bank (topic, player_level, question, options, correct_answer, fingerprint) "
+            "VALUES ('t', 'advanced', 'q', '[\"a\", \"b\"]', 'A', 'f')"
+        ))
+    unique = [constraint["column_names"] for constraint in inspect(engine).get_unique_constraints("quiz_bank")]
+    assert unique == [["topic", "player_level", "fingerprint"]]
+
+
+def test_generated_quizzes_are_not_cached():
+    # 高温度采样的题目按 (topic, level) 缓存会让每个玩家拿到同一道题
+    service = ZhipuAIService()
+    service.cache = AICache(MemoryCacheBackend())
+    service.client = StubZhipuAI(latency=0, seed=1)
+    first = service.generate_quiz("beginner", "进程调度")
+    second = service.generate_quiz("beginner", "进程调度")
+    assert first["question"] != second["question"]
+    assert service.client.completions.calls == 2
+    assert service.cache.stats()["entries"] == 0
@@ -0,0 +1,107 @@
+"""
+学习报告：过期标记与按需重新计算
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from services.report_service import ReportBuilder
+from utils.zhipu_ai import zhipu_ai_service
+
+
+@pytest.fixture
+def feedback_calls(monkeypatch):
+    calls = []
+
+    def get_feedback(game_data, *args, **kwargs):
+        calls.append(game_data)
+        return {"suggestions": [f"建议{len(calls)}"], "next_steps": []}
+
+    monkeypatch.setattr(zhipu_ai_service, "get_feedback", get_feedback)
+    return calls
+
+
+def _play(client, player_id, score=60):
+    session_id = client.post("/api/game/start", json={"player_id": player_id, "game_type": "process-sync"}).json()[
+        "session_id"]
+    response = client.post("/api/game/end", json={"session_id": session_id, "score": score, "stars": 1,
+                                                   "completed": True})
+    assert response.status_code == 200
+
+
+def _generate(client, player_id):
+    response = client.post("/api/report/generate", json={"player_id": player_id})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_ending_games_does_not_call_the_model(client, feedback_calls):
+    for _ in range(3):
+        _play(client, "p-report-cost")
+    time.sleep(0.1)
+    assert feedback_calls == []
+
+    report = _generate(client, "p-report-cost")
+    assert report["total_games"] == 1 and not report["stale"]
+    assert len(feedback_calls) == 1
+    # 没有新会话时直接返回已保存的报告
+    assert _generate(client, "p-report-cost")["ai_suggestions"] == report["ai_suggestions"]
+    assert len(feedback_calls) == 1
+
+
+def test_stale_report_is_rebuilt_when_read(client, feedback_calls):
+    report_id = _generate(client, "p-report-stale")["report_id"]
+    _play(client, "p-report-stale", score=90)
+    _play(client, "p-report-stale", score=30)
+    assert len(feedback_calls) == 1
+
+    # 读取到过期报告时照常返回，并在后台重新计算一次
+    assert client.get(f"/api/report/{report_id}").json()["stale"]
+    deadline = time.monotonic() + 5
+    while client.get(f"/api/report/{report_id}").json()["stale"] and time.monotonic() < deadline:
+        time.sleep(0.02)
+    report = client.get(f"/api/report/{report_id}").json()
+    assert not report["stale"]
+    assert report["game_breakdown"]["process-sync"]["best_score"] == 90
+    assert len(feedback_calls) == 2
+
+
+def test_concurrent_generate_for_one_player_computes_once(feedback_calls):
+    builder = ReportBuilder()
+
+    async def generate_twice():
+        return await asyncio.gather(builder.generate("p-report-flight"), builder.generate("p-report-flight"))
+
+    first, second = asyncio.run(generate_twice())
+    assert first["report_id"] == second["report_id"]
+    assert len(feedback_calls) == 1
+
+
+def test_request_skips_players_already_queued_or_building():
+    builder = ReportBuilder()
+    builder.request("p-queued")
+    builder.request("p-queued")
+    assert builder._pending == {"p-queued"}
+
+    builder._building.add("p-building")
+    builder.request("p-building")
+    assert "p-building" not in builder._pending
+
+
+def test_background_build_skips_reports_that_are_no_longer_stale(client, feedback_calls):
+    # 读取到过期报告与另一次计算完成交错时，重复登记的玩家不再计算
+    _generate(client, "p-report-fresh")
+    builder = ReportBuilder()
+    builder.start()
+    try:
+        builder.request("p-report-fresh")
+        deadline = time.monotonic() + 5
+        while builder._pending and time.monotonic() < deadline:
+            time.sleep(0.02)
+        time.sleep(0.05)
+    finally:
+        builder.stop()
+    assert len(feedback_calls) == 1
+    assert builder.built == 0
@@ -0,0 +1,185 @@
+"""
+上游调用保护：熔断、重试预算、截止时间和并发上限
+使用 benchmarks/stub_ai.py 的桩客户端注入延迟和错误。
+"""
+
+import threading
+import time
+
+import pytest
+
+from benchmarks.stub_ai import StubZhipuAI, StubAPIError
+from utils.resilience import CircuitBreaker, RetryBudget, UpstreamGuard, UpstreamUnavailable
+from utils.zhipu_ai import ZhipuAIService, UNAVAILABLE_MESSAGE
+
+
+def _guard(**kwargs):
+    options = dict(max_concurrency=4, deadline=2.0, attempt_timeout=1.0, max_attempts=3,
+                   backoff_base=0.0, backoff_max=0.0,
+                   budget=RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=100),
+                   breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=0.2))
+    options.update(kwargs)
+    return UpstreamGuard(**options)
+
+
+def _service(guard, **stub_options):
+    service = ZhipuAIService()
+    service.cache = None
+    service.guard = guard
+    service.client = StubZhipuAI(**stub_options)
+    return service, service.client.completions
+
+
+def _failing(timeout):
+    raise StubAPIError("upstream down", status_code=503)
+
+
+# ============ 熔断器 ============
+
+def test_breaker_opens_after_consecutive_failures():
+    guard = _guard(max_attempts=1)
+    service, stub = _service(guard, latency=0.0, error_rate=1.0)
+
+    answers = [service.answer_question(f"问题{i}") for i in range(6)]
+    assert answers == [UNAVAILABLE_MESSAGE] * 6
+    # 达到阈值后不再访问上游
+    assert stub.calls == 3
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    assert guard.breaker.stats()["rejected"] == 3
+
+
+def test_half_open_allows_one_probe_and_closes_on_success():
+    guard = _guard(max_attempts=1)
+    for _ in range(3):
+        with pytest.raises(StubAPIError):
+            guard.call(_failing)
+    time.sleep(0.25)
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+
+    probe_started, release_probe = threading.Event(), threading.Event()
+
+    def slow_probe(timeout):
+        probe_started.set()
+        release_probe.wait(1)
+        return "ok"
+
+    results = []
+    probe = threading.Thread(target=lambda: results.append(guard.call(slow_probe)))
+    probe.start()
+    probe_started.wait(1)
+    # 探测进行中，其他请求仍然快速失败
+    with pytest.raises(UpstreamUnavailable) as rejected:
+        guard.call(lambda timeout: "other")
+    assert rejected.value.reason == "circuit_open"
+    release_probe.set()
+    probe.join()
+
+    assert results == ["ok"]
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.call(lambda timeout: "after") == "after"
+
+
+def test_failed_probe_reopens_breaker():
+    guard = _guard(max_attempts=1)
+    for _ in range(3):
+        with pytest.raises(StubAPIError):
+            guard.call(_failing)
+    time.sleep(0.25)
+    with pytest.raises(StubAPIError):
+        guard.call(_failing)
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    assert guard.breaker.stats()["opened"] == 2
+
+
+# ============ 重试预算 ============
+
+def test_retries_stop_when_budget_is_exhausted():
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=2)
+    guard = _guard(max_attempts=5, budget=budget,
+                   breaker=CircuitBreaker(failure_threshold=100, recovery_timeout=1))
+    service, stub = _service(guard, latency=0.0, error_rate=1.0)
+
+    assert service.answer_question("第一个") == UNAVAILABLE_MESSAGE
+    # 预算只有两次重试：1次调用 + 2次重试
+    assert stub.calls == 3
+    assert service.answer_question("第二个") == UNAVAILABLE_MESSAGE
+    assert stub.calls == 4
+    assert budget.stats()["retries"] == 2
+    assert budget.stats()["exhausted"] == 2
+
+
+def test_non_retryable_errors_are_not_retried():
+    guard = _guard(max_attempts=5)
+    calls = []
+
+    def bad_request(timeout):
+        calls.append(timeout)
+        raise StubAPIError("bad request", status_code=400)
+
+    with pytest.raises(StubAPIError):
+        guard.call(bad_request)
+    assert len(calls) == 1
+    assert guard.breaker.stats()["consecutive_failures"] == 0
+
+
+# ============ 截止时间 ============
+
+def test_deadline_bounds_total_time_across_retries():
+    guard = _guard(deadline=0.3, attempt_timeout=0.2, max_attempts=10,
+                   breaker=CircuitBreaker(failure_threshold=100, recovery_timeout=1))
+    service, stub = _service(guard, latency=5.0)
+
+    started = time.monotonic()
+    assert service.answer_question("慢问题") == UNAVAILABLE_MESSAGE
+    elapsed = time.monotonic() - started
+    assert elapsed < 0.45
+    # 第二次尝试只拿到剩余的时间
+    assert stub.calls == 2
+
+
+def test_waiting_for_a_slot_counts_against_the_deadline():
+    guard = _guard(max_concurrency=1, deadline=0.2)
+    busy, release = threading.Event(), threading.Event()
+
+    def hold(timeout):
+        busy.set()
+        release.wait(1)
+        return "done"
+
+    worker = threading.Thread(target=lambda: guard.call(hold))
+    worker.start()
+    busy.wait(1)
+    with pytest.raises(UpstreamUnavailable) as exc:
+        guard.call(lambda timeout: "never")
+    assert exc.value.reason == "concurrency"
+    release.set()
+    worker.join()
+
+
+# ============ 流式响应 ============
+
+def test_stream_holds_slot_until_consumed():
+    guard = _guard(max_concurrency=1, deadline=0.1)
+    stream = guard.call(lambda timeout: iter(["a", "b"]), stream=True)
+    assert guard.stats()["active"] == 1
+    with pytest.raises(UpstreamUnavailable):
+        guard.call(lambda timeout: "blocked")
+
+    assert list(stream) == ["a", "b"]
+    assert guard.stats()["active"] == 0
+    assert guard.call(lambda timeout: "free") == "free"
+
+
+def test_stream_closed_early_releases_slot():
+    guard = _guard(max_concurrency=1)
+    service, stub = _service(guard, latency=0.0)
+
+    chunks = service.stream_answer("流式问题")
+    assert next(chunks)
+    assert guard.stats()["active"] == 1
+    chunks.close()
+    assert guard.stats()["active"] == 0
+
+    # 读完的流同样释放
+    assert "".join(service.stream_answer("另一个问题"))
+    assert guard.stats()["active"] == 0
@@ -0,0 +1,76 @@
+"""
+活跃会话登记表
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from services.game_service import GameService
+from services.session_registry import SessionRegistry, InactiveSession, LiveSession
+
+
+def _require_active(registry, session_id):
+    return asyncio.run(registry.require_active(session_id))
+
+
+def test_load_registers_session_from_database():
+    session_id = GameService._start_game("p-registry", "deadlock", "advanced")["session_id"]
+    registry = SessionRegistry()
+
+    session = registry.load(session_id)
+    assert (session.player_id, session.game_type, session.level, session.ended) == (
+        "p-registry", "deadlock", "advanced", False)
+    # 之后的访问直接读取登记表
+    assert _require_active(registry, session_id) is session
+    assert registry.stats()["loads"] == 1
+    assert registry.stats()["live_by_game"] == {"deadlock": 1}
+
+
+def test_require_active_rejects_ended_sessions():
+    session_id = GameService._start_game("p-registry-end", "process-sync")["session_id"]
+    registry = SessionRegistry()
+    session = _require_active(registry, session_id)
+
+    registry.end(session, 80, True, datetime.utcnow())
+    with pytest.raises(InactiveSession) as error:
+        _require_active(registry, session_id)
+    assert error.value.ended
+    assert registry.stats()["rejected"] == 1
+    assert registry.stats()["live"] == 0
+
+    # 在其他进程中结束的会话从数据库读取后同样拒绝
+    GameService._end_game(session_id, score=80, stars=2, completed=True)
+    other = SessionRegistry()
+    with pytest.raises(InactiveSession) as error:
+        _require_active(other, session_id)
+    assert error.value.ended
+
+
+def test_missing_sessions_are_remembered_until_ttl_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("services.session_registry.time.monotonic", lambda: clock[0])
+    registry = SessionRegistry(miss_ttl=30)
+
+    for _ in range(3):
+        with pytest.raises(InactiveSession) as error:
+            _require_active(registry, "no-such-session")
+        assert not error.value.ended
+    # 重复的无效写入不再查库
+    assert registry.stats()["loads"] == 1
+    assert registry.stats()["rejected"] == 3
+
+    clock[0] += 31
+    with pytest.raises(InactiveSession):
+        _require_active(registry, "no-such-session")
+    assert registry.stats()["loads"] == 2
+
+
+def test_register_clears_missing_entry():
+    registry = SessionRegistry()
+    assert asyncio.run(registry.resolve("registered-later")) is None
+    session = LiveSession("registered-later", "p-registry-late", "process-sync", None, datetime.utcnow())
+    registry.register(session)
+    assert asyncio.run(registry.resolve("registered-later")) is session
+    assert registry.stats()["missing_cached"] == 0
@@ -0,0 +1,76 @@
+"""
+进程间共享状态：键值、计数器与租约
+"""
+
+import pytest
+
+from utils import shared_state as shared_state_module
+from utils.shared_state import MemorySharedState, SQLiteSharedState
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return lambda: MemorySharedState()
+    # 同一文件上的多个实例相当于多个worker进程
+    path = str(tmp_path / "shared_state.db")
+    return lambda: SQLiteSharedState(path)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(shared_state_module.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def owner(monkeypatch):
+    current = ["worker-1"]
+    monkeypatch.setattr(shared_state_module, "_owner", lambda: current[0])
+    return current
+
+
+def test_kv_values_expire_after_ttl(state, clock):
+    shared = state()
+    shared.set("config", {"level": "advanced", "名称": "乡村"}, ttl=10)
+    shared.set("forever", [1, 2])
+    assert shared.get("config") == {"level": "advanced", "名称": "乡村"}
+
+    clock[0] += 11
+    assert shared.get("config", "expired") == "expired"
+    assert shared.get("forever") == [1, 2]
+    shared.delete("forever")
+    assert shared.get("forever") is None
+
+
+def test_counters_are_shared_between_instances(state):
+    first = state()
+    assert first.incr("generation") == 1
+    assert first.incr("generation", 2) == 3
+    assert first.counter("missing") == 0
+    if isinstance(first, SQLiteSharedState):
+        assert state().incr("generation") == 4
+
+
+def test_lease_is_exclusive_until_it_expires(state, clock, owner):
+    shared = state()
+    assert shared.acquire_lease("compaction", ttl=30)
+    # 持有者可以续期
+    assert shared.acquire_lease("compaction", ttl=30)
+
+    owner[0] = "worker-2"
+    assert not shared.acquire_lease("compaction", ttl=30)
+    # 非持有者释放无效
+    shared.release_lease("compaction")
+    assert not shared.acquire_lease("compaction", ttl=30)
+
+    clock[0] += 31
+    assert shared.acquire_lease("compaction", ttl=30)
+    owner[0] = "worker-1"
+    assert not shared.acquire_lease("compaction", ttl=30)
+
+    owner[0] = "worker-2"
+    shared.release_lease("compaction")
+    owner[0] = "worker-1"
+    assert shared.acquire_lease("compaction", ttl=30)
@@ -0,0 +1,120 @@
+"""
+模拟引擎：教材中的经典例题
+"""
+
+import random
+
+import pytest
+
+from simulation import (
+    schedule, simulate_paging, fault_curve, check_safety, is_safe_sequence,
+    request_resources, detect_deadlock, schedule_disk, generate_problem, validate_submission,
+    VALIDATED_GAMES,
+)
+
+BANKER_AVAILABLE = [3, 3, 2]
+BANKER_ALLOCATION = [[0, 1, 0], [2, 0, 0], [3, 0, 2], [2, 1, 1], [0, 0, 2]]
+BANKER_MAXIMUM = [[7, 5, 3], [3, 2, 2], [9, 0, 2], [2, 2, 2], [4, 3, 3]]
+DISK_QUEUE = [98, 183, 37, 122, 14, 124, 65, 67]
+
+
+# ============ 进程调度 ============
+
+@pytest.mark.parametrize("algorithm, burst, priority, quantum, order, avg_waiting", [
+    ("fcfs", [24, 3, 3], None, 2, ["P1", "P2", "P3"], 17.0),
+    ("sjf", [6, 8, 7, 3], None, 2, ["P4", "P1", "P3", "P2"], 7.0),
+    ("rr", [24, 3, 3], None, 4, ["P2", "P3", "P1"], 5.6667),
+    ("priority", [10, 1, 2, 1, 5], [3, 1, 4, 5, 2], 2, ["P2", "P5", "P1", "P3", "P4"], 8.2),
+])
+def test_scheduling_textbook(algorithm, burst, priority, quantum, order, avg_waiting):
+    result = schedule(arrival=[0] * len(burst), burst=burst, algorithm=algorithm,
+                      priority=priority or [0] * len(burst), quantum=quantum, detail=False)
+    assert result["order"] == order
+    assert result["avg_waiting"] == pytest.approx(avg_waiting, abs=1e-3)
+
+
+# ============ 页面置换 ============
+
+def test_fifo_belady_anomaly():
+    assert fault_curve([1, 2, 3, 4, 1, 2, 5, 1, 2, 3, 4, 5], 4, "fifo") == [12, 12, 9, 10]
+
+
+@pytest.mark.parametrize("algorithm, faults", [("fifo", 15), ("lru", 12), ("opt", 9)])
+def test_paging_textbook(algorithm, faults):
+    reference = [7, 0, 1, 2, 0, 3, 0, 4, 2, 3, 0, 3, 2, 1, 2, 0, 1, 7, 0, 1]
+    result = simulate_paging(reference, 3, algorithm)
+    assert result["faults"] == faults
+    assert result["hits"] == len(reference) - faults
+
+
+# ============ 银行家算法与死锁检测 ============
+
+def test_bankers_safe_sequence():
+    result = check_safety(BANKER_AVAILABLE, BANKER_ALLOCATION, BANKER_MAXIMUM)
+    assert result["safe"]
+    assert result["sequence"] == [1, 3, 0, 2, 4]
+    assert is_safe_sequence(BANKER_AVAILABLE, BANKER_ALLOCATION, BANKER_MAXIMUM, [1, 3, 4, 0, 2])
+    assert not is_safe_sequence(BANKER_AVAILABLE, BANKER_ALLOCATION, BANKER_MAXIMUM, [0, 1, 2, 3, 4])
+
+
+def test_bankers_requests():
+    granted = request_resources(BANKER_AVAILABLE, BANKER_ALLOCATION, BANKER_MAXIMUM, 1, [1, 0, 2])
+    assert granted["granted"] and granted["sequence"] == [1, 3, 4, 0, 2]
+    # 分配给P1之后，P0申请 (0,2,0) 会进入不安全状态
+    allocation = [row[:] for row in BANKER_ALLOCATION]
+    allocation[1] = [3, 0, 2]
+    denied = request_resources([2, 3, 0], allocation, BANKER_MAXIMUM, 0, [0, 2, 0])
+    assert (denied["granted"], denied["reason"]) == (False, "unsafe")
+
+
+def test_deadlock_detection():
+    allocation = [[0, 1, 0], [2, 0, 0], [3, 0, 3], [2, 1, 1], [0, 0, 2]]
+    request = [[0, 0, 0], [2, 0, 2], [0, 0, 0], [1, 0, 0], [0, 0, 2]]
+    assert detect_deadlock([0, 0, 0], allocation, request) == {"deadlocked": False, "processes": []}
+    request[2] = [0, 0, 1]
+    assert detect_deadlock([0, 0, 0], allocation, request)["processes"] == [1, 2, 3, 4]
+
+
+# ============ 磁盘调度 ============
+
+@pytest.mark.parametrize("algorithm, direction, total_seek", [
+    ("fcfs", "up", 640), ("sstf", "up", 236), ("scan", "down", 236), ("look", "up", 299),
+])
+def test_disk_textbook(algorithm, direction, total_seek):
+    assert schedule_disk(DISK_QUEUE, 53, algorithm, 200, direction)["total_seek"] == total_seek
+
+
+# ============ 出题 ============
+
+# 各游戏校验的一个答案字段和一个错误的答案
+ANSWER_KEYS = {
+    "process-scheduling": ("order", []),
+    "memory-management": ("faults", -1),
+    "deadlock": ("safe", None),
+    "io-management": ("total_seek", -1),
+}
+
+
+@pytest.mark.parametrize("game_type", VALIDATED_GAMES)
+@pytest.mark.parametrize("level", ["beginner", "advanced"])
+def test_generated_problems_are_solvable(game_type, level):
+    rng = random.Random(7)
+    key, wrong = ANSWER_KEYS[game_type]
+    for _ in range(20):
+        problem = generate_problem(game_type, level, rng)
+        expected = validate_submission(game_type, {**problem, "answer": {key: wrong}})["expected"]
+        verdict = validate_submission(game_type, {"answer": {key: expected[key]}}, problem)
+        assert verdict["score"] == 100
+
+
+def test_problem_overrides_submitted_parameters():
+    problem = {"algorithm": "fifo", "frames": 3, "reference": [7, 0, 1, 2, 0, 3, 0, 4, 2, 3, 0, 3, 2, 1, 2, 0, 1, 7, 0, 1]}
+    # 客户端自选的简单题目被忽略
+    submission = {"reference": [1, 2, 3, 1], "frames": 3, "answer": {"faults": 3}}
+    assert validate_submission("memory-management", submission, problem)["score"] == 0
+    submission["answer"]["faults"] = 15
+    assert validate_submission("memory-management", submission, problem)["score"] == 100
+
+
+def test_games_without_validation_have_no_problem():
+    assert generate_problem("process-sync") is None
@@ -0,0 +1,96 @@
+"""
+AI请求合并
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from models.database import SessionLocal, AIInteraction
+from services import ai_service as ai_module
+from services.ai_service import AIService
+from utils.metrics import current_token_usage
+from utils.single_flight import SingleFlight
+from utils.zhipu_ai import UNAVAILABLE_MESSAGE
+
+
+def test_waiters_share_success_and_leader_is_marked():
+    flight = SingleFlight("t", result_window=10, share=lambda result: result != "fail")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        results = await asyncio.gather(*[flight.do("k", call) for _ in range(5)])
+        return results + [await flight.do("k", call)]
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert results[0] == ("ok", False)
+    assert results[1:] == [("ok", True)] * 5
+    assert flight.stats()["window_hits"] == 1
+
+
+def test_failures_are_not_shared_or_cached():
+    flight = SingleFlight("t", result_window=10, share=lambda result: result != "fail")
+    outcomes = iter(["fail", "ok", "ok", "ok"])
+
+    async def call():
+        await asyncio.sleep(0.02)
+        return next(outcomes)
+
+    async def main():
+        concurrent = await asyncio.gather(*[flight.do("k", call) for _ in range(3)])
+        return concurrent, await flight.do("k", call)
+
+    concurrent, later = asyncio.run(main())
+    # 领头请求失败，等待者各自重新调用，不会拿到失败结果
+    assert concurrent == [("fail", False), ("ok", False), ("ok", False)]
+    assert flight.stats()["unshared"] == 2
+    # 失败结果不进入复用窗口
+    assert later == ("ok", False)
+
+
+def _hint_rows(session_id):
+    db = SessionLocal()
+    try:
+        return db.query(AIInteraction).filter(AIInteraction.session_id == session_id).all()
+    finally:
+        db.close()
+
+
+def test_hint_tokens_are_attributed_to_the_leader(monkeypatch):
+    monkeypatch.setattr(ai_module, "hint_flight", SingleFlight("hint", result_window=10, share=ai_module._succeeded))
+    monkeypatch.setattr(ai_module.hint_rules, "enabled", False)
+
+    def fake_hint(game_state, errors):
+        current_token_usage.get().add(SimpleNamespace(prompt_tokens=30, completion_tokens=12, total_tokens=42))
+        return "想想谁先到达"
+
+    monkeypatch.setattr(ai_module.zhipu_ai_service, "get_hint", fake_hint)
+    state = {"game": "scheduling-test", "stage": 1}
+
+    async def main():
+        await asyncio.gather(*[AIService.get_hint(f"flight-{i}", state) for i in range(3)])
+
+    asyncio.run(main())
+    rows = [row for i in range(3) for row in _hint_rows(f"flight-{i}")]
+    assert sorted(row.tokens_used for row in rows) == [0, 0, 42]
+    shared = [json.loads(row.prompt).get("shared", False) for row in rows if row.tokens_used == 0]
+    assert shared == [True, True]
+
+
+def test_unavailable_hint_is_not_served_to_later_callers(monkeypatch):
+    monkeypatch.setattr(ai_module, "hint_flight", SingleFlight("hint", result_window=10, share=ai_module._succeeded))
+    monkeypatch.setattr(ai_module.hint_rules, "enabled", False)
+    responses = iter([UNAVAILABLE_MESSAGE, "先看到达时间"])
+    monkeypatch.setattr(ai_module.zhipu_ai_service, "get_hint", lambda state, errors: next(responses))
+    state = {"game": "scheduling-fail", "stage": 2}
+
+    async def main():
+        return [await AIService.get_hint("flight-fail", state) for _ in range(2)]
+
+    assert asyncio.run(main()) == [UNAVAILABLE_MESSAGE, "先看到达时间"]
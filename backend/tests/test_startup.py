@@ -0,0 +1,13 @@
+"""
+冷启动：导入 app 时不加载只在运行时才需要的包
+"""
+
+from benchmarks.startup import _child_env, measure_imports
+
+
+def test_app_import_does_not_load_ai_sdk(tmp_path):
+    total, by_package = measure_imports("app", _child_env(str(tmp_path)))
+    assert total > 0
+    # 智谱AI SDK在第一次调用AI时才导入；uvicorn只在直接运行 app.py 时导入
+    assert "zhipuai" not in by_package
+    assert "uvicorn" not in by_package
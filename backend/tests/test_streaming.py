@@ -0,0 +1,121 @@
+"""
+SSE流式接口：逐段输出、结束事件与中途断开
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stub_ai import StubZhipuAI
+from models.database import SessionLocal, AIInteraction
+from utils.ai_cache import AICache, MemoryCacheBackend
+from utils.resilience import CircuitBreaker, RetryBudget, UpstreamGuard
+from utils.zhipu_ai import zhipu_ai_service, UNAVAILABLE_MESSAGE
+
+
+class _BrokenStream:
+    """输出几段后连接断开的上游"""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, stream=False, **kwargs):
+        return self._stream()
+
+    def _stream(self):
+        for piece in self.pieces:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+        raise ConnectionError("connection reset")
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """替换全局AI服务的客户端、缓存和熔断器，返回设置客户端的函数"""
+    guard = UpstreamGuard(max_concurrency=4, deadline=2.0, attempt_timeout=1.0, max_attempts=1,
+                          backoff_base=0.0, backoff_max=0.0,
+                          budget=RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=100),
+                          breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=60))
+    monkeypatch.setattr(zhipu_ai_service, "guard", guard)
+    monkeypatch.setattr(zhipu_ai_service, "cache", AICache(MemoryCacheBackend()))
+    monkeypatch.setattr(zhipu_ai_service, "_client_ready", True)
+
+    def use(client):
+        monkeypatch.setattr(zhipu_ai_service, "_client", client)
+        return zhipu_ai_service
+
+    return use
+
+
+def _events(response):
+    """把SSE响应体解析为 (事件名, 数据) 列表"""
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.split("\n\n"):
+        if not block.strip():
+            continue
+        name, data = "message", None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                name = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((name, data))
+    return events
+
+
+def _interactions(session_id):
+    db = SessionLocal()
+    try:
+        return [row.response for row in db.query(AIInteraction).filter(AIInteraction.session_id == session_id)]
+    finally:
+        db.close()
+
+
+def test_stream_sends_deltas_then_full_text(client, upstream):
+    upstream(StubZhipuAI(latency=0))
+    events = _events(client.post("/api/ai/question/stream",
+                                 json={"question": "什么是先来先服务？", "session_id": "s-stream"}))
+
+    deltas = [data["delta"] for name, data in events if name == "message"]
+    assert len(deltas) > 1
+    assert events[-1] == ("done", {"text": "".join(deltas)})
+    assert _interactions("s-stream") == ["".join(deltas)]
+
+    # 完整结果写入缓存，再问一次整段返回，不再请求上游
+    calls = zhipu_ai_service.client.completions.calls
+    cached = _events(client.post("/api/ai/question/stream", json={"question": "什么是先来先服务？"}))
+    assert cached == [("message", {"delta": "".join(deltas)}), ("done", {"text": "".join(deltas)})]
+    assert zhipu_ai_service.client.completions.calls == calls
+
+
+def test_stream_broken_midway_keeps_partial_text_and_skips_cache(client, upstream):
+    upstream(_BrokenStream(["先来", "的先打"]))
+    events = _events(client.post("/api/ai/question/stream",
+                                 json={"question": "中途断开", "session_id": "s-stream-broken"}))
+
+    # 已发送的片段不撤回，也不追加“不可用”提示
+    assert events == [("message", {"delta": "先来"}), ("message", {"delta": "的先打"}),
+                      ("done", {"text": "先来的先打"})]
+    assert _interactions("s-stream-broken") == ["先来的先打"]
+    assert zhipu_ai_service.guard.breaker.stats()["consecutive_failures"] == 1
+    # 不完整的回答不写入缓存
+    assert zhipu_ai_service.cache.get(zhipu_ai_service.question_cache_key("中途断开", None)) is None
+
+
+def test_stream_broken_before_first_delta_sends_unavailable_message(client, upstream):
+    upstream(_BrokenStream([]))
+    events = _events(client.post("/api/ai/question/stream", json={"question": "一开始就断开"}))
+    assert events == [("message", {"delta": UNAVAILABLE_MESSAGE}), ("done", {"text": UNAVAILABLE_MESSAGE})]
+
+
+def test_stream_error_event_ends_the_stream(client, monkeypatch):
+    async def stream_answer(question, context=None, session_id=None):
+        yield "部分"
+        raise RuntimeError("记录失败")
+
+    monkeypatch.setattr("api.ai_routes.ai_service.stream_answer", stream_answer)
+    events = _events(client.post("/api/ai/question/stream", json={"question": "出错"}))
+    assert events == [("message", {"delta": "部分"}), ("error", {"detail": "记录失败"})]
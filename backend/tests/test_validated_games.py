@@ -0,0 +1,94 @@
+"""
+服务端出题与计分：分数只按开始时保存的题目计算
+"""
+
+from simulation import simulate_paging
+
+
+def _start(client, game_type="memory-management"):
+    response = client.post("/api/game/start", json={"player_id": "p-validated", "game_type": game_type})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _end(client, session_id, submission, score=0, stars=0):
+    return client.post("/api/game/end", json={
+        "session_id": session_id, "score": score, "stars": stars, "completed": True,
+        "submission": submission,
+    })
+
+
+def _faults(problem):
+    return simulate_paging(problem["reference"], problem["frames"], problem["algorithm"])["faults"]
+
+
+def test_client_chosen_problem_is_ignored(client):
+    started = _start(client)
+    problem = started["problem"]
+    assert set(problem) == {"algorithm", "frames", "reference"}
+
+    # 客户端附带的题目参数不参与校验，答案按服务端题目判断
+    submission = {"reference": [1, 2, 3, 1], "frames": 3, "algorithm": "fifo",
+                  "answer": {"faults": _faults(problem) + 1}}
+    result = _end(client, started["session_id"], submission, score=100, stars=3).json()
+    assert (result["final_score"], result["stars"], result["validated"]) == (0, 0, True)
+
+
+def test_correct_answer_scores_full_marks(client):
+    started = _start(client)
+    result = _end(client, started["session_id"], {"answer": {"faults": _faults(started["problem"])}}).json()
+    assert (result["final_score"], result["stars"], result["validated"]) == (100, 3, True)
+
+
+def test_validated_game_requires_submission(client):
+    started = _start(client)
+    response = _end(client, started["session_id"], None, score=100, stars=3)
+    assert response.status_code == 400
+    # 会话没有结束，仍然可以提交答案
+    result = _end(client, started["session_id"], {"answer": {"faults": _faults(started["problem"])}}).json()
+    assert result["validated"]
+
+
+def test_validated_game_scores_first_submission_only(client):
+    started = _start(client)
+    session_id, problem = started["session_id"], started["problem"]
+    wrong = _end(client, session_id, {"answer": {"faults": _faults(problem) + 1}}).json()
+    assert wrong["final_score"] == 0
+
+    # 结束后可以查看标准答案，但再次结束不会重新计分
+    right = {"answer": {"faults": _faults(problem)}}
+    assert _end(client, session_id, right).status_code == 409
+    history = client.get("/api/game/history/p-validated").json()["history"]
+    assert next(game for game in history if game["session_id"] == session_id)["score"] == 0
+
+
+def test_live_session_check_is_rejected(client):
+    started = _start(client)
+    session_id, problem = started["session_id"], started["problem"]
+    check = {"session_id": session_id, "submission": {"answer": {"faults": _faults(problem)}}}
+
+    # 进行中的会话不返回逐项结果和分数，不能用来试答案
+    live = client.post("/api/simulation/validate", json=check)
+    assert live.status_code == 400
+    assert "checks" not in live.json()
+
+    _end(client, session_id, {"answer": {"faults": 0}})
+    ended = client.post("/api/simulation/validate", json=check).json()
+    assert ended["checks"] == {"faults": True}
+    assert ended["expected"]["faults"] == _faults(problem)
+
+
+def test_practice_validation_still_returns_expected(client):
+    response = client.post("/api/simulation/validate", json={
+        "game_type": "memory-management",
+        "submission": {"reference": [1, 2, 3, 1], "frames": 3, "algorithm": "fifo", "answer": {"faults": 3}},
+    }).json()
+    assert response["score"] == 100
+    assert response["expected"]["faults"] == 3
+
+
+def test_unvalidated_games_keep_client_score(client):
+    started = _start(client, "process-sync")
+    assert started["problem"] is None
+    result = _end(client, started["session_id"], None, score=80, stars=2).json()
+    assert (result["final_score"], result["stars"], result["validated"]) == (80, 2, False)
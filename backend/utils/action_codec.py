@@ -0,0 +1,287 @@
+"""
+操作数据紧凑编码
+ActionLog.action_data 原来以JSON文本保存每次点击的数据，是数据库体积和写入量的主要来源。
+这里按 (game_type, action_type) 登记操作中常见字段的类型，编码为紧凑的二进制：
+
+    标志字节 | [结构编号 varint | 字段存在位图 | 按类型打包的字段] | [其余字段]
+
+- 结构中登记的字段按类型打包（整数为zigzag varint，浮点数为8字节，字符串为长度+UTF-8）；
+  JSON允许单独的代理字符（如 "\ud800"），字符串按 surrogatepass 编解码，这类输入同样可以还原；
+  没有登记、类型不符或值为None的字段放入“其余字段”，用MessagePack（已安装时）或紧凑JSON编码，
+  解码结果与原数据完全一致。
+- 编码后超过 compress_min 字节且安装了zstandard时，标志之后的内容用zstd压缩。
+- 结构编号一经使用不能修改字段，需要调整时登记新的编号，旧编号保留用于解码。
+
+msgpack 和 zstandard 都是可选依赖，没有安装时分别退回JSON和不压缩。
+"""
+
+import json
+import os
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，其余字段退回JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，不压缩
+    zstandard = None
+
+# 标志位
+FLAG_SCHEMA = 0x01
+FLAG_EXTRA = 0x02
+FLAG_MSGPACK = 0x04
+FLAG_ZSTD = 0x80
+
+_FLOAT = struct.Struct("<d")
+
+
+# ============ 结构登记 ============
+
+class ActionSchema:
+    """一类操作的字段结构，fields 为 [(字段名, 类型)]，类型为 int/float/bool/str 或枚举值列表"""
+
+    __slots__ = ("schema_id", "fields")
+
+    def __init__(self, schema_id: int, fields: Sequence[Tuple[str, Any]]):
+        self.schema_id = schema_id
+        self.fields = [(name, tuple(kind) if isinstance(kind, (list, tuple)) else kind)
+                       for name, kind in fields]
+
+
+SCHEMAS: Dict[int, ActionSchema] = {}
+# (game_type, action_type) -> 结构，game_type 为 "*" 时适用于所有游戏
+_BY_ACTION: Dict[Tuple[str, str], ActionSchema] = {}
+
+
+def register_schema(schema_id: int, game_type: str, action_types: Sequence[str],
+                    fields: Sequence[Tuple[str, Any]]) -> ActionSchema:
+    """登记操作结构；同一编号只能登记一次"""
+    if schema_id in SCHEMAS:
+        raise ValueError(f"操作结构编号 {schema_id} 已被使用")
+    schema = ActionSchema(schema_id, fields)
+    SCHEMAS[schema_id] = schema
+    for action_type in action_types:
+        _BY_ACTION[(game_type, action_type)] = schema
+    return schema
+
+
+def find_schema(game_type: Optional[str], action_type: str) -> Optional[ActionSchema]:
+    return _BY_ACTION.get((game_type, action_type)) or _BY_ACTION.get(("*", action_type))
+
+
+_POINTER = [("x", "int"), ("y", "int")]
+
+register_schema(1, "*", ("click", "move", "select", "drag"), _POINTER + [("target", "str")])
+register_schema(2, "*", ("error",), [("error_type", "str"), ("message", "str"), ("expected", "str"),
+                                     ("actual", "str")])
+register_schema(3, "*", ("hint",), [("stage", "str"), ("topic", "str")])
+register_schema(10, "process-scheduling", ("select", "schedule", "run"), _POINTER + [
+    ("process", "str"), ("algorithm", ("fcfs", "sjf", "priority", "rr")),
+    ("time", "int"), ("burst", "int"), ("arrival", "int"), ("priority", "int"),
+])
+register_schema(20, "memory-management", ("access", "replace", "select"), _POINTER + [
+    ("page", "int"), ("frame", "int"), ("victim", "int"), ("hit", "bool"),
+    ("algorithm", ("fifo", "lru", "opt")),
+])
+register_schema(30, "deadlock", ("request", "release", "select"), _POINTER + [
+    ("process", "int"), ("resource", "int"), ("amount", "int"), ("granted", "bool"),
+])
+register_schema(40, "io-management", ("seek", "request", "select"), _POINTER + [
+    ("cylinder", "int"), ("head", "int"), ("distance", "int"),
+    ("algorithm", ("fcfs", "sstf", "scan", "cscan", "look", "clook")),
+])
+register_schema(50, "file-system", ("create", "delete", "open", "move", "select"), _POINTER + [
+    ("path", "str"), ("name", "str"), ("is_dir", "bool"), ("size", "int"),
+])
+register_schema(60, "process-sync", ("acquire", "release", "wait", "signal", "select"), _POINTER + [
+    ("process", "str"), ("semaphore", "str"), ("value", "int"),
+])
+
+
+# ============ 基本类型 ============
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fits(kind: Any, value: Any) -> bool:
+    """值能否按类型无损打包（bool 不能当作 int）"""
+    if kind == "int":
+        return type(value) is int and -(1 << 63) <= value < (1 << 63)
+    if kind == "float":
+        return type(value) is float
+    if kind == "bool":
+        return type(value) is bool
+    if kind == "str":
+        return type(value) is str
+    return type(value) is str and value in kind
+
+
+def _pack(out: bytearray, kind: Any, value: Any):
+    if kind == "int":
+        _write_varint(out, (value << 1) ^ (value >> 63))
+    elif kind == "float":
+        out += _FLOAT.pack(value)
+    elif kind == "bool":
+        out.append(1 if value else 0)
+    elif kind == "str":
+        raw = value.encode("utf-8", "surrogatepass")
+        _write_varint(out, len(raw))
+        out += raw
+    else:
+        _write_varint(out, kind.index(value))
+
+
+def _unpack(data: bytes, pos: int, kind: Any) -> Tuple[Any, int]:
+    if kind == "int":
+        value, pos = _read_varint(data, pos)
+        return (value >> 1) ^ -(value & 1), pos
+    if kind == "float":
+        return _FLOAT.unpack_from(data, pos)[0], pos + _FLOAT.size
+    if kind == "bool":
+        return data[pos] == 1, pos + 1
+    if kind == "str":
+        length, pos = _read_varint(data, pos)
+        return data[pos:pos + length].decode("utf-8", "surrogatepass"), pos + length
+    index, pos = _read_varint(data, pos)
+    return kind[index], pos
+
+
+def _dump_extra(value: Any) -> Tuple[bytes, int]:
+    if msgpack is not None:
+        try:
+            return msgpack.packb(value, use_bin_type=True), FLAG_MSGPACK
+        except (TypeError, ValueError, OverflowError):
+            # 包括含单独代理字符的字符串（UnicodeEncodeError）
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8", "surrogatepass"), 0
+
+
+def _load_extra(data: bytes, flags: int) -> Any:
+    if flags & FLAG_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("解码操作数据需要安装 msgpack：pip install msgpack")
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(data.decode("utf-8", "surrogatepass"))
+
+
+# ============ 编解码 ============
+
+class ActionCodec:
+    """操作数据编解码"""
+
+    def __init__(self, enabled: bool = True, compress_min: int = 256, zstd_level: int = 3):
+        self.enabled = enabled
+        self.compress_min = compress_min
+        self.zstd_level = zstd_level
+        self._compressor = zstandard.ZstdCompressor(level=zstd_level) if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def encode(self, game_type: Optional[str], action_type: str, data: Any) -> Optional[bytes]:
+        """编码一次操作的数据，None 仍保存为NULL"""
+        if data is None:
+            return None
+        flags = 0
+        body = bytearray()
+        extra = data
+        schema = find_schema(game_type, action_type) if isinstance(data, dict) else None
+        if schema is not None:
+            packed = [(index, name, kind) for index, (name, kind) in enumerate(schema.fields)
+                      if name in data and _fits(kind, data[name])]
+            if packed:
+                flags |= FLAG_SCHEMA
+                _write_varint(body, schema.schema_id)
+                bitmap = bytearray((len(schema.fields) + 7) // 8)
+                for index, _, _ in packed:
+                    bitmap[index >> 3] |= 1 << (index & 7)
+                body += bitmap
+                for _, name, kind in packed:
+                    _pack(body, kind, data[name])
+                names = {name for _, name, _ in packed}
+                extra = {key: value for key, value in data.items() if key not in names}
+                if not extra:
+                    extra = None
+        if extra is not None:
+            raw, extra_flags = _dump_extra(extra)
+            flags |= FLAG_EXTRA | extra_flags
+            body += raw
+
+        if self._compressor is not None and len(body) >= self.compress_min:
+            compressed = self._compressor.compress(bytes(body))
+            if len(compressed) < len(body):
+                return bytes((flags | FLAG_ZSTD,)) + compressed
+        return bytes((flags,)) + bytes(body)
+
+    def decode(self, payload: Optional[bytes]) -> Any:
+        if payload is None:
+            return None
+        flags = payload[0]
+        data = payload[1:]
+        if flags & FLAG_ZSTD:
+            if self._decompressor is None:
+                raise RuntimeError("解码操作数据需要安装 zstandard：pip install zstandard")
+            data = self._decompressor.decompress(data)
+
+        pos = 0
+        result: Dict[str, Any] = {}
+        if flags & FLAG_SCHEMA:
+            schema_id, pos = _read_varint(data, pos)
+            fields = SCHEMAS[schema_id].fields
+            bitmap = data[pos:pos + (len(fields) + 7) // 8]
+            pos += len(bitmap)
+            for index, (name, kind) in enumerate(fields):
+                if bitmap[index >> 3] & (1 << (index & 7)):
+                    result[name], pos = _unpack(data, pos, kind)
+        if flags & FLAG_EXTRA:
+            extra = _load_extra(bytes(data[pos:]), flags)
+            if not flags & FLAG_SCHEMA:
+                return extra
+            result.update(extra)
+        return result
+
+    def encode_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把队列中的操作转换为ActionLog的列：启用编码时写入 payload，否则写入 action_data；
+        单条操作无法编码时该条退回 action_data，不影响同一批的其他操作"""
+        encoded = []
+        for row in rows:
+            data = row.get("action_data")
+            values = {"raw_data": data, "payload": None}
+            if self.enabled:
+                try:
+                    values = {"raw_data": None,
+                              "payload": self.encode(row.get("game_type"), row["action_type"], data)}
+                except (TypeError, ValueError, OverflowError) as e:
+                    print(f"操作数据编码失败，按JSON保存: {e}")
+            encoded.append({
+                "session_id": row["session_id"],
+                "action_type": row["action_type"],
+                "timestamp": row.get("timestamp"),
+                **values,
+            })
+        return encoded
+
+
+# 全局实例
+action_codec = ActionCodec(
+    enabled=os.getenv("ACTION_PAYLOAD_ENCODING", "true").lower() in ("1", "true", "yes"),
+    compress_min=int(os.getenv("ACTION_PAYLOAD_COMPRESS_MIN") or 256),
+    zstd_level=int(os.getenv("ACTION_PAYLOAD_ZSTD_LEVEL") or 3),
+)
@@ -0,0 +1,239 @@
+"""
+AI响应缓存
+以规范化后的提示输入作为键，缓存模型返回的文本，支持TTL与LRU淘汰
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+_PUNCTUATION = "?？!！。.,，~～ "
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """规范化文本：全半角统一、小写、合并空白、去掉首尾标点"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(_PUNCTUATION)
+
+
+def make_cache_key(kind: str, **parts: Any) -> str:
+    """根据请求类型和规范化输入生成缓存键"""
+    normalized = {
+        name: normalize_text(value) if isinstance(value, str) else value
+        for name, value in parts.items()
+    }
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+
+
+class MemoryCacheBackend:
+    """进程内LRU缓存，按条目数和字节数双重限制"""
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value, size = item
+            if expires_at < time.time():
+                del self._data[key]
+                self._bytes -= size
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (time.time() + ttl, value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class SQLiteCacheBackend:
+    """磁盘SQLite缓存，服务重启后仍然有效"""
+
+    def __init__(self, path: str, max_entries: int = 50000,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_ai_cache_accessed_at ON ai_cache (accessed_at)"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM ai_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE ai_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + ttl, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM ai_cache WHERE expires_at < ?", (now,))
+        entries, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_cache"
+        ).fetchone()
+        while entries > self.max_entries or total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM ai_cache ORDER BY accessed_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM ai_cache WHERE key = ?", (row[0],))
+            entries -= 1
+            total -= row[1]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ai_cache")
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_cache"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": entries,
+            "bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class AICache:
+    """AI响应缓存，统计命中率"""
+
+    def __init__(self, backend, ttl: float = 3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, ttl: float = None):
+        self.backend.set(key, value, self.ttl if ttl is None else ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "ttl": self.ttl,
+            **self.backend.info(),
+        }
+
+
+def create_ai_cache() -> Optional[AICache]:
+    """根据环境变量创建缓存，AI_CACHE_BACKEND=none 时关闭缓存"""
+    backend_name = os.getenv("AI_CACHE_BACKEND", "memory").lower()
+    if backend_name in ("none", "off", "disabled"):
+        return None
+
+    max_entries = int(os.getenv("AI_CACHE_MAX_ENTRIES", 5000))
+    max_bytes = int(os.getenv("AI_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+    if backend_name == "sqlite":
+        backend = SQLiteCacheBackend(
+            os.getenv("AI_CACHE_PATH", "database/ai_cache.db"),
+            max_entries=max_entries,
+            max_bytes=max_bytes
+        )
+    else:
+        backend = MemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
+
+    return AICache(backend, ttl=float(os.getenv("AI_CACHE_TTL", 3600)))
@@ -0,0 +1,57 @@
+"""
+有界线程池
+同步的数据库访问和AI调用分别放入独立线程池执行，避免阻塞事件循环，
+也避免慢速AI调用占满数据库访问所需的线程
+"""
+
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator
+
+db_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_EXECUTOR_WORKERS", 8)),
+    thread_name_prefix="db-worker"
+)
+ai_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AI_EXECUTOR_WORKERS", 16)),
+    thread_name_prefix="ai-worker"
+)
+
+
+async def _run(executor: ThreadPoolExecutor, func: Callable, *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    # 复制上下文，使contextvars在线程池中仍然可见
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(ctx.run, func, *args, **kwargs))
+
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """在数据库线程池中执行同步函数"""
+    return await _run(db_executor, func, *args, **kwargs)
+
+
+async def run_ai(func: Callable, *args, **kwargs) -> Any:
+    """在AI线程池中执行同步函数"""
+    return await _run(ai_executor, func, *args, **kwargs)
+
+
+async def iterate_ai(iterator: Iterator) -> AsyncIterator:
+    """在AI线程池中逐项迭代同步迭代器（用于流式响应）"""
+    done = object()
+    try:
+        while True:
+            item = await run_ai(next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            try:
+                close()
+            except ValueError:
+                # 迭代器仍在线程池中执行（请求被取消），由其自行结束
+                pass
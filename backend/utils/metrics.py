@@ -0,0 +1,240 @@
+"""
+运行指标
+请求耗时、数据库查询次数与耗时、AI调用耗时与token用量，以Prometheus文本格式输出
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """分桶直方图"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key in sorted(self._counts):
+                counts = self._counts[key]
+                for bound, count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {counts[-1]}")
+                plain = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{plain} {self._sums[key]}")
+                lines.append(f"{self.name}_count{plain} {counts[-1]}")
+        return lines
+
+
+# 采集函数返回 (指标名, 类型, 说明, [(标签, 值)])
+Collector = Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector):
+        """注册在输出时才读取数值的采集函数（如队列深度）"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"采集指标失败: {e}")
+                continue
+            for name, metric_type, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_format_labels(names, [labels[n] for n in names])} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# ============ HTTP ============
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP请求数", ("method", "route", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP请求耗时", ("method", "route"))
+
+# ============ 数据库 ============
+db_queries_total = registry.counter("db_queries_total", "数据库查询次数")
+db_query_duration = registry.histogram("db_query_duration_seconds", "单条SQL耗时")
+db_queries_per_request = registry.histogram(
+    "db_queries_per_request", "单个HTTP请求内的SQL条数（用于发现N+1查询）", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+
+# ============ AI ============
+ai_calls_total = registry.counter("ai_calls_total", "AI调用次数", ("kind", "outcome"))
+ai_call_duration = registry.histogram(
+    "ai_call_duration_seconds", "AI调用耗时", ("kind",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0))
+ai_tokens_total = registry.counter("ai_tokens_total", "AI调用消耗的token", ("kind", "type"))
+
+
+# ============ 请求级统计 ============
+
+@dataclass
+class RequestStats:
+    """单个请求内的数据库统计"""
+    queries: int = 0
+    query_time: float = 0.0
+
+
+@dataclass
+class TokenUsage:
+    """一次业务调用内累计的token用量"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+
+    def add(self, usage):
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        self.total_tokens += getattr(usage, "total_tokens", 0) or 0
+
+
+# 线程池通过 contextvars.copy_context 继承这些变量，统计对象本身是共享的
+current_request_stats: contextvars.ContextVar[Optional[RequestStats]] = \
+    contextvars.ContextVar("current_request_stats", default=None)
+current_token_usage: contextvars.ContextVar[Optional[TokenUsage]] = \
+    contextvars.ContextVar("current_token_usage", default=None)
+
+
+@contextmanager
+def track_token_usage() -> Iterator[TokenUsage]:
+    """统计代码块内所有AI调用的token用量"""
+    usage = TokenUsage()
+    token = current_token_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_token_usage.reset(token)
+
+
+def record_ai_call(kind: str, outcome: str, duration: float, usage=None):
+    """记录一次AI调用的耗时和token"""
+    ai_calls_total.inc(kind=kind, outcome=outcome)
+    ai_call_duration.observe(duration, kind=kind)
+    if usage is not None:
+        ai_tokens_total.inc(getattr(usage, "prompt_tokens", 0) or 0, kind=kind, type="prompt")
+        ai_tokens_total.inc(getattr(usage, "completion_tokens", 0) or 0, kind=kind, type="completion")
+        tracked = current_token_usage.get()
+        if tracked is not None:
+            tracked.add(usage)
+
+
+def instrument_engine(engine):
+    """注册SQLAlchemy事件，统计查询次数和耗时"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_queries_total.inc()
+        db_query_duration.observe(elapsed)
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
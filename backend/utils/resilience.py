@@ -0,0 +1,297 @@
+"""
+上游调用保护
+并发上限、单次调用截止时间、带抖动的重试（受全局重试预算限制）与熔断器。
+上游变慢或出错时快速失败，避免工作线程全部卡在等待模型响应上。
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class UpstreamUnavailable(Exception):
+    """上游当前不可用（熔断打开、并发已满或超过截止时间），调用方应使用降级结果"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def is_retryable(error: Exception) -> bool:
+    """连接错误、超时、限流和5xx可以重试，其余4xx是请求本身的问题"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status is None or status in (408, 429) or status >= 500
+
+
+class RetryBudget:
+    """全局重试预算：每次请求存入ratio个令牌，每次重试消耗一个
+
+    上游整体故障时重试量最多是正常请求量的ratio倍，不会把故障放大成重试风暴。
+    min_per_second 保证低流量时仍有少量重试机会。
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.max_tokens,
+                           self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_request(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"tokens": round(self._tokens, 2), "retries": self.retries,
+                    "exhausted": self.exhausted}
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后打开，冷却后放行一个探测请求（半开）"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """是否允许发起调用；半开状态只放行一个探测请求"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """调用因非上游原因（如请求参数错误）结束时释放探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures,
+                    "opened": self.opened, "rejected": self.rejected}
+
+
+class HeldStream:
+    """流式响应：读完、出错或关闭之前一直占用并发名额"""
+
+    def __init__(self, stream: Any, release: Callable[[], None]):
+        self._source = stream
+        self._stream: Iterator = iter(stream)
+        self._release = release
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            close = getattr(self._source, "close", None)
+            if close:
+                close()
+        finally:
+            self._release()
+
+    def __del__(self):
+        # 调用方没有读完也没有关闭时，回收前释放名额
+        self.close()
+
+
+class UpstreamGuard:
+    """组合并发上限、截止时间、重试预算和熔断器"""
+
+    def __init__(self, max_concurrency: int = 8, deadline: float = 20.0,
+                 attempt_timeout: float = 15.0, max_attempts: int = 3,
+                 backoff_base: float = 0.2, backoff_max: float = 2.0,
+                 budget: Optional[RetryBudget] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline_at: float):
+        """占用一个并发名额，等待不超过截止时间"""
+        if not self._semaphore.acquire(timeout=max(0.0, deadline_at - time.monotonic())):
+            raise UpstreamUnavailable("concurrency")
+        with self._lock:
+            self._active += 1
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._semaphore.release()
+
+    def backoff(self, attempt: int) -> float:
+        """全抖动指数退避"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, fn: Callable[[float], Any], on_retry: Optional[Callable[[Exception], None]] = None,
+             stream: bool = False) -> Any:
+        """调用 fn(timeout)；timeout 为本次尝试可用的秒数
+
+        熔断打开、并发名额等待超时或超过截止时间时抛出 UpstreamUnavailable，
+        最后一次尝试的上游异常原样抛出。
+        stream=True 时 fn 返回流式响应，返回的 HeldStream 读完或关闭后才释放并发名额。
+        """
+        deadline_at = time.monotonic() + self.deadline
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("circuit_open")
+        self.budget.record_request()
+
+        try:
+            self.acquire(deadline_at)
+        except UpstreamUnavailable:
+            self.breaker.release()
+            raise
+        held = False
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    self.breaker.record_failure()
+                    raise UpstreamUnavailable("deadline")
+                try:
+                    result = fn(min(self.attempt_timeout, remaining))
+                except Exception as e:
+                    if not is_retryable(e):
+                        self.breaker.release()
+                        raise
+                    attempt += 1
+                    delay = self.backoff(attempt)
+                    if (attempt >= self.max_attempts
+                            or time.monotonic() + delay >= deadline_at
+                            or not self.budget.try_spend()):
+                        self.breaker.record_failure()
+                        raise
+                    if on_retry:
+                        on_retry(e)
+                    time.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                if stream:
+                    held = True
+                    return HeldStream(result, self.release)
+                return result
+        finally:
+            if not held:
+                self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = self._active
+        return {
+            "active": active,
+            "max_concurrency": self.max_concurrency,
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.budget.stats(),
+        }
+
+
+def create_upstream_guard() -> UpstreamGuard:
+    """根据环境变量创建AI调用保护"""
+    return UpstreamGuard(
+        max_concurrency=int(os.getenv("AI_MAX_CONCURRENCY", "8")),
+        deadline=float(os.getenv("AI_CALL_DEADLINE", "20")),
+        attempt_timeout=float(os.getenv("AI_ATTEMPT_TIMEOUT", "15")),
+        max_attempts=int(os.getenv("AI_MAX_ATTEMPTS", "3")),
+        backoff_base=float(os.getenv("AI_RETRY_BACKOFF", "0.2")),
+        backoff_max=float(os.getenv("AI_RETRY_BACKOFF_MAX", "2")),
+        budget=RetryBudget(
+            ratio=float(os.getenv("AI_RETRY_BUDGET_RATIO", "0.2")),
+            min_per_second=float(os.getenv("AI_RETRY_BUDGET_MIN_PER_SECOND", "1")),
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("AI_BREAKER_FAILURES", "5")),
+            recovery_timeout=float(os.getenv("AI_BREAKER_RECOVERY", "30")),
+        ),
+    )
@@ -0,0 +1,179 @@
+"""
+进程间共享状态
+多worker部署时，各进程的模块全局变量互不可见。需要跨进程一致的少量状态
+（键值、计数器、后台任务租约）放在这里：
+- memory: 进程内实现，单进程运行时使用
+- sqlite: 本机所有worker共享的SQLite文件（WAL模式），相当于本地的Redis替代品
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+def _owner() -> str:
+    # fork之后进程号会变，每次调用时重新取
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MemorySharedState:
+    """进程内实现"""
+
+    backend = "memory"
+
+    def __init__(self):
+        self._kv: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._counters: Dict[str, int] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._kv.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._kv[key]
+                return default
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._kv[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._kv.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            return self._counters[key]
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        """获取或续期租约；其他持有者的租约未过期时返回False"""
+        owner, now = _owner(), time.time()
+        with self._lock:
+            current = self._leases.get(name)
+            if current and current[0] != owner and current[1] > now:
+                return False
+            self._leases[name] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, name: str):
+        with self._lock:
+            current = self._leases.get(name)
+            if current and current[0] == _owner():
+                del self._leases[name]
+
+
+class SQLiteSharedState:
+    """基于SQLite文件的跨进程实现"""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个进程使用自己的连接（fork前打开的连接不能在子进程中继续使用）"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                   check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv ("
+                         "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters ("
+                         "key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases ("
+                         "name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value, expires_at FROM kv WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl if ttl else None)
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            return self._connection().execute(
+                "INSERT INTO counters (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value RETURNING value",
+                (key, amount)
+            ).fetchone()[0]
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM counters WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        """获取或续期租约；其他持有者的租约未过期时返回False"""
+        now = time.time()
+        with self._lock:
+            cursor = self._connection().execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+                (name, _owner(), now + ttl, now)
+            )
+            return cursor.rowcount > 0
+
+    def release_lease(self, name: str):
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM leases WHERE name = ? AND owner = ?", (name, _owner())
+            )
+
+
+def worker_count() -> int:
+    """配置的worker进程数"""
+    return max(1, int(os.getenv("WORKERS") or 1))
+
+
+def create_shared_state():
+    """根据环境变量创建共享状态，未指定时多worker使用sqlite、单进程使用memory"""
+    backend = os.getenv("SHARED_STATE_BACKEND", "").lower()
+    if not backend:
+        backend = "sqlite" if worker_count() > 1 else "memory"
+    if backend == "sqlite":
+        return SQLiteSharedState(os.getenv("SHARED_STATE_PATH", "database/shared_state.db"))
+    return MemorySharedState()
+
+
+# 全局实例
+shared_state = create_shared_state()
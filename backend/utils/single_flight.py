@@ -0,0 +1,75 @@
+"""
+请求合并（single-flight）
+相同键的并发请求只触发一次上游调用，结果分发给所有等待者；
+结果在短时间窗口内继续复用，吸收同一时刻涌入的重复请求。
+share 判定为不可共享的结果（如降级提示）既不复用也不分发，等待者各自重新调用。
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """合并相同键的并发异步调用"""
+
+    def __init__(self, name: str, result_window: float = 2.0, max_recent: int = 1024,
+                 share: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.result_window = result_window
+        self.max_recent = max_recent
+        self.share = share or (lambda result: True)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._recent: Dict[str, Tuple[float, Any]] = {}
+
+        # 统计计数
+        self.leaders = 0      # 实际发起的上游调用
+        self.coalesced = 0    # 等待进行中的调用
+        self.window_hits = 0  # 命中结果窗口
+        self.unshared = 0     # 等待者收到不可共享的结果后自行调用
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """执行func，相同key的并发调用共享同一结果；返回 (结果, 是否为共享的结果)"""
+        recent = self._recent.get(key)
+        if recent is not None:
+            if recent[0] > time.monotonic():
+                self.window_hits += 1
+                return recent[1], True
+            self._recent.pop(key, None)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            # 上游调用放在独立任务中执行，发起者断开连接不会影响其他等待者
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            return await asyncio.shield(task), False
+
+        self.coalesced += 1
+        result = await asyncio.shield(task)
+        if self.share(result):
+            return result, True
+        self.unshared += 1
+        return await func(), False
+
+    def _finish(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self.result_window > 0 and self.share(task.result()):
+            now = time.monotonic()
+            if len(self._recent) >= self.max_recent:
+                self._recent = {k: v for k, v in self._recent.items() if v[0] > now}
+            if len(self._recent) < self.max_recent:
+                self._recent[key] = (now + self.result_window, task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "window_hits": self.window_hits,
+            "unshared": self.unshared,
+            "inflight": len(self._inflight),
+        }
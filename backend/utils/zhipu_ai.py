@@ -3,11 +3,32 @@
 """
 
 import os
-from typing import Dict, Any, List
-from zhipuai import ZhipuAI
-from dotenv import load_dotenv
+import json
+import threading
+import time
+from typing import Dict, Any, List, Iterator, Optional
 
-load_dotenv()
+from utils.ai_cache import create_ai_cache, make_cache_key, normalize_text
+from utils.metrics import ai_calls_total, record_ai_call
+from utils.resilience import UpstreamUnavailable, create_upstream_guard
+
+# 提示缓存键使用的游戏状态字段（不同页面使用的字段名不同）
+HINT_KEY_FIELDS = ("topic", "game", "game_stage", "stage", "level", "algorithm", "strategy", "mode")
+
+# 降级时返回的文本，不应缓存或分享给其他请求
+UNAVAILABLE_MESSAGE = "AI暂时无法响应，请稍后再试"
+NOT_CONFIGURED_MESSAGE = "AI服务未配置，请设置ZHIPUAI_API_KEY环境变量"
+FALLBACK_MESSAGES = (UNAVAILABLE_MESSAGE, NOT_CONFIGURED_MESSAGE)
+
+
+def _strip_code_fence(text: str) -> str:
+    """去掉模型常加的 ```json 代码块标记"""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
 
 
 class ZhipuAIService:
@@ -16,29 +37,153 @@ class ZhipuAIService:
     def __init__(self):
         self.api_key = os.getenv("ZHIPUAI_API_KEY")
         self.model = os.getenv("ZHIPUAI_MODEL", "glm-4")
-        self.client = ZhipuAI(api_key=self.api_key) if self.api_key else None
+        self.guard = create_upstream_guard()
+        self.cache = create_ai_cache()
+        # SDK导入较慢，客户端在第一次调用AI时才创建
+        self._client = None
+        self._client_ready = False
+        self._client_lock = threading.Lock()
 
-    def _call_ai(self, prompt: str, temperature: float = 0.7) -> str:
-        """调用智谱AI"""
-        if not self.client:
-            return "AI服务未配置，请设置ZHIPUAI_API_KEY环境变量"
+    @property
+    def client(self):
+        if not self._client_ready:
+            with self._client_lock:
+                if not self._client_ready:
+                    if self.api_key:
+                        from zhipuai import ZhipuAI
+                        # 重试由 guard 按预算控制，关闭SDK自带的重试
+                        self._client = ZhipuAI(
+                            api_key=self.api_key, timeout=self.guard.attempt_timeout, max_retries=0
+                        )
+                    self._client_ready = True
+        return self._client
 
-        try:
-            response = self.client.chat.completions.create(
+    @client.setter
+    def client(self, value):
+        """替换客户端（压测使用桩客户端）"""
+        self._client = value
+        self._client_ready = True
+
+    def _create(self, prompt: str, temperature: float, kind: str, stream: bool = False):
+        """经过并发上限、截止时间、重试和熔断保护的模型调用；流式响应读完或关闭前占用并发名额"""
+        return self.guard.call(
+            lambda timeout: self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "user", "content": prompt}
                 ],
-                temperature=temperature
-            )
-            return response.choices[0].message.content
+                temperature=temperature,
+                stream=stream,
+                timeout=timeout
+            ),
+            on_retry=lambda e: ai_calls_total.inc(kind=kind, outcome="retry"),
+            stream=stream
+        )
+
+    def _call_ai(self, prompt: str, temperature: float = 0.7,
+                 cache_key: Optional[str] = None, kind: str = "chat") -> str:
+        """调用智谱AI，提供cache_key时优先读取缓存，仅缓存成功的响应"""
+        if cache_key and self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        if not self.client:
+            return NOT_CONFIGURED_MESSAGE
+
+        started = time.perf_counter()
+        try:
+            response = self._create(prompt, temperature, kind)
+            content = response.choices[0].message.content
+        except UpstreamUnavailable as e:
+            # 熔断打开或排队超时：不再等待上游，直接降级
+            record_ai_call(kind, e.reason, time.perf_counter() - started)
+            return UNAVAILABLE_MESSAGE
         except Exception as e:
+            record_ai_call(kind, "error", time.perf_counter() - started)
             print(f"AI调用失败: {str(e)}")
-            return "AI暂时无法响应，请稍后再试"
+            return UNAVAILABLE_MESSAGE
 
-    def get_hint(self, game_state: Dict[str, Any], error_history: List[Dict]) -> str:
-        """生成智能提示"""
-        prompt = f"""你是字节叔，一位智慧的乡村管理员和操作系统导师。
+        record_ai_call(kind, "ok", time.perf_counter() - started, getattr(response, "usage", None))
+
+        if cache_key and self.cache:
+            self.cache.set(cache_key, content)
+        return content
+
+    def _stream_ai(self, prompt: str, temperature: float = 0.7,
+                   cache_key: Optional[str] = None, kind: str = "chat") -> Iterator[str]:
+        """流式调用智谱AI，逐段返回模型输出；完整结果写入缓存"""
+        if cache_key and self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        if not self.client:
+            yield NOT_CONFIGURED_MESSAGE
+            return
+
+        parts = []
+        usage = None
+        started = time.perf_counter()
+        try:
+            # 重试只发生在建立连接阶段，开始输出后不再重试
+            response = self._create(prompt, temperature, kind, stream=True)
+        except UpstreamUnavailable as e:
+            record_ai_call(kind, e.reason, time.perf_counter() - started)
+            yield UNAVAILABLE_MESSAGE
+            return
+        except Exception as e:
+            record_ai_call(kind, "error", time.perf_counter() - started)
+            print(f"AI流式调用失败: {str(e)}")
+            yield UNAVAILABLE_MESSAGE
+            return
+
+        try:
+            for chunk in response:
+                # 用量信息在最后一个分片中返回
+                usage = getattr(chunk, "usage", None) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            # 连接建立后中途断开同样计入熔断
+            self.guard.breaker.record_failure()
+            record_ai_call(kind, "error", time.perf_counter() - started)
+            print(f"AI流式调用失败: {str(e)}")
+            if not parts:
+                yield UNAVAILABLE_MESSAGE
+            return
+        finally:
+            # 调用方提前停止读取时同样释放并发名额
+            response.close()
+
+        record_ai_call(kind, "ok", time.perf_counter() - started, usage)
+
+        if cache_key and self.cache and parts:
+            self.cache.set(cache_key, "".join(parts))
+
+    # ============ 缓存键 ============
+
+    def hint_cache_key(self, game_state: Dict[str, Any], error_history: List[Dict]) -> str:
+        """提示缓存键：主题、关卡、难度等关键字段 + 出现过的错误类型"""
+        error_types = sorted({
+            normalize_text(error.get("error_type") or error.get("type") or "")
+            for error in (error_history or []) if isinstance(error, dict)
+        })
+        return make_cache_key(
+            "hint",
+            **{field: game_state.get(field) for field in HINT_KEY_FIELDS},
+            errors=error_types
+        )
+
+    def question_cache_key(self, question: str, context: str = "") -> str:
+        """问答缓存键：规范化后的问题和上下文"""
+        return make_cache_key("question", question=question, context=context or "")
+
+    def _hint_prompt(self, game_state: Dict[str, Any], error_history: List[Dict]) -> str:
+        return f"""你是字节叔，一位智慧的乡村管理员和操作系统导师。
 玩家正在学习{game_state.get('topic', '操作系统')}，目前在{game_state.get('game_stage', '某个关卡')}阶段遇到了困难。
 
 玩家当前状态：
@@ -50,7 +195,19 @@ class ZhipuAIService:
 请用乡村生活的比喻，给出一个简洁友好的提示（不超过50字），
 帮助玩家理解概念，但不要直接告诉答案。保持字节叔亲切、幽默的风格。"""
 
-        return self._call_ai(prompt, temperature=0.8)
+    def get_hint(self, game_state: Dict[str, Any], error_history: List[Dict]) -> str:
+        """生成智能提示"""
+        return self._call_ai(
+            self._hint_prompt(game_state, error_history), temperature=0.8,
+            cache_key=self.hint_cache_key(game_state, error_history), kind="hint"
+        )
+
+    def stream_hint(self, game_state: Dict[str, Any], error_history: List[Dict]) -> Iterator[str]:
+        """流式生成智能提示"""
+        return self._stream_ai(
+            self._hint_prompt(game_state, error_history), temperature=0.8,
+            cache_key=self.hint_cache_key(game_state, error_history), kind="hint"
+        )
 
     def get_feedback(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
         """生成个性化反馈"""
@@ -72,10 +229,9 @@ class ZhipuAIService:
 
 语气要亲切鼓励，用乡村生活比喻。"""
 
-        response = self._call_ai(prompt, temperature=0.7)
+        response = self._call_ai(prompt, temperature=0.7, kind="feedback")
         # 尝试解析JSON响应
         try:
-            import json
             return json.loads(response)
         except:
             # 如果AI返回的不是JSON，返回默认结构
@@ -86,9 +242,8 @@ class ZhipuAIService:
                 "next_steps": ["继续下一关"]
             }
 
-    def answer_question(self, question: str, context: str = "") -> str:
-        """回答玩家问题"""
-        prompt = f"""你是字节叔，智慧乡村的管理员兼操作系统导师。
+    def _question_prompt(self, question: str, context: str = "") -> str:
+        return f"""你是字节叔，智慧乡村的管理员兼操作系统导师。
 玩家提出了关于操作系统的问题："{question}"。
 当前上下文：{context if context else '玩家正在学习操作系统'}。
 
@@ -96,10 +251,24 @@ class ZhipuAIService:
 保持字节叔亲切、幽默、知识渊博的人设。
 回答不超过100字。"""
 
-        return self._call_ai(prompt, temperature=0.8)
+    def answer_question(self, question: str, context: str = "") -> str:
+        """回答玩家问题"""
+        return self._call_ai(
+            self._question_prompt(question, context), temperature=0.8,
+            cache_key=self.question_cache_key(question, context), kind="question"
+        )
+
+    def stream_answer(self, question: str, context: str = "") -> Iterator[str]:
+        """流式回答玩家问题"""
+        return self._stream_ai(
+            self._question_prompt(question, context), temperature=0.8,
+            cache_key=self.question_cache_key(question, context), kind="question"
+        )
 
-    def generate_quiz(self, player_level: str, topic: str) -> Dict[str, Any]:
-        """生成练习题"""
+    def generate_quiz(self, player_level: str, topic: str,
+                      fallback: bool = True) -> Optional[Dict[str, Any]]:
+        """生成练习题，fallback=False 时解析失败返回None；
+        每次调用都请求模型（不缓存），同一主题和水平得到不同的题目"""
         prompt = f"""你是字节叔，需要为玩家生成一道关于{topic}的练习题。
 玩家当前水平：{player_level}（初级/中级/高级）
 
@@ -119,18 +288,22 @@ class ZhipuAIService:
 
 注意：只返回JSON，不要有其他文字。"""
 
-        response = self._call_ai(prompt, temperature=0.9)
+        response = self._call_ai(prompt, temperature=0.9, kind="quiz")
         try:
-            import json
-            return json.loads(response)
+            return json.loads(_strip_code_fence(response))
         except:
-            # 返回一个默认题目
-            return {
-                "question": f"在智慧乡村中，{topic}类似于什么？",
-                "options": ["选项A", "选项B", "选项C", "选项D"],
-                "correct_answer": "A",
-                "explanation": "这是基础知识，请认真学习！"
-            }
+            if not fallback:
+                return None
+            return self.fallback_quiz(topic)
+
+    def fallback_quiz(self, topic: str) -> Dict[str, Any]:
+        """默认题目"""
+        return {
+            "question": f"在智慧乡村中，{topic}类似于什么？",
+            "options": ["选项A", "选项B", "选项C", "选项D"],
+            "correct_answer": "A",
+            "explanation": "这是基础知识，请认真学习！"
+        }
 
 
 # 全局实例
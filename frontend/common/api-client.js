@@ -3,10 +3,189 @@
  * 封装所有后端API调用
  */
 
+/**
+ * 游戏会话的WebSocket通道
+ * 消息为紧凑的JSON数组，格式见 backend/services/game_channel.py。
+ * 每条消息带递增的序号，断线后自动重连，并从服务端已确认的序号之后按顺序重发。
+ */
+class GameSocket {
+    constructor(url, sessionID) {
+        this.url = url;
+        this.sessionID = sessionID;
+        this.seq = 0;
+        // 等待确认的操作和等待回复的请求（提示、结束游戏）
+        this.unackedActions = [];
+        this.requests = new Map();
+
+        this.socket = null;
+        this.ready = false;
+        this.closed = false;
+        this.retryDelay = 500;
+        this.maxRetryDelay = 10000;
+        this.heartbeatTimer = null;
+
+        this.connect();
+    }
+
+    connect() {
+        const socket = new WebSocket(this.url);
+        this.socket = socket;
+        socket.onmessage = (event) => this.onMessage(JSON.parse(event.data));
+        socket.onclose = (event) => this.onClose(event);
+    }
+
+    onMessage(message) {
+        const [type, seq] = message;
+        if (type === 'w') {
+            // 连接建立：丢弃已确认的操作，其余消息按序号重发
+            this.ready = true;
+            this.retryDelay = 500;
+            this.seq = Math.max(this.seq, seq);
+            this.ack(seq);
+            this.startHeartbeat(message[2]);
+            this.resend();
+        } else if (type === 'k') {
+            this.ack(seq);
+        } else if (type === 'h') {
+            this.settle(seq, { hint: message[2], character: '字节叔' });
+        } else if (type === 'e') {
+            this.settle(seq, {
+                message: '游戏已结束',
+                final_score: message[2],
+                stars: message[3],
+                validated: message[4]
+            });
+        } else if (type === 'x') {
+            this.fail(seq, message[2], message[3]);
+        }
+    }
+
+    onClose(event) {
+        this.ready = false;
+        this.stopHeartbeat();
+        if (this.closed || event.code === 4404) {
+            this.closed = true;
+            this.rejectAll(new Error(event.reason || '连接已关闭'));
+            return;
+        }
+        // 指数退避重连，期间的消息先缓存
+        setTimeout(() => this.connect(), this.retryDelay);
+        this.retryDelay = Math.min(this.retryDelay * 2, this.maxRetryDelay);
+    }
+
+    startHeartbeat(interval) {
+        this.stopHeartbeat();
+        this.heartbeatTimer = setInterval(() => this.write(['p']), interval * 1000);
+    }
+
+    stopHeartbeat() {
+        if (this.heartbeatTimer) {
+            clearInterval(this.heartbeatTimer);
+            this.heartbeatTimer = null;
+        }
+    }
+
+    write(message) {
+        if (this.ready && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify(message));
+        }
+    }
+
+    resend() {
+        const messages = this.unackedActions.map(item => item.message)
+            .concat([...this.requests.values()].map(item => item.message));
+        messages.sort((a, b) => a[1] - b[1]).forEach(message => this.write(message));
+    }
+
+    send(message, register) {
+        if (this.closed) {
+            return Promise.reject(new Error('连接已关闭'));
+        }
+        return new Promise((resolve, reject) => {
+            register({ seq: message[1], message, resolve, reject });
+            this.write(message);
+        });
+    }
+
+    ack(seq) {
+        while (this.unackedActions.length && this.unackedActions[0].seq <= seq) {
+            this.unackedActions.shift().resolve({ success: true, message: '操作已记录' });
+        }
+    }
+
+    settle(seq, result) {
+        const request = this.requests.get(seq);
+        if (request) {
+            this.requests.delete(seq);
+            request.resolve(result);
+        }
+    }
+
+    fail(seq, status, detail) {
+        const error = new Error(detail || '请求失败');
+        error.status = status;
+        const request = this.requests.get(seq);
+        if (request) {
+            this.requests.delete(seq);
+            request.reject(error);
+            return;
+        }
+        // 格式错误（400）或会话已结束（409）的操作不会被确认；队列已满（503）时服务端会断开，重连后重发
+        const index = this.unackedActions.findIndex(item => item.seq === seq);
+        if (index !== -1 && (status === 400 || status === 409)) {
+            this.unackedActions.splice(index, 1)[0].reject(error);
+        }
+    }
+
+    rejectAll(error) {
+        this.unackedActions.splice(0).forEach(item => item.reject(error));
+        this.requests.forEach(item => item.reject(error));
+        this.requests.clear();
+    }
+
+    recordAction(actionType, actionData = null) {
+        return this.send(['a', ++this.seq, actionType, actionData, Date.now()],
+                         item => this.unackedActions.push(item));
+    }
+
+    getHint(gameState, errorHistory = null) {
+        return this.send(['h', ++this.seq, gameState, errorHistory],
+                         item => this.requests.set(item.seq, item));
+    }
+
+    endGame(score, stars, completed, submission = null) {
+        return this.send(['e', ++this.seq, score, stars, completed, submission],
+                         item => this.requests.set(item.seq, item));
+    }
+
+    close() {
+        this.closed = true;
+        this.stopHeartbeat();
+        if (this.socket) {
+            this.socket.close(1000);
+        }
+    }
+}
+
 class APIClient {
     constructor(baseURL = 'http://localhost:8000') {
         this.baseURL = baseURL;
         this.playerID = this.getPlayerID();
+
+        // 开始游戏后通过WebSocket通道发送该会话的操作、提示和结束游戏
+        this.useWebSocket = typeof WebSocket !== 'undefined';
+        this.channel = null;
+
+        // 操作合并发送：攒够一批或到达时间间隔后调用批量接口
+        this.actionBatchSize = 50;
+        this.actionFlushInterval = 1000;
+        this.pendingActions = [];
+        this.actionFlushTimer = null;
+
+        if (typeof window !== 'undefined') {
+            // 页面关闭前发送剩余操作
+            window.addEventListener('beforeunload', () => this.flushActions(true));
+        }
     }
 
     /**
@@ -47,11 +226,79 @@ class APIClient {
         }
     }
 
+    /**
+     * 流式请求方法（SSE）
+     * @param {Function} onDelta - 每收到一段文本时回调
+     * @returns {Promise<string>} 完整文本
+     */
+    async streamRequest(endpoint, body, onDelta = null) {
+        const response = await fetch(`${this.baseURL}${endpoint}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify(body)
+        });
+
+        if (!response.ok) {
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.detail || '请求失败');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        let text = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE事件以空行分隔
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                if (!data) {
+                    continue;
+                }
+
+                const payload = JSON.parse(data);
+                if (eventName === 'error') {
+                    throw new Error(payload.detail || '请求失败');
+                } else if (eventName === 'done') {
+                    text = payload.text;
+                } else {
+                    text += payload.delta;
+                    if (onDelta) {
+                        onDelta(payload.delta, text);
+                    }
+                }
+            }
+        }
+
+        return text;
+    }
+
     /**
      * 开始游戏
      */
     async startGame(gameType, level = 'beginner') {
-        return this.request('/api/game/start', {
+        const result = await this.request('/api/game/start', {
             method: 'POST',
             body: JSON.stringify({
                 player_id: this.playerID,
@@ -59,37 +306,142 @@ class APIClient {
                 level: level
             })
         });
+        if (this.useWebSocket) {
+            this.openGameChannel(result.session_id);
+        }
+        return result;
     }
 
     /**
-     * 记录操作
+     * 打开会话的WebSocket通道，之后该会话的请求都通过通道发送
      */
-    async recordAction(sessionID, actionType, actionData = null) {
-        return this.request('/api/game/action', {
-            method: 'POST',
-            body: JSON.stringify({
-                session_id: sessionID,
-                action_type: actionType,
-                action_data: actionData
-            })
+    openGameChannel(sessionID) {
+        this.closeGameChannel();
+        const url = this.baseURL.replace(/^http/, 'ws') + `/api/game/ws/${encodeURIComponent(sessionID)}`;
+        this.channel = new GameSocket(url, sessionID);
+        return this.channel;
+    }
+
+    closeGameChannel() {
+        if (this.channel) {
+            this.channel.close();
+            this.channel = null;
+        }
+    }
+
+    /**
+     * 会话的通道可用时返回通道，否则返回null（使用HTTP接口）
+     */
+    channelFor(sessionID) {
+        const channel = this.channel;
+        return channel && !channel.closed && channel.sessionID === sessionID ? channel : null;
+    }
+
+    /**
+     * 记录操作（合并后批量发送）
+     * actionType为'error'时，actionData.error_type 会按会话累计到错误统计中
+     */
+    recordAction(sessionID, actionType, actionData = null) {
+        const channel = this.channelFor(sessionID);
+        if (channel) {
+            return channel.recordAction(actionType, actionData);
+        }
+        return new Promise((resolve, reject) => {
+            this.pendingActions.push({
+                action: {
+                    session_id: sessionID,
+                    action_type: actionType,
+                    action_data: actionData,
+                    // 批量发送前可能缓存约1秒，记录操作发生的时间
+                    timestamp: new Date().toISOString()
+                },
+                resolve: resolve,
+                reject: reject
+            });
+
+            if (this.pendingActions.length >= this.actionBatchSize) {
+                this.flushActions();
+            } else if (!this.actionFlushTimer) {
+                this.actionFlushTimer = setTimeout(() => this.flushActions(), this.actionFlushInterval);
+            }
         });
     }
 
+    /**
+     * 立即发送缓存的操作
+     * @param {boolean} keepalive - 页面卸载时使用，保证请求在页面关闭后仍能发出
+     */
+    async flushActions(keepalive = false) {
+        if (this.actionFlushTimer) {
+            clearTimeout(this.actionFlushTimer);
+            this.actionFlushTimer = null;
+        }
+        if (this.pendingActions.length === 0) {
+            return;
+        }
+
+        const pending = this.pendingActions;
+        this.pendingActions = [];
+
+        try {
+            const result = await this.request('/api/game/actions/batch', {
+                method: 'POST',
+                keepalive: keepalive,
+                body: JSON.stringify({
+                    actions: pending.map(item => item.action)
+                })
+            });
+            // 会话不存在或已结束而没有记录的操作单独拒绝
+            const rejected = new Set(result.rejected || []);
+            pending.forEach((item, index) => {
+                if (rejected.has(index)) {
+                    item.reject(new Error('游戏会话不存在或已结束'));
+                } else {
+                    item.resolve({ success: result.success, message: result.message });
+                }
+            });
+        } catch (error) {
+            pending.forEach(item => item.reject(error));
+        }
+    }
+
     /**
      * 结束游戏
+     * submission 为答案 { answer: {...} }；支持服务端校验的游戏必须提交（否则400），
+     * 按 startGame 返回的 problem 校验计分，忽略 score 和 stars，只按第一次结束计分（再次结束409）
      */
-    async endGame(sessionID, score, stars, completed) {
+    async endGame(sessionID, score, stars, completed, submission = null) {
+        const channel = this.channelFor(sessionID);
+        if (channel) {
+            const result = await channel.endGame(score, stars, completed, submission);
+            this.closeGameChannel();
+            return result;
+        }
+        await this.flushActions();
         return this.request('/api/game/end', {
             method: 'POST',
             body: JSON.stringify({
                 session_id: sessionID,
                 score: score,
                 stars: stars,
-                completed: completed
+                completed: completed,
+                submission: submission
             })
         });
     }
 
+    /**
+     * 校验答案（不计入成绩），返回各项是否正确
+     * 传 sessionID 时按该会话的题目校验并返回标准答案，只能在结束游戏之后调用；
+     * 不传时 submission 需包含题目参数，同时返回标准答案（练习）
+     */
+    async validateAnswer(gameType, submission, sessionID = null) {
+        return this.request('/api/simulation/validate', {
+            method: 'POST',
+            body: JSON.stringify({ game_type: gameType, session_id: sessionID, submission: submission })
+        });
+    }
+
     /**
      * 获取玩家进度
      */
@@ -108,6 +460,10 @@ class APIClient {
      * 获取AI提示
      */
     async getHint(sessionID, gameState, errorHistory = null) {
+        const channel = this.channelFor(sessionID);
+        if (channel) {
+            return channel.getHint(gameState, errorHistory);
+        }
         return this.request('/api/ai/hint', {
             method: 'POST',
             body: JSON.stringify({
@@ -118,6 +474,18 @@ class APIClient {
         });
     }
 
+    /**
+     * 流式获取AI提示
+     * @param {Function} onDelta - (delta, textSoFar) => void
+     */
+    async streamHint(sessionID, gameState, errorHistory = null, onDelta = null) {
+        return this.streamRequest('/api/ai/hint/stream', {
+            session_id: sessionID,
+            game_state: gameState,
+            error_history: errorHistory
+        }, onDelta);
+    }
+
     /**
      * 获取AI反馈
      */
@@ -143,6 +511,18 @@ class APIClient {
         });
     }
 
+    /**
+     * 流式向字节叔提问
+     * @param {Function} onDelta - (delta, textSoFar) => void
+     */
+    async streamQuestion(question, context = '', onDelta = null, sessionID = null) {
+        return this.streamRequest('/api/ai/question/stream', {
+            question: question,
+            context: context,
+            session_id: sessionID
+        }, onDelta);
+    }
+
     /**
      * 生成练习题
      */
@@ -151,7 +531,8 @@ class APIClient {
             method: 'POST',
             body: JSON.stringify({
                 player_level: playerLevel,
-                topic: topic
+                topic: topic,
+                player_id: this.playerID
             })
         });
     }
@@ -167,6 +548,32 @@ class APIClient {
             })
         });
     }
+
+    /**
+     * 获取排行榜前N名
+     */
+    async getLeaderboard(gameType, level = 'beginner', limit = 10, offset = 0) {
+        return this.request(`/api/leaderboard/${gameType}/${level}/top?limit=${limit}&offset=${offset}`);
+    }
+
+    /**
+     * 获取当前玩家的名次及前后的玩家
+     */
+    async getMyRank(gameType, level = 'beginner', radius = 5) {
+        const base = `/api/leaderboard/${gameType}/${level}`;
+        const [rank, around] = await Promise.all([
+            this.request(`${base}/rank/${this.playerID}`),
+            this.request(`${base}/around/${this.playerID}?radius=${radius}`)
+        ]);
+        return { ...rank, neighbours: around.entries };
+    }
+
+    /**
+     * 获取已生成的学习报告（stale为true时表示后台正在重新计算）
+     */
+    async getReport(reportId) {
+        return this.request(`/api/report/${reportId}`);
+    }
 }
 
 // 创建全局实例